@@ -27,13 +27,13 @@ def diff_properties(diff_frame, entity_type, key_columns, properties):
     both = diff_frame[diff_frame["KeyPresence"] == "In both"]
     if len(snapshot_only) > 0:
         print(f"\n{entity_type}s only in snapshot")
-        for index, row in snapshot_only.iterrows():
+        for row in snapshot_only.to_dict("records"):
             print(f"    {friendly_name(entity_type, row, key_columns)}")
     if len(reference_only) > 0:
         print(f"\n{entity_type}s only in reference")
-        for index, row in reference_only.iterrows():
+        for row in reference_only.to_dict("records"):
             print(f"    {friendly_name(entity_type, row, key_columns)}")
-    for index, row in both.iterrows():
+    for row in both.to_dict("records"):
         print(f"\nDifferences for {friendly_name(entity_type, row, key_columns)}")
         for property in properties:
             snapshot_setting = row[f"Snapshot_{property}"]
@@ -42,6 +42,34 @@ def diff_properties(diff_frame, entity_type, key_columns, properties):
                 print(f"    {property}: {reference_setting} -> {snapshot_setting}")
 
 
+def diff_answers(snapshot_answer, reference_answer, entity_type):
+    """
+    Prints the differences between two answers to the same question, like
+    diff_properties, but computed locally with TableAnswer.diff from answers
+    on the snapshot and the reference snapshot instead of by a differential
+    Batfish question.
+
+    Entities are described by the key columns of the answers.
+    """
+    diff = snapshot_answer.diff(reference_answer)
+    if diff.empty:
+        print(f"{entity_type} properties are identical across the two snapshot")
+        return
+    if len(diff.added) > 0:
+        print(f"\n{entity_type}s only in snapshot")
+        for row in diff.added.to_dict("records"):
+            print(f"    {friendly_name(entity_type, row, diff.key_columns)}")
+    if len(diff.removed) > 0:
+        print(f"\n{entity_type}s only in reference")
+        for row in diff.removed.to_dict("records"):
+            print(f"    {friendly_name(entity_type, row, diff.key_columns)}")
+    for row, mask in zip(diff.changed.to_dict("records"), diff.change_mask.to_dict("records")):
+        print(f"\nDifferences for {friendly_name(entity_type, row, diff.key_columns)}")
+        for property in diff.value_columns:
+            if mask[property]:
+                print(f"    {property}: {row[f'Reference_{property}']} -> {row[f'Snapshot_{property}']}")
+
+
 def diff_frames(snapshot_frame, reference_frame, entity_type):
     """
     Prints the differences between snapshot and reference information about entity_type.
@@ -51,14 +79,14 @@ def diff_frames(snapshot_frame, reference_frame, entity_type):
     reference_only = combined[combined["_merge"] == "right_only"]
     if len(snapshot_only) > 0:
         print(f"\n{entity_type}s only in snapshot")
-        for index, row in snapshot_only.iterrows():
+        for row in snapshot_only.to_dict("records"):
             print(
                 "    ",
                 friendly_name(entity_type, row, set(combined.columns) - {"_merge"}),
             )
     if len(reference_only) > 0:
         print(f"\n{entity_type}s only in reference")
-        for index, row in reference_only.iterrows():
+        for row in reference_only.to_dict("records"):
             print(
                 "    ",
                 friendly_name(entity_type, row, set(combined.columns) - {"_merge"}),
@@ -265,6 +265,8 @@ class CoordConstsV2:
     HTTP_HEADER_BATFISH_APIKEY = "X-Batfish-Apikey"
     # The HTTP Header containing the client's version.
     HTTP_HEADER_BATFISH_VERSION = "X-Batfish-Version"
+    # The HTTP Header containing the SHA-256 digest (hex) of an uploaded part.
+    HTTP_HEADER_BATFISH_CONTENT_SHA256 = "X-Batfish-Content-Sha256"
 
     QP_KEY = "key"
     QP_VERBOSE = "verbose"
@@ -281,6 +283,7 @@ class CoordConstsV2:
     RSC_NETWORKS = "networks"
     RSC_NODE_ROLES = "noderoles"
     RSC_OBJECTS = "objects"
+    RSC_PARTS = "parts"
     RSC_QUESTIONS = "questions"
     RSC_QUESTION_TEMPLATES = "question_templates"
     RSC_REFERENCE_LIBRARY = "referencelibrary"
@@ -12,7 +12,6 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-
 from pybatfish.client.consts import CoordConsts
 
 
@@ -59,3 +58,31 @@ class Options:
     # We should be forgiving if coordinator is unresponsive after setting up
     # a connection (e.g. GC)
     max_retries_to_connect_to_coordinator = 10  # type: int
+
+    # Rendering of table answers in notebooks, applied to answers when they are
+    # fetched (see TableAnswer). If set, only the first and last rows of an
+    # answer, up to this many in total, are rendered. Otherwise all rows are
+    # rendered by pandas.
+    html_max_rows = None  # type: int | None
+    # When html_max_rows is set, list cells (e.g., traces) show at most this
+    # many elements, followed by the number of elements left out
+    html_max_cell_items = 10  # type: int
+
+    # If set, snapshots and snapshot objects are uploaded in parts of this many
+    # bytes, each retried on its own, and the coordinator joins them. Parts
+    # already stored with the same checksum are not sent again, so a failed
+    # upload resumes where it stopped. Requires a coordinator that supports
+    # part uploads.
+    upload_part_size = None  # type: int | None
+
+    # Number of threads compressing files when uploading a snapshot directory.
+    # With more than one, each thread holds a whole small file and its
+    # compressed data in memory
+    snapshot_zip_workers = 1  # type: int
+    # Snapshots initialized from texts are zipped in memory up to this many
+    # bytes, then spooled to a temporary file
+    snapshot_spool_max_size = 64 << 20  # type: int
+
+    # Minimum number of seconds between progress reports of an upload or
+    # download to Session.transfer_callback
+    transfer_progress_interval = 1.0  # type: float
@@ -13,16 +13,23 @@
 #   limitations under the License.
 from __future__ import annotations
 
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
 from typing import (
     IO,
     TYPE_CHECKING,
     Any,
+    cast,
 )
 
 import requests
 from requests import HTTPError
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 
 import pybatfish
 from pybatfish.client.consts import CoordConsts, CoordConstsV2
@@ -30,6 +37,7 @@ from pybatfish.util import BfJsonEncoder
 
 from ..datamodel import NodeRolesData, ReferenceBook, VariableType
 from .options import Options
+from .transfer import _download_body, _Transfer
 from .workitem import WorkItem
 
 if TYPE_CHECKING:
@@ -40,8 +48,31 @@ if TYPE_CHECKING:
 # List of HTTP statuses to retry
 _STATUS_FORCELIST = [429, 500, 502, 503, 504]
 
+
+class _PerThreadSession(requests.Session):
+    """Session that sends each request with a separate session per thread.
+
+    Sessions are not thread-safe (e.g., their cookies), but the connection
+    pools of adapters are, so all thread sessions share the adapters mounted
+    on this one and connections are still reused across threads.
+    """
+
+    def __init__(self, adapter: HTTPAdapter) -> None:
+        super().__init__()
+        # Configure retries for both http and https requests
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self._local = threading.local()
+
+    def request(self, *args: Any, **kwargs: Any) -> Response:
+        session: requests.Session | None = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.adapters = self.adapters
+        return session.request(*args, **kwargs)
+
+
 # Create session for existing connection to backend
-_requests_session = requests.Session()
 _adapter = HTTPAdapter(
     max_retries=Retry(
         total=Options.max_retries_to_connect_to_coordinator,
@@ -53,12 +84,9 @@ _adapter = HTTPAdapter(
         status_forcelist=_STATUS_FORCELIST,
     )
 )
-# Configure retries for both http and https requests
-_requests_session.mount("http://", _adapter)
-_requests_session.mount("https://", _adapter)
+_requests_session = _PerThreadSession(_adapter)
 
 # Create request session for that fails fast in case connection is misconfigured
-_requests_session_fail_fast = requests.Session()
 _adapter_fail_fast = HTTPAdapter(
     max_retries=Retry(
         total=Options.max_initial_tries_to_connect_to_coordinator,
@@ -70,9 +98,18 @@ _adapter_fail_fast = HTTPAdapter(
         status_forcelist=_STATUS_FORCELIST,
     )
 )
-# Configure retries for both http and https requests
-_requests_session_fail_fast.mount("http://", _adapter_fail_fast)
-_requests_session_fail_fast.mount("https://", _adapter_fail_fast)
+_requests_session_fail_fast = _PerThreadSession(_adapter_fail_fast)
+
+# Session for requests that handle failures themselves, see _send_stream
+_adapter_no_retry = HTTPAdapter(max_retries=0)
+_requests_session_no_retry = _PerThreadSession(_adapter_no_retry)
+
+# Number of times a restartable upload is sent again, and the longest sleep
+# before sending it again (as in urllib3.Retry)
+_MAX_RESTARTS = Options.max_retries_to_connect_to_coordinator
+_MAX_BACKOFF = 120
+# Number of times an upload is sent again when no connection could be made
+_MAX_CONNECT_RESTARTS = Options.max_initial_tries_to_connect_to_coordinator
 
 _encoder = BfJsonEncoder()
 
@@ -196,9 +233,18 @@ def init_network(session: Session, new_network_name: str) -> None:
     _post(session, url_tail, None, params={CoordConstsV2.QP_NAME: new_network_name})
 
 
-def upload_snapshot(session: Session, snapshot_name: str, fd: IO) -> None:
+def upload_snapshot(session: Session, snapshot_name: str, fd: IO | Iterable[bytes]) -> None:
+    """Upload a snapshot zip, from a file or an iterable of chunks (sent with chunked transfer encoding).
+
+    An upload from an iterable that can be iterated again is restarted after
+    transient failures, see :py:func:`_send_stream`.
+    """
     url_tail = f"/{CoordConstsV2.RSC_NETWORKS}/{session.network}/{CoordConstsV2.RSC_SNAPSHOTS}/{snapshot_name}"
-    _post(session, url_tail, None, stream=fd)
+    if Options.upload_part_size:
+        parts_url_tail = f"/{CoordConstsV2.RSC_NETWORKS}/{session.network}/{CoordConstsV2.RSC_OBJECTS}"
+        _upload_parts(session, url_tail, None, fd, parts_url_tail)
+        return
+    _post(session, url_tail, None, stream=fd, transfer=_Transfer(session, "upload", url_tail))
 
 
 def get_network_object(session, key):
@@ -354,8 +400,15 @@ def put_reference_book(session: Session, book: ReferenceBook) -> None:
 
 
 def put_snapshot_object(session: Session, key: str, data: Any, snapshot: str | None = None) -> None:
-    """Put data as extended object with given key for the current snapshot."""
+    """Put data as extended object with given key for the current snapshot.
+
+    Uploaded in parts if :py:attr:`Options.upload_part_size` is set, see
+    :py:func:`_upload_parts`.
+    """
     url_tail = f"/{CoordConstsV2.RSC_NETWORKS}/{session.network}/{CoordConstsV2.RSC_SNAPSHOTS}/{session.get_snapshot(snapshot)}/{CoordConstsV2.RSC_OBJECTS}"
+    if Options.upload_part_size:
+        _upload_parts(session, url_tail, {CoordConstsV2.QP_KEY: key}, data, url_tail)
+        return
     _put_stream(session, url_tail, data, {CoordConstsV2.QP_KEY: key})
 
 
@@ -497,7 +550,7 @@ def _get_stream(session: Session, url_tail: str, params: dict[str, Any] | None =
     """
     response = _get(session, url_tail, params, stream=True)
     response.raw.decode_content = True
-    return response.raw
+    return _download_body(session, url_tail, response)
 
 
 def _post(
@@ -505,10 +558,14 @@ def _post(
     url_tail: str,
     obj: Any,
     params: dict[str, Any] | None = None,
-    stream: IO | None = None,
+    stream: IO | Iterable[bytes] | None = None,
+    transfer: _Transfer | None = None,
 ) -> None:
     """Make an HTTP(s) POST request to Batfish coordinator.
 
+    See :py:func:`_send_stream` for how the stream is sent and the role of
+    the transfer.
+
     :raises SSLError if SSL connection failed
     :raises ConnectionError if the coordinator is not available
     """
@@ -516,41 +573,233 @@ def _post(
     headers = _get_headers(session)
     if stream:
         headers["Content-Type"] = "application/octet-stream"
-    response = _requests_session.post(
-        url,
-        json=_encoder.default(obj) if obj is not None else None,
-        data=stream,
-        headers=headers,
-        params=params,
-        verify=session.verify_ssl_certs,
-        **session._get_request_kwargs(),
-    )
-    _check_response_status(response)
+
+    def send(requests_session: requests.Session, data: Any) -> Response:
+        return requests_session.post(
+            url,
+            json=_encoder.default(obj) if obj is not None else None,
+            data=data,
+            headers=headers,
+            params=params,
+            verify=session.verify_ssl_certs,
+            **session._get_request_kwargs(),
+        )
+
+    _send_stream(send, stream, transfer)
     return None
 
 
-def _put(session, url_tail, params=None, json=None, stream=None):
-    # type: (Session, str, None|dict[str, Any], Any|None, None|Any) -> None
+def _put(session, url_tail, params=None, json=None, stream=None, transfer=None, headers=None):
+    # type: (Session, str, None|dict[str, Any], Any|None, None|Any, _Transfer|None, None|dict[str, str]) -> None
     """Make an HTTP(s) PUT request to Batfish coordinator.
 
+    See :py:func:`_send_stream` for how the stream is sent and the role of
+    the transfer.
+
     :raises SSLError if SSL connection failed
     :raises ConnectionError if the coordinator is not available
     """
-    headers = _get_headers(session)
+    headers = dict(_get_headers(session), **(headers or {}))
     if stream:
         headers["Content-Type"] = "application/octet-stream"
     url = session.get_base_url2() + url_tail
-    response = _requests_session.put(
-        url,
-        json=json,
-        data=stream,
-        headers=headers,
-        verify=session.verify_ssl_certs,
-        params=params,
-        **session._get_request_kwargs(),
+
+    def send(requests_session, data):
+        # type: (requests.Session, Any) -> Response
+        return requests_session.put(
+            url,
+            json=json,
+            data=data,
+            headers=headers,
+            verify=session.verify_ssl_certs,
+            params=params,
+            **session._get_request_kwargs(),
+        )
+
+    _send_stream(send, stream, transfer)
+    return None
+
+
+def _send_stream(
+    send: Callable[[requests.Session, Any], Response],
+    stream: Any,
+    transfer: _Transfer | None,
+) -> Response:
+    """Send a request with the given body and check its status.
+
+    Bodies that can be iterated more than once (e.g., a list of chunks or an
+    object whose ``__iter__`` creates a new iterator) are restartable: they
+    are sent without urllib3 retries, which would resend an exhausted
+    iterator, and instead sent again from the start after a connection error
+    or a retryable status, up to
+    :py:attr:`Options.max_retries_to_connect_to_coordinator` times (see
+    :py:func:`_restart_limit` for connection errors). Bodies urllib3 can
+    send again (see :py:func:`_retryable_body`) are sent with the retries of
+    the session. Other bodies (one-shot iterators such as generators,
+    unseekable streams) are sent once without retries, since a retry would
+    send what is left of them as if it were the body.
+
+    Restarts resend the whole body. To only resend the part that failed, set
+    :py:attr:`Options.upload_part_size` (see :py:func:`_upload_parts`).
+
+    If a transfer is given, the progress of sending the stream is reported to it.
+    """
+    restartable = (
+        isinstance(stream, Iterable) and not isinstance(stream, (Iterator, str, bytes)) and not hasattr(stream, "read")
     )
+    if not restartable:
+        body = transfer.upload_body(stream) if transfer and stream else stream
+        response = send(_requests_session if _retryable_body(body) else _requests_session_no_retry, body)
+        _check_response_status(response)
+        if transfer is not None:
+            transfer.finish_upload(response)
+        return response
+
+    restarts = 0
+    while True:
+        data = iter(stream)
+        try:
+            response = send(_requests_session_no_retry, transfer.upload_body(data) if transfer else data)
+            if response.status_code not in _STATUS_FORCELIST or restarts >= _MAX_RESTARTS:
+                break
+            logging.getLogger(__name__).warning("Upload failed with status %s, restarting it", response.status_code)
+        except requests.ConnectionError as e:
+            if restarts >= _restart_limit(e):
+                raise
+            logging.getLogger(__name__).warning("Upload failed (%s), restarting it", e)
+        finally:
+            # Stop a generator that was not fully sent, e.g., a zip_dir_stream
+            close = getattr(data, "close", None)
+            if close is not None:
+                close()
+        time.sleep(min(Options.request_backoff_factor * 2**restarts, _MAX_BACKOFF))
+        restarts += 1
+        if transfer is not None:
+            transfer.restart()
     _check_response_status(response)
-    return None
+    if transfer is not None:
+        transfer.finish_upload(response)
+    return response
+
+
+def _retryable_body(body: Any) -> bool:
+    """Return whether urllib3 can send a request body again when retrying.
+
+    Strings and bytes can be sent any number of times, and urllib3 rewinds
+    seekable files. Anything else, e.g., a generator or a stream that cannot
+    seek, would be sent from wherever the failed attempt stopped.
+    """
+    if body is None or isinstance(body, (str, bytes)):
+        return True
+    seekable = getattr(body, "seekable", None)
+    return hasattr(body, "read") and hasattr(body, "tell") and seekable is not None and bool(seekable())
+
+
+def _restart_limit(error: requests.ConnectionError) -> int:
+    """Return how many times an upload failing with the given error is restarted.
+
+    Losing the connection while sending is transient and restarted up to
+    :py:data:`_MAX_RESTARTS` times. If no connection could be made at all
+    (refused, unknown host, timeout, proxy failure), the coordinator may be
+    down or misconfigured, so only up to :py:data:`_MAX_CONNECT_RESTARTS`
+    restarts are made, as when first connecting. TLS failures are not
+    restarted.
+    """
+    if isinstance(error, requests.exceptions.SSLError):
+        return 0
+    reason = error.args[0] if error.args else None
+    # Errors of urllib3 retries wrap the error of the last attempt
+    reason = getattr(reason, "reason", reason)
+    if isinstance(error, requests.exceptions.ProxyError) or isinstance(
+        reason, (NewConnectionError, ConnectTimeoutError)
+    ):
+        return _MAX_CONNECT_RESTARTS
+    return _MAX_RESTARTS
+
+
+def _upload_parts(
+    session: Session,
+    url_tail: str,
+    params: dict[str, Any] | None,
+    data: Any,
+    parts_url_tail: str,
+) -> None:
+    """Upload data in parts of :py:attr:`Options.upload_part_size` bytes, then
+    have the coordinator join them as if the data was sent to ``url_tail``.
+
+    Each part is put as an object at ``parts_url_tail`` (network objects for
+    snapshots, snapshot objects for snapshot objects) with its SHA-256 digest
+    in a header, which the coordinator checks, and in a companion
+    ``<key>.sha256`` object. A part is sent again from its start after
+    transient failures, without resending other parts (see
+    :py:func:`_send_stream`). Part keys only depend on the target of the
+    upload, so uploading to the same target again skips the parts already
+    stored with the same digest and resumes after the last stored part.
+    Finally, the list of parts and the digest of the whole data are posted
+    to ``<url_tail>/parts``; the coordinator joins the parts in order,
+    checks the digest and deletes the parts.
+    """
+    target = _encoder.encode([url_tail, params])
+    prefix = f"pybatfish/parts/{hashlib.sha256(target.encode()).hexdigest()[:32]}/"
+    parts = []
+    digest = hashlib.sha256()
+    for index, part in enumerate(_fixed_size_parts(data, cast(int, Options.upload_part_size))):
+        part_digest = hashlib.sha256(part).hexdigest()
+        digest.update(part)
+        key = f"{prefix}{index:08d}"
+        if _stored_digest(session, parts_url_tail, key) != part_digest:
+            _put(
+                session,
+                parts_url_tail,
+                params={CoordConstsV2.QP_KEY: key},
+                # A list of one chunk is restarted on failure, see _send_stream
+                stream=[part],
+                transfer=_Transfer(session, "upload", parts_url_tail),
+                headers={CoordConstsV2.HTTP_HEADER_BATFISH_CONTENT_SHA256: part_digest},
+            )
+            _put(session, parts_url_tail, params={CoordConstsV2.QP_KEY: f"{key}.sha256"}, stream=part_digest)
+        parts.append({"key": key, "size": len(part), "sha256": part_digest})
+    _post(
+        session,
+        f"{url_tail}/{CoordConstsV2.RSC_PARTS}",
+        {"parts": parts, "sha256": digest.hexdigest()},
+        params=params,
+    )
+
+
+def _stored_digest(session: Session, parts_url_tail: str, key: str) -> str | None:
+    """Return the digest of a part stored by an earlier upload, if any."""
+    try:
+        response = _get(session, parts_url_tail, {CoordConstsV2.QP_KEY: f"{key}.sha256"})
+    except HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        return None
+    return str(response.text)
+
+
+def _fixed_size_parts(data: Any, size: int) -> Iterator[bytes]:
+    """Split bytes, a file or an iterable of chunks into parts of the given
+    size, except for the last one. Empty data is a single empty part."""
+    chunks: Iterable[bytes]
+    if isinstance(data, str):
+        chunks = [data.encode("utf-8")]
+    elif isinstance(data, bytes):
+        chunks = [data]
+    elif hasattr(data, "read"):
+        chunks = iter(lambda: data.read(size), b"")
+    else:
+        chunks = data
+    buffer = bytearray()
+    sent = False
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+            sent = True
+    if buffer or not sent:
+        yield bytes(buffer)
 
 
 def _get_headers(session: Session) -> dict[str, str]:
@@ -581,4 +830,4 @@ def _put_stream(
     :raises SSLError if SSL connection failed
     :raises ConnectionError if the coordinator is not available
     """
-    _put(session, url_tail, params=params, stream=stream)
+    _put(session, url_tail, params=params, stream=stream, transfer=_Transfer(session, "upload", url_tail))
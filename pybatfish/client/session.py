@@ -15,16 +15,23 @@
 from __future__ import annotations
 
 import base64
+import collections
+import concurrent.futures
+import functools
+import hashlib
 import json
 import logging
 import os
+import posixpath
 import tempfile
 import zipfile
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Iterator, Mapping
 from io import SEEK_CUR, SEEK_SET
 from typing import (
     IO,
     Any,
+    NamedTuple,
+    cast,
 )
 
 from requests import HTTPError
@@ -56,12 +63,13 @@ from pybatfish.datamodel import (
     VariableType,
 )
 from pybatfish.datamodel.answer import Answer, TableAnswer
-from pybatfish.datamodel.answer.table import is_table_ans
+from pybatfish.datamodel.answer.table import RowFilter, is_table_ans
 from pybatfish.exception import BatfishException
 from pybatfish.question.question import Questions
-from pybatfish.util import get_uuid, validate_name, zip_dir
+from pybatfish.util import content_hash, file_manifest, get_uuid, validate_name, zip_dir, zip_dir_stream
 
 from .options import Options
+from .transfer import TransferCallback, TransferMetrics, log_progress
 
 
 class Asserts:
@@ -311,6 +319,17 @@ class Asserts:
         return assert_no_undefined_references(snapshot, soft, self.session, df_format)
 
 
+class SnapshotInitResult(NamedTuple):
+    """Result of initializing a snapshot with :py:meth:`Session.init_snapshots`.
+
+    :ivar name: name of the snapshot
+    :ivar error: why the snapshot could not be initialized, ``None`` if it was
+    """
+
+    name: str
+    error: Exception | None
+
+
 class Session:
     """Keeps session configuration needed to connect to a Batfish server.
 
@@ -327,6 +346,21 @@ class Session:
     :ivar request_kwargs: Additional keyword arguments forwarded to every
         ``requests`` call.  Explicit parameters (``proxies``, ``timeout``)
         take precedence over values provided here.
+    :ivar answer_spill_threshold: Number of rows above which table answers are
+        kept in a memory-mapped file on local disk and decoded lazily, instead of
+        being fully decoded in memory (``None``, the default, never spills).
+    :ivar answer_spill_dir: Directory for spilled answers (system temp dir by default).
+    :ivar answer_flyweight: Whether equal immutable values in a table answer
+        (interfaces, flows, trace steps, ...) are decoded to a single shared
+        instance, which saves memory on large trace answers (False by default).
+    :ivar answer_compact_traces: Whether traces in table answers are kept in a
+        pool of unique hops and steps and decoded on access (False by default).
+    :ivar transfer_callback: Called with the
+        :py:class:`~pybatfish.client.transfer.TransferMetrics` of snapshot
+        uploads and object uploads and downloads while they progress (at most
+        every :py:attr:`Options.transfer_progress_interval` seconds) and when
+        they complete. Logs them by default; ``None`` disables it.
+    :ivar transfers: Metrics of the most recent completed transfers.
     """
 
     def __init__(
@@ -344,6 +378,11 @@ class Session:
         proxies: dict[str, str] | None = None,
         timeout: float | None = 30,
         request_kwargs: dict[str, Any] | None = None,
+        answer_spill_threshold: int | None = None,
+        answer_spill_dir: str | None = None,
+        answer_flyweight: bool = False,
+        answer_compact_traces: bool = False,
+        transfer_callback: TransferCallback | None = log_progress,
     ):
         # Coordinator args
         self.host: str = host
@@ -375,6 +414,16 @@ class Session:
         self.timeout: float | None = timeout
         self.request_kwargs: dict[str, Any] = request_kwargs or {}
 
+        # Answer decoding args
+        self.answer_spill_threshold: int | None = answer_spill_threshold
+        self.answer_spill_dir: str | None = answer_spill_dir
+        self.answer_flyweight: bool = answer_flyweight
+        self.answer_compact_traces: bool = answer_compact_traces
+
+        # Transfer monitoring
+        self.transfer_callback: TransferCallback | None = transfer_callback
+        self.transfers: collections.deque[TransferMetrics] = collections.deque(maxlen=_MAX_TRANSFERS)
+
         # Auto-load question templates
         if load_questions:
             self.q.load()
@@ -512,6 +561,7 @@ class Session:
         restore_nodes: list[str] | None = None,
         add_files: str | None = None,
         extra_args: dict[str, Any] | None = None,
+        remove_files: list[str] | None = None,
     ) -> str | None:
         """
         Copy an existing snapshot and deactivate or reactivate specified interfaces, nodes, and links on the copy.
@@ -537,6 +587,10 @@ class Session:
            1) "ignoremanagementinterfaces" (bool) -- whether to shut management interfaces (default is True);
            2) "parsereuse" (bool) -- whether to reuse parsing work from prior snapshots when file content is identical (default is True)
         :type extra_args: dict
+        :param remove_files: paths, relative to the snapshot directory and with
+            ``/`` separators, of files to remove from the copy. Requires a
+            coordinator that supports removing files.
+        :type remove_files: list[str]
 
         :return: name of initialized snapshot or None if the call fails
         :rtype: str|None
@@ -551,6 +605,7 @@ class Session:
             restore_nodes=restore_nodes,
             add_files=add_files,
             extra_args=extra_args,
+            remove_files=remove_files,
         )
         assert isinstance(ss_name, str)  # Guaranteed since background=False
         return ss_name
@@ -567,6 +622,7 @@ class Session:
         restore_nodes: list[str] | None = None,
         add_files: str | None = None,
         extra_args: dict[str, Any] | None = None,
+        remove_files: list[str] | None = None,
     ) -> str | dict | None:
         self._check_network()
 
@@ -608,6 +664,7 @@ class Session:
             "restoreInterfaces": restore_interfaces,
             "restoreNodes": restore_nodes,
             "zipFile": encoded_file,
+            "removeFiles": remove_files,
         }
         restv2helper.fork_snapshot(self, json_data)
 
@@ -640,6 +697,8 @@ class Session:
         snapshot: str,
         reference_snapshot: str | None,
         extra_args: dict[str, Any] | None,
+        columns: Iterable[str] | None = None,
+        where: RowFilter | None = None,
     ) -> Answer | str:
         """
         Upload, execute, and return the answer for a question.
@@ -653,6 +712,8 @@ class Session:
         :param snapshot: snapshot on which to answer the question
         :param reference_snapshot: reference snapshot for differential questions
         :param extra_args: extra arguments to pass with the question
+        :param columns: for table answers, only decode these columns
+        :param where: for table answers, only keep matching rows (see :py:class:`TableAnswer`)
         :return: Answer object, or work item ID string if background=True
         """
         if not question_name:
@@ -669,9 +730,16 @@ class Session:
             return work_item.id
 
         # Get the answer
-        return self.get_answer(question_name, snapshot, reference_snapshot)
+        return self.get_answer(question_name, snapshot, reference_snapshot, columns=columns, where=where)
 
-    def get_answer(self, question: str, snapshot: str, reference_snapshot: str | None = None) -> Answer:
+    def get_answer(
+        self,
+        question: str,
+        snapshot: str,
+        reference_snapshot: str | None = None,
+        columns: Iterable[str] | None = None,
+        where: RowFilter | None = None,
+    ) -> Answer:
         """
         Get the answer for a previously asked question.
 
@@ -681,13 +749,29 @@ class Session:
         :type snapshot: str
         :param reference_snapshot: if present, gets the answer for a differential question asked against the specified reference snapshot
         :type reference_snapshot: str
+        :param columns: for table answers, only decode these columns
+        :type columns: list[str]
+        :param where: for table answers, only keep rows matching this filter:
+            a mapping from column names to expected values, or a callable that
+            receives the raw JSON of a row. Non-matching rows are dropped before
+            the other columns are decoded.
         :return: answer to the specified question
         :rtype: :py:class:`Answer`
         """
         params = {"snapshot": snapshot, "referenceSnapshot": reference_snapshot}
         ans = restv2helper.get_answer(self, question, params)
         if is_table_ans(ans):
-            return TableAnswer(ans)
+            return TableAnswer(
+                ans,
+                spill_threshold=self.answer_spill_threshold,
+                spill_dir=self.answer_spill_dir,
+                columns=columns,
+                where=where,
+                flyweight=self.answer_flyweight,
+                compact_traces=self.answer_compact_traces,
+                html_max_rows=Options.html_max_rows,
+                html_max_cell_items=Options.html_max_cell_items,
+            )
         else:
             return Answer(ans)
 
@@ -788,6 +872,9 @@ class Session:
         name: str | None = None,
         overwrite: bool = False,
         extra_args: dict[str, Any] | None = None,
+        dedupe: bool = False,
+        include: str | Iterable[str] | None = None,
+        exclude: str | Iterable[str] | None = None,
     ) -> str:
         """
         Initialize a new snapshot.
@@ -803,14 +890,227 @@ class Session:
            1) "ignoremanagementinterfaces" (bool) -- whether to shut management interfaces (default is True);
            2) "parsereuse" (bool) -- whether to reuse parsing work from prior snapshots when file content is identical (default is True)
         :type extra_args: dict
+        :param dedupe: whether to reuse a snapshot with the same content. If
+           a snapshot was initialized with ``dedupe=True`` from the same files
+           and ``extra_args`` in this network and still exists, it becomes the
+           current snapshot and its name is returned (even if it differs from
+           ``name``), without uploading or parsing anything. The content hash
+           of each deduplicated snapshot is kept as a network object pointing
+           to the snapshot and as a snapshot object, which must match for the
+           snapshot to be reused, e.g. after it was overwritten.
+        :type dedupe: bool
+        :param include: if ``upload`` is a directory, glob patterns of the only
+           files to upload, e.g. ``["*.cfg", "batfish/*"]``. See
+           :py:func:`~pybatfish.util.zip_dir` for the pattern syntax.
+        :type include: str | list[str]
+        :param exclude: if ``upload`` is a directory, glob patterns of files
+           and directories to leave out, e.g. ``[".git", "*.pcap", "*.bak"]``.
+           Excluded directories are not walked.
+        :type exclude: str | list[str]
 
         :return: name of initialized snapshot
         :rtype: str
         """
-        ss_name = self._init_snapshot(upload, name=name, overwrite=overwrite, extra_args=extra_args)
+        _check_filters(upload, include, exclude)
+        if dedupe:
+            if self.network is None:
+                self.set_network()
+            digest_key = _snapshot_digest_key(upload, extra_args, include, exclude)
+            existing = self.__get_deduped_snapshot(digest_key)
+            if existing is not None:
+                self.snapshot = existing
+                logging.getLogger(__name__).info("Reusing snapshot %s with the same content", existing)
+                return existing
+        ss_name = self._init_snapshot(
+            upload, name=name, overwrite=overwrite, extra_args=extra_args, include=include, exclude=exclude
+        )
         assert isinstance(ss_name, str)  # Guaranteed since background=False
+        if dedupe:
+            self.put_snapshot_object(_SNAPSHOT_DIGEST_KEY, digest_key)
+            self.put_network_object(digest_key, ss_name)
         return ss_name
 
+    def __get_deduped_snapshot(self, digest_key: str) -> str | None:
+        """Return the existing snapshot recorded under a content digest key, if any.
+
+        The snapshot must still exist and still have the same content, i.e. not
+        have been overwritten since.
+        """
+        try:
+            name = self.get_network_object_text(digest_key)
+            if name not in self.list_snapshots():
+                return None
+            if self.get_snapshot_object_text(_SNAPSHOT_DIGEST_KEY, snapshot=name) != digest_key:
+                return None
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            return None
+        return name
+
+    def init_snapshots(
+        self,
+        snapshots: Mapping[str, str],
+        max_parallel: int = 4,
+        overwrite: bool = False,
+        extra_args: dict[str, Any] | None = None,
+    ) -> list[SnapshotInitResult]:
+        """
+        Initialize many snapshots, with up to ``max_parallel`` of them being parsed at once.
+
+        Snapshots go through two stages. In the upload stage, they are
+        uploaded one at a time in order, each zipped while it is uploaded.
+        As soon as a snapshot is uploaded, it moves to the parse stage, where
+        the coordinator parses it and it is waited for as in
+        :py:meth:`init_snapshot`, while the next snapshot is uploaded. So the
+        total time is about that of the slower stage rather than the sum of
+        both. A failure only affects its own snapshot.
+
+        The current snapshot is not changed while snapshots are initialized.
+        Afterwards, it is the last one in ``snapshots`` that was initialized.
+
+        :param snapshots: path to the snapshot zip or directory, by name of the
+            snapshot to initialize
+        :type snapshots: dict[str, str]
+        :param max_parallel: maximum number of snapshots being parsed at once
+        :type max_parallel: int
+        :param overwrite: whether to overwrite existing snapshots with the same names
+        :type overwrite: bool
+        :param extra_args: extra arguments to control snapshot processing, see
+            :py:meth:`init_snapshot`
+        :type extra_args: dict
+
+        :return: result of each snapshot, in the order of ``snapshots``
+        :rtype: list[SnapshotInitResult]
+        """
+        if max_parallel < 1:
+            raise ValueError(f"max_parallel must be at least 1, got {max_parallel}")
+        for name in snapshots:
+            validate_name(name)
+        if self.network is None:
+            self.set_network()
+
+        # Uploads are shut down first, so they never submit to a stopped parse stage
+        with (
+            concurrent.futures.ThreadPoolExecutor(max_parallel, thread_name_prefix="pybatfish-parse") as parses,
+            concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="pybatfish-upload") as uploads,
+        ):
+
+            def upload_then_parse(name: str, upload: str) -> concurrent.futures.Future[None]:
+                self._upload_snapshot(upload, name=name, overwrite=overwrite)
+                return parses.submit(self._wait_for_parse, name, extra_args)
+
+            futures = {name: uploads.submit(upload_then_parse, name, upload) for name, upload in snapshots.items()}
+            results = []
+            for name, future in futures.items():
+                try:
+                    future.result().result()
+                except Exception as e:
+                    logging.getLogger(__name__).warning("Initializing snapshot %s failed: %s", name, e)
+                    results.append(SnapshotInitResult(name, e))
+                else:
+                    results.append(SnapshotInitResult(name, None))
+        initialized = [result.name for result in results if result.error is None]
+        if initialized:
+            self.snapshot = initialized[-1]
+        return results
+
+    def init_snapshot_incremental(
+        self,
+        base_snapshot: str,
+        local_dir: str,
+        name: str | None = None,
+        overwrite: bool = False,
+        extra_args: dict[str, Any] | None = None,
+        include: str | Iterable[str] | None = None,
+        exclude: str | Iterable[str] | None = None,
+    ) -> str:
+        """
+        Initialize a new snapshot from a directory, uploading only the files that changed since a base snapshot.
+
+        The new snapshot is a fork of ``base_snapshot`` with the added and
+        modified files of ``local_dir``, so upload size scales with the size
+        of the change. Files are compared against the manifest (file paths and
+        SHA-256 digests) kept as a snapshot object of snapshots initialized by
+        this method. Deleted files are removed from the fork (see
+        ``remove_files`` of :py:meth:`fork_snapshot`). If the base snapshot has
+        no manifest, the whole directory is uploaded.
+
+        :param base_snapshot: name of the snapshot to update
+        :type base_snapshot: str
+        :param local_dir: path to the directory with the new snapshot files
+        :type local_dir: str
+        :param name: name of the snapshot to initialize
+        :type name: str
+        :param overwrite: whether to overwrite an existing snapshot with the
+           same name
+        :type overwrite: bool
+        :param extra_args: extra arguments to control snapshot processing, see
+           :py:meth:`init_snapshot`
+        :type extra_args: dict
+        :param include: glob patterns of the only files of ``local_dir`` in the
+           snapshot, see :py:meth:`init_snapshot`
+        :type include: str | list[str]
+        :param exclude: glob patterns of files and directories of ``local_dir``
+           to leave out of the snapshot, see :py:meth:`init_snapshot`
+        :type exclude: str | list[str]
+
+        :return: name of initialized snapshot
+        :rtype: str
+        """
+        if not os.path.isdir(local_dir):
+            raise ValueError(f"{local_dir} is not a directory")
+        self._check_network()
+        manifest = file_manifest(local_dir, include, exclude)
+        base_manifest = self.__get_snapshot_manifest(base_snapshot)
+        logger = logging.getLogger(__name__)
+        if base_manifest is None:
+            logger.info("Snapshot %s has no manifest, uploading all files", base_snapshot)
+            ss_name = self.init_snapshot(
+                local_dir, name=name, overwrite=overwrite, extra_args=extra_args, include=include, exclude=exclude
+            )
+        else:
+            changed = sorted(path for path, digest in manifest.items() if base_manifest.get(path) != digest)
+            deleted = sorted(base_manifest.keys() - manifest.keys())
+            logger.info(
+                "Uploading %s changed files and removing %s files on top of snapshot %s",
+                len(changed),
+                len(deleted),
+                base_snapshot,
+            )
+            # Closed before it is read again by name, which Windows requires
+            temp_zip_file = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+            try:
+                with temp_zip_file:
+                    if changed:
+                        zip_dir(local_dir, temp_zip_file, workers=Options.snapshot_zip_workers, files=changed)
+                ss_name_or_status = self._fork_snapshot(
+                    base_snapshot,
+                    name=name,
+                    overwrite=overwrite,
+                    add_files=temp_zip_file.name if changed else None,
+                    extra_args=extra_args,
+                    remove_files=deleted or None,
+                )
+            finally:
+                os.remove(temp_zip_file.name)
+            assert isinstance(ss_name_or_status, str)  # Guaranteed since background=False
+            ss_name = ss_name_or_status
+        self.put_snapshot_object(_SNAPSHOT_MANIFEST_KEY, json.dumps(manifest, sort_keys=True))
+        return ss_name
+
+    def __get_snapshot_manifest(self, snapshot: str) -> dict[str, str] | None:
+        """Return the file manifest kept with a snapshot, if any."""
+        try:
+            manifest: dict[str, str] = json.loads(
+                self.get_snapshot_object_text(_SNAPSHOT_MANIFEST_KEY, snapshot=snapshot)
+            )
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            return None
+        return manifest
+
     def init_snapshot_from_text(
         self,
         text: str,
@@ -868,16 +1168,65 @@ class Session:
         assert isinstance(ss_name, str)  # Guaranteed since background=False
         return ss_name
 
-    def __init_snapshot_from_io(self, name: str, fd: IO) -> None:
+    def init_snapshot_from_texts(
+        self,
+        texts: Mapping[str, str] | Iterable[tuple[str, str]],
+        snapshot_name: str | None = None,
+        platform: str | None = None,
+        overwrite: bool = False,
+        extra_args: dict[str, Any] | None = None,
+    ) -> str:
+        """
+        Initialize a snapshot of configuration files with given texts, without writing them to a directory.
+
+        The texts are compressed one at a time into a zip that is kept in
+        memory, or spooled to a temporary file once it is larger than
+        :py:attr:`Options.snapshot_spool_max_size` bytes. They can be produced
+        lazily, e.g. by a generator rendering templates. See
+        :py:meth:`init_snapshot_from_text` for how the platform of each file is
+        determined.
+
+        :param texts: file name to text of each configuration file, as a
+            mapping or an iterable of pairs. Names may contain ``/`` to create
+            subdirectories of the ``configs`` directory.
+        :type texts: dict[str, str]
+        :param snapshot_name: name of the snapshot to initialize
+        :type snapshot_name: str
+        :param platform: the RANCID router.db name for the platform of all
+            devices, see :py:meth:`init_snapshot_from_text`
+        :type platform: str
+        :param overwrite: whether to overwrite an existing snapshot with
+           the same name.
+        :type overwrite: bool
+        :param extra_args: extra arguments to be passed to the parse command
+        :type extra_args: dict
+
+        :return: name of initialized snapshot
+        :rtype: str
+        """
+        with tempfile.SpooledTemporaryFile(max_size=Options.snapshot_spool_max_size) as data:
+            _write_texts_zip(data, texts.items() if isinstance(texts, Mapping) else texts, platform)
+            # Upload in chunks, read again from the start if the upload is restarted
+            ss_name = self._init_snapshot(
+                _FileChunks(data), name=snapshot_name, overwrite=overwrite, extra_args=extra_args
+            )
+        assert isinstance(ss_name, str)  # Guaranteed since background=False
+        return ss_name
+
+    def __init_snapshot_from_io(self, name: str, fd: IO | Iterable[bytes]) -> None:
         restv2helper.upload_snapshot(self, name, fd)
 
-    def __init_snapshot_from_file(self, name: str, file_to_send: str) -> None:
-        tmp_file_name: str | None = None
+    def __init_snapshot_from_file(
+        self,
+        name: str,
+        file_to_send: str,
+        include: str | Iterable[str] | None = None,
+        exclude: str | Iterable[str] | None = None,
+    ) -> None:
         if os.path.isdir(file_to_send):
-            # delete=False because we re-open for reading
-            with tempfile.NamedTemporaryFile(delete=False) as temp_zip_file:
-                zip_dir(file_to_send, temp_zip_file)
-                tmp_file_name = file_to_send = temp_zip_file.name
+            # Compress the directory while it is being uploaded, in chunks
+            self.__init_snapshot_from_io(name, _DirectoryZip(file_to_send, include, exclude))
+            return
         elif os.path.isfile(file_to_send):
             if not zipfile.is_zipfile(file_to_send):
                 raise ValueError(f"{file_to_send} is not a valid zip file")
@@ -885,23 +1234,32 @@ class Session:
         with open(file_to_send, "rb") as fd:
             self.__init_snapshot_from_io(name, fd)
 
-        # Cleanup tmp file if we made one
-        if tmp_file_name is not None:
-            try:
-                os.remove(tmp_file_name)
-            except OSError:
-                # If we can't delete the file for some reason, let it be,
-                # no need to crash initialization
-                pass
-
     def _init_snapshot(
         self,
-        upload: str | IO,
+        upload: str | IO | Iterable[bytes],
         name: str | None = None,
         overwrite: bool = False,
         background: bool = False,
         extra_args: dict[str, Any] | None = None,
+        include: str | Iterable[str] | None = None,
+        exclude: str | Iterable[str] | None = None,
     ) -> str | dict[str, str]:
+        name = self._upload_snapshot(upload, name=name, overwrite=overwrite, include=include, exclude=exclude)
+        return self._parse_snapshot(name, background, extra_args)
+
+    def _upload_snapshot(
+        self,
+        upload: str | IO | Iterable[bytes],
+        name: str | None = None,
+        overwrite: bool = False,
+        include: str | Iterable[str] | None = None,
+        exclude: str | Iterable[str] | None = None,
+    ) -> str:
+        """Upload a snapshot without parsing it, and return its name.
+
+        The current snapshot is not changed, so this can run in parallel for
+        different snapshots once the network is set.
+        """
         if self.network is None:
             self.set_network()
 
@@ -924,18 +1282,18 @@ class Session:
                 )
 
         if isinstance(upload, str):
-            self.__init_snapshot_from_file(name, upload)
+            self.__init_snapshot_from_file(name, upload, include, exclude)
         else:
             seekable = hasattr(upload, "seek") and hasattr(upload, "seekable") and upload.seekable()
             if seekable:  # else assume it's a zipfile, and rely on backend to say otherwise
-                old_pos = upload.seek(0, SEEK_CUR)
-                if not zipfile.is_zipfile(upload):
+                fd = cast(IO, upload)
+                old_pos = fd.seek(0, SEEK_CUR)
+                if not zipfile.is_zipfile(fd):
                     raise ValueError("The provided data is not a valid zip file")
-                upload.seek(old_pos, SEEK_SET)
-            # upload is an IO-like object already
+                fd.seek(old_pos, SEEK_SET)
+            # upload is an IO-like object or iterable of chunks already
             self.__init_snapshot_from_io(name, upload)
-
-        return self._parse_snapshot(name, background, extra_args)
+        return name
 
     def list_networks(self) -> list[str]:
         """
@@ -1103,20 +1461,29 @@ class Session:
         :return: name of initialized snapshot, or JSON dictionary of task status if background=True
         :rtype: Union[str, dict]
         """
-        work_item = workhelper.get_workitem_parse(self, name)
-        answer_dict = workhelper.execute(work_item, self, background=background, extra_args=extra_args)
         if background:
+            work_item = workhelper.get_workitem_parse(self, name)
+            answer_dict = workhelper.execute(work_item, self, background=True, extra_args=extra_args)
             self.snapshot = name
             return answer_dict
 
-        status = WorkStatusCode(answer_dict["status"])
+        self._wait_for_parse(name, extra_args)
+        self.snapshot = name
+        logging.getLogger(__name__).info("Default snapshot is now set to %s", self.snapshot)
+        return self.snapshot
 
+    def _wait_for_parse(self, name: str, extra_args: dict[str, Any] | None) -> None:
+        """Parse the specified snapshot and wait until it is done, without
+        changing the current snapshot.
+
+        :raises BatfishException: if parsing fails
+        """
+        work_item = workhelper.get_workitem_parse(self, name)
+        answer_dict = workhelper.execute(work_item, self, background=False, extra_args=extra_args)
+        status = WorkStatusCode(answer_dict["status"])
         if status != WorkStatusCode.TERMINATEDNORMALLY:
             init_log = restv2helper.get_work_log(self, name, work_item.id)
             raise BatfishException(f"Initializing snapshot {name} failed with status {status}\n{init_log}")
-        self.snapshot = name
-        logging.getLogger(__name__).info("Default snapshot is now set to %s", self.snapshot)
-        return self.snapshot
 
     def auto_complete(
         self,
@@ -1163,6 +1530,33 @@ class Session:
         return results
 
 
+class _DirectoryZip:
+    """Zip of a directory, compressed again each time it is iterated so that
+    its upload can be restarted."""
+
+    def __init__(
+        self, dir_path: str, include: str | Iterable[str] | None = None, exclude: str | Iterable[str] | None = None
+    ) -> None:
+        self._dir_path = dir_path
+        self._include = include
+        self._exclude = exclude
+
+    def __iter__(self) -> Iterator[bytes]:
+        return zip_dir_stream(
+            self._dir_path, workers=Options.snapshot_zip_workers, include=self._include, exclude=self._exclude
+        )
+
+
+# Number of completed transfers kept in Session.transfers
+_MAX_TRANSFERS = 100
+
+# Snapshot object with the file manifest of snapshots from init_snapshot_incremental
+_SNAPSHOT_MANIFEST_KEY = "pybatfish/manifest.json"
+
+# Snapshot object with the content digest key of snapshots initialized with dedupe=True
+_SNAPSHOT_DIGEST_KEY = "pybatfish/content_digest"
+
+
 def _text_with_platform(text: str, platform: str | None) -> str:
     """Returns the text with platform prepended if needed."""
     if platform is None:
@@ -1171,19 +1565,57 @@ def _text_with_platform(text: str, platform: str | None) -> str:
     return f"!RANCID-CONTENT-TYPE: {p}\n{text}"
 
 
+def _check_filters(upload: str, include: str | Iterable[str] | None, exclude: str | Iterable[str] | None) -> None:
+    if (include is not None or exclude is not None) and not os.path.isdir(upload):
+        raise ValueError(f"File patterns can only be applied to snapshot directories, {upload} is not a directory")
+
+
+def _snapshot_digest_key(
+    upload: str,
+    extra_args: dict[str, Any] | None,
+    include: str | Iterable[str] | None = None,
+    exclude: str | Iterable[str] | None = None,
+) -> str:
+    """Return the network object key recording snapshots of the given content and parse arguments."""
+    digest = hashlib.sha256(content_hash(upload, include, exclude).encode())
+    digest.update(json.dumps(extra_args or {}, sort_keys=True).encode())
+    return f"pybatfish/snapshot_digests/{digest.hexdigest()}"
+
+
 def _create_in_memory_zip(text: str, filename: str, platform: str | None) -> IO:
     """Creates an in-memory zip file for a single file snapshot."""
     from io import BytesIO
 
     data = BytesIO()
-    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED, False) as zf:
-        zipfilename = os.path.join("snapshot", "configs", filename)
-        zf.writestr(zipfilename, _text_with_platform(text, platform))
+    _write_texts_zip(data, [(filename, text)], platform)
     # rewind after writing
     data.seek(0, SEEK_SET)
     return data
 
 
+def _write_texts_zip(fd: IO[bytes], texts: Iterable[tuple[str, str]], platform: str | None) -> None:
+    """Writes a snapshot zip of configuration files with the given names and texts."""
+    names = set()
+    with zipfile.ZipFile(fd, "w", zipfile.ZIP_DEFLATED, False) as zf:
+        for filename, text in texts:
+            if filename in names:
+                raise ValueError(f"Duplicate configuration file name: {filename}")
+            names.add(filename)
+            zf.writestr(posixpath.join("snapshot", "configs", filename), _text_with_platform(text, platform))
+
+
+class _FileChunks:
+    """Chunks of a file, read from the start each time it is iterated."""
+
+    def __init__(self, fd: IO[bytes], chunk_size: int = 1 << 20) -> None:
+        self._fd = fd
+        self._chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._fd.seek(0, SEEK_SET)
+        return iter(functools.partial(self._fd.read, self._chunk_size), b"")
+
+
 def _version_to_tuple(version: str) -> tuple[int, ...]:
     """Convert version string N(.N)* to a tuple of ints."""
     return tuple(int(i) for i in version.split("."))
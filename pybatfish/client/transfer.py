@@ -0,0 +1,247 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Progress and metrics of uploads to and downloads from the Batfish service."""
+
+from __future__ import annotations
+
+import io
+import logging
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import TYPE_CHECKING, Any
+
+import attr
+from requests.utils import super_len
+
+from pybatfish.client.options import Options
+
+if TYPE_CHECKING:
+    from requests import Response
+
+    from pybatfish.client.session import Session
+
+__all__ = ["TransferCallback", "TransferMetrics", "log_progress"]
+
+
+@attr.s(frozen=True)
+class TransferMetrics:
+    """Progress of an upload or download.
+
+    :ivar direction: ``upload`` or ``download``
+    :ivar url: the URL of the request, relative to the service base URL
+    :ivar bytes: number of bytes transferred so far
+    :ivar total_bytes: number of bytes to transfer, if known in advance
+    :ivar duration: seconds since the transfer started
+    :ivar retries: number of times the request was retried
+    :ivar done: whether the transfer is complete
+    """
+
+    direction: str = attr.ib()
+    url: str = attr.ib()
+    bytes: int = attr.ib()
+    total_bytes: int | None = attr.ib()
+    duration: float = attr.ib()
+    retries: int = attr.ib(default=0)
+    done: bool = attr.ib(default=False)
+
+    @property
+    def throughput(self) -> float:
+        """Average bytes per second."""
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+
+TransferCallback = Callable[[TransferMetrics], None]
+
+
+def log_progress(metrics: TransferMetrics) -> None:
+    """Log the progress of a transfer, the default :py:attr:`Session.transfer_callback
+    <pybatfish.client.session.Session.transfer_callback>`.
+
+    Completed transfers are logged at ``INFO`` level and progress updates at
+    ``DEBUG`` level.
+    """
+    total = "" if metrics.total_bytes is None else f"/{metrics.total_bytes}"
+    logging.getLogger(__name__).log(
+        logging.INFO if metrics.done else logging.DEBUG,
+        "%s %s: %s%s bytes in %.1fs (%.1f KB/s, %s retries)%s",
+        metrics.direction.capitalize(),
+        metrics.url,
+        metrics.bytes,
+        total,
+        metrics.duration,
+        metrics.throughput / 1000,
+        metrics.retries,
+        "" if metrics.done else "...",
+    )
+
+
+class _Transfer:
+    """Tracks one transfer, reporting progress to the session's callback at
+    most every :py:attr:`Options.transfer_progress_interval` seconds."""
+
+    def __init__(self, session: Session, direction: str, url: str, total_bytes: int | None = None) -> None:
+        self._session = session
+        self._direction = direction
+        self._url = url
+        self.total_bytes = total_bytes
+        self.bytes = 0
+        self.retries = 0
+        self.done = False
+        self._sent_whole = False
+        self._start = time.monotonic()
+        self._last_report = self._start
+
+    def metrics(self) -> TransferMetrics:
+        return TransferMetrics(
+            self._direction,
+            self._url,
+            self.bytes,
+            self.total_bytes,
+            time.monotonic() - self._start,
+            self.retries,
+            self.done,
+        )
+
+    def add(self, nbytes: int) -> None:
+        self.bytes += nbytes
+        now = time.monotonic()
+        if now - self._last_report >= Options.transfer_progress_interval:
+            self._last_report = now
+            self._report(self.metrics())
+
+    def finish(self, response: Response | None = None) -> None:
+        if self.done:
+            return
+        if response is not None:
+            self.retries += _retries(response)
+        self.done = True
+        metrics = self.metrics()
+        self._session.transfers.append(metrics)
+        self._report(metrics)
+
+    def upload_body(self, data: Any) -> Any:
+        """Return the body to send instead of ``data``, counting the bytes sent."""
+        if isinstance(data, (str, bytes)):
+            # Sent in one go, counted when the request completes
+            self.total_bytes = len(data)
+            self._sent_whole = True
+            return data
+        if hasattr(data, "read"):
+            total = super_len(data)
+            if total:
+                self.total_bytes = total
+                return _CountingUpload(data, self)
+            return self._count_chunks(iter(lambda: data.read(1 << 16), b""))
+        if isinstance(data, Iterable):
+            return self._count_chunks(data)
+        return data
+
+    def _count_chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.add(len(chunk))
+            yield chunk
+
+    def restart(self) -> None:
+        """Record that the upload is sent again from the start."""
+        self.retries += 1
+        self.bytes = 0
+
+    def finish_upload(self, response: Response) -> None:
+        if self._sent_whole:
+            self.bytes = self.total_bytes or 0
+        self.finish(response)
+
+    def _report(self, metrics: TransferMetrics) -> None:
+        callback = self._session.transfer_callback
+        if callback is not None:
+            callback(metrics)
+
+
+class _CountingUpload:
+    """File-like request body counting the bytes read from a stream.
+
+    Like the stream, it can be rewound when the request is retried.
+    """
+
+    def __init__(self, stream: Any, transfer: _Transfer) -> None:
+        self._stream = stream
+        self._transfer = transfer
+        self._start = stream.tell() if hasattr(stream, "tell") else 0
+
+    def read(self, amt: int = -1) -> bytes:
+        data: bytes = self._stream.read(amt)
+        self._transfer.add(len(data))
+        return data
+
+    def __len__(self) -> int:
+        # Size of the stream up to the end of the body, for the Content-Length header
+        return self._start + (self._transfer.total_bytes or 0)
+
+    def seekable(self) -> bool:
+        seekable = getattr(self._stream, "seekable", None)
+        return seekable is not None and bool(seekable())
+
+    def tell(self) -> int:
+        position: int = self._stream.tell()
+        return position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        position: int = self._stream.seek(offset, whence)
+        self._transfer.bytes = max(0, position - self._start)
+        return position
+
+
+class _CountingDownload(io.RawIOBase):
+    """Response stream counting the bytes read from it.
+
+    The download is finished when the end of the stream is read or the
+    stream is closed.
+    """
+
+    def __init__(self, stream: Any, transfer: _Transfer) -> None:
+        super().__init__()
+        self._stream = stream
+        self._transfer = transfer
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data: bytes = self._stream.read(len(buffer))
+        n = len(data)
+        memoryview(buffer).cast("B")[:n] = data
+        self._transfer.add(n)
+        if not n:
+            self._transfer.finish()
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._transfer.finish()
+            self._stream.close()
+        super().close()
+
+
+def _retries(response: Response) -> int:
+    """Return the number of times urllib3 retried the request of a response."""
+    retry = getattr(response.raw, "retries", None)
+    return len(getattr(retry, "history", None) or ())
+
+
+def _download_body(session: Session, url: str, response: Response) -> io.BufferedReader:
+    """Return the body stream of a response, reporting the bytes read from it."""
+    length = response.headers.get("Content-Length")
+    transfer = _Transfer(session, "download", url, int(length) if length and length.isdigit() else None)
+    transfer.retries = _retries(response)
+    return io.BufferedReader(_CountingDownload(response.raw, transfer))
@@ -23,6 +23,7 @@ import tempfile
 import time
 from typing import IO, TYPE_CHECKING, Any
 
+import attr
 from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
 from dateutil.tz import tzlocal
@@ -199,7 +200,7 @@ def get_data_configure_question_template(session, in_question, exceptions, asser
     if exceptions:
         json_data[CoordConsts.SVC_KEY_EXCEPTIONS] = json.dumps(exceptions)
     if assertion:
-        json_data[CoordConsts.SVC_KEY_ASSERTION] = json.dumps(assertion.__dict__)
+        json_data[CoordConsts.SVC_KEY_ASSERTION] = json.dumps(attr.asdict(assertion, recurse=False))
     return json_data
 
 
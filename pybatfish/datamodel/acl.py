@@ -30,7 +30,7 @@ __all__ = [
 ]
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AclTraceEvent(DataModelElement):
     """One event corresponding to a packet's life through an ACL.
 
@@ -49,7 +49,7 @@ class AclTraceEvent(DataModelElement):
         return str(self.description)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AclTrace(DataModelElement):
     """The trace of a packet's life through an ACL.
 
@@ -68,7 +68,7 @@ class AclTrace(DataModelElement):
         return "\n".join(str(event) for event in self.events if event.description is not None)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class VendorStructureId(DataModelElement):
     """Identifies a vendor structure in a configuration file.
 
@@ -95,6 +95,8 @@ class Fragment(DataModelElement):
     :py:class:`TextFragment` or :py:class:`LinkFragment`.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_dict(cls, json_dict: dict) -> "Fragment":
         if json_dict["class"] == "org.batfish.datamodel.TraceElement$TextFragment":
@@ -104,7 +106,7 @@ class Fragment(DataModelElement):
         raise ValueError("Unknown Fragment type {}".format(json_dict["class"]))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TextFragment(Fragment):
     """Represents a plain-text :py:class:`Fragment`.
 
@@ -121,7 +123,7 @@ class TextFragment(Fragment):
         return self.text
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class LinkFragment(Fragment):
     """Represents a :py:class:`Fragment` that links to a vendor structure.
 
@@ -143,7 +145,7 @@ class LinkFragment(Fragment):
         return self.text
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TraceElement(DataModelElement):
     """Metadata used to create human-readable traces.
 
@@ -160,7 +162,7 @@ class TraceElement(DataModelElement):
         return "".join(str(fragment) for fragment in self.fragments)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TraceTree(DataModelElement):
     """Represents a filter trace tree.
 
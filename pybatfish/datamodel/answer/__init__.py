@@ -12,6 +12,8 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+# Registers the ``bf`` data frame accessor
+from pybatfish.datamodel.answer import ipcolumns  # noqa: F401
 from pybatfish.datamodel.answer.base import Answer
 from pybatfish.datamodel.answer.table import TableAnswer
 
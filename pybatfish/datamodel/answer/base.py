@@ -17,6 +17,7 @@ import re
 from typing import Any
 
 from pybatfish.datamodel.acl import AclTrace, TraceTree, TraceTreeList
+from pybatfish.datamodel.answer.tracestore import _get_trace_store
 from pybatfish.datamodel.flow import Flow, FlowTrace, Trace
 from pybatfish.datamodel.primitives import FileLines, Interface, ListWrapper
 from pybatfish.datamodel.route import BgpRoute, BgpRouteDiffs, NextHop
@@ -70,6 +71,10 @@ def _parse_json_with_schema(schema: str, json_object: Any) -> Any:
         # Handle special iterable schemas that has a custom container class
         if base_schema == "TraceTree":
             return TraceTreeList([TraceTree.from_dict(element) for element in json_object])
+        if base_schema == "Trace":
+            store = _get_trace_store()
+            if store is not None:
+                return store.traces(json_object)
 
         return ListWrapper([_parse_json_with_schema(base_schema, element) for element in json_object])
 
@@ -103,6 +108,9 @@ def _parse_json_with_schema(schema: str, json_object: Any) -> Any:
     if schema == "String":
         return str(json_object)
     if schema == "Trace":
+        store = _get_trace_store()
+        if store is not None:
+            return store.trace(store.add(json_object))
         return Trace.from_dict(json_object)
     if schema == "TraceTree":
         return TraceTree.from_dict(json_object)
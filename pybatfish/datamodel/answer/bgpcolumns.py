@@ -0,0 +1,309 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Column-oriented decoding of BGP route columns of large answers."""
+
+from __future__ import annotations
+
+from collections.abc import Hashable, Iterable, Iterator
+from typing import TYPE_CHECKING, Any
+
+import numpy
+import pandas
+
+from pybatfish.datamodel.answer.ipcolumns import PrefixArray
+from pybatfish.datamodel.route import BgpRoute, BgpRouteDiff, BgpRouteDiffs
+
+if TYPE_CHECKING:
+    from pybatfish.datamodel.answer.table import TableAnswer
+
+__all__ = ["BgpRouteDiffsTable", "BgpRouteTable"]
+
+# String fields: table field, JSON key
+_STRING_FIELDS = [
+    ("network", "network"),
+    ("originator_ip", "originatorIp"),
+    ("origin_type", "originType"),
+    ("protocol", "protocol"),
+    ("next_hop_ip", "nextHopIp"),
+    ("source_protocol", "srcProtocol"),
+]
+# Integer fields: table field, JSON key
+_INT_FIELDS = [
+    ("local_preference", "localPreference"),
+    ("metric", "metric"),
+    ("tag", "tag"),
+    ("weight", "weight"),
+]
+
+
+class _Interner:
+    """Assigns consecutive ids to distinct values."""
+
+    def __init__(self) -> None:
+        self.ids: dict[Hashable, int] = {}
+        self.values: list[Any] = []
+
+    def __call__(self, value: Any) -> int:
+        key = tuple(value) if isinstance(value, list) else value
+        value_id = self.ids.get(key)
+        if value_id is None:
+            value_id = self.ids[key] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+
+class BgpRouteTable:
+    """BGP routes stored field by field in NumPy arrays.
+
+    Fields:
+
+    * ``network``, ``originator_ip``, ``origin_type``, ``protocol``,
+      ``next_hop_ip``, ``source_protocol``: ``int32`` codes into the list of
+      distinct values, see :py:meth:`categories`
+    * ``local_preference``, ``metric`` (MED), ``tag``, ``weight``: ``int64``
+
+    AS paths and communities are variable-length, and are stored back to
+    back with the offsets where the values of each route start. Communities
+    are ids into :py:attr:`communities`. AS path elements are AS numbers,
+    or ``-1 - i`` for the AS set :py:attr:`as_sets` ``[i]``.
+
+    :py:class:`~pybatfish.datamodel.route.BgpRoute` objects are built on
+    demand with :py:meth:`route`.
+
+    :ivar rows: for each route, the index of the answer row it came from
+    """
+
+    def __init__(self, routes: Iterable[dict[str, Any] | None]) -> None:
+        rows = []
+        strings = {field: _Interner() for field, _ in _STRING_FIELDS}
+        codes: dict[str, list[int]] = {field: [] for field, _ in _STRING_FIELDS}
+        ints: dict[str, list[int]] = {field: [] for field, _ in _INT_FIELDS}
+        as_path_offsets = [0]
+        as_path_values: list[int] = []
+        as_sets = _Interner()
+        community_offsets = [0]
+        community_ids: list[int] = []
+        communities = _Interner()
+        for row, route in enumerate(routes):
+            if route is None:
+                continue
+            rows.append(row)
+            for field, key in _STRING_FIELDS:
+                codes[field].append(strings[field](route.get(key)))
+            for field, key in _INT_FIELDS:
+                ints[field].append(int(route.get(key) or 0))
+            for element in route.get("asPath", []):
+                as_path_values.append(-1 - as_sets(element) if isinstance(element, list) else int(element))
+            as_path_offsets.append(len(as_path_values))
+            community_ids.extend(communities(c) for c in route.get("communities", []))
+            community_offsets.append(len(community_ids))
+        self._data: dict[str, numpy.ndarray] = {}
+        for field, _ in _STRING_FIELDS:
+            self._data[field] = numpy.array(codes[field], dtype=numpy.int32)
+        for field, _ in _INT_FIELDS:
+            self._data[field] = numpy.array(ints[field], dtype=numpy.int64)
+        self._categories: dict[str, list[Any]] = {field: strings[field].values for field, _ in _STRING_FIELDS}
+        self.as_path_offsets = numpy.array(as_path_offsets, dtype=numpy.int64)
+        self.as_path_values = numpy.array(as_path_values, dtype=numpy.int64)
+        self.as_sets: list[list[int]] = as_sets.values
+        self.community_offsets = numpy.array(community_offsets, dtype=numpy.int64)
+        self.community_ids = numpy.array(community_ids, dtype=numpy.int32)
+        self.communities: list[Any] = communities.values
+        self.rows = numpy.array(rows, dtype=numpy.int64)
+
+    @classmethod
+    def from_answer(cls, answer: TableAnswer, column: str) -> BgpRouteTable:
+        """Decode a ``BgpRoute`` column of a table answer, skipping empty cells.
+
+        Routes are decoded from the raw answer JSON without creating
+        :py:class:`~pybatfish.datamodel.route.BgpRoute` objects.
+        """
+        _check_schema(answer, column, "BgpRoute")
+        return cls(answer._raw_column(column))
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self._data)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def array(self, field: str) -> numpy.ndarray:
+        """Return the raw array of a field (codes for string fields)."""
+        if field not in self._data:
+            raise ValueError(f"Unknown field {field}, valid fields are {self.fields}")
+        return self._data[field]
+
+    def values(self, field: str) -> numpy.ndarray:
+        """Return the values of a field, with strings for string fields."""
+        data = self.array(field)
+        if field in self._categories:
+            values: numpy.ndarray = numpy.array(self._categories[field], dtype=object)[data]
+            return values
+        return data
+
+    def categories(self, field: str) -> list[Any]:
+        """Return the distinct values of a string field, indexed by code."""
+        self.array(field)
+        return list(self._categories[field])
+
+    def networks(self) -> PrefixArray:
+        """Return the networks of the routes as a :py:class:`~pybatfish.datamodel.answer.ipcolumns.PrefixArray`."""
+        return PrefixArray.from_strings(self._categories["network"])[self._data["network"]]
+
+    def as_path_lengths(self) -> numpy.ndarray:
+        """Return the number of AS path elements of each route."""
+        lengths: numpy.ndarray = numpy.diff(self.as_path_offsets)
+        return lengths
+
+    def has_as(self, asn: int) -> numpy.ndarray:
+        """Return the mask of routes whose AS path contains an AS number (outside AS sets)."""
+        return _any_per_route(self.as_path_offsets, self.as_path_values == asn)
+
+    def has_community(self, community: Any) -> numpy.ndarray:
+        """Return the mask of routes that have a community."""
+        if community not in self.communities:
+            return numpy.zeros(len(self), dtype=bool)
+        return _any_per_route(self.community_offsets, self.community_ids == self.communities.index(community))
+
+    def as_path(self, index: int) -> list[Any]:
+        """Return the AS path of the route at the given position."""
+        values = self.as_path_values[self.as_path_offsets[index] : self.as_path_offsets[index + 1]]
+        return [int(v) if v >= 0 else list(self.as_sets[-1 - v]) for v in values]
+
+    def route_communities(self, index: int) -> list[Any]:
+        """Return the communities of the route at the given position."""
+        ids = self.community_ids[self.community_offsets[index] : self.community_offsets[index + 1]]
+        return [self.communities[i] for i in ids]
+
+    def route(self, index: int) -> BgpRoute:
+        """Return the route at the given position as a :py:class:`~pybatfish.datamodel.route.BgpRoute`."""
+        strings = {field: self._categories[field][self._data[field][index]] for field, _ in _STRING_FIELDS}
+        return BgpRoute(
+            network=strings["network"],
+            originatorIp=strings["originator_ip"],
+            originType=strings["origin_type"],
+            protocol=strings["protocol"],
+            asPath=self.as_path(index),
+            communities=self.route_communities(index),
+            localPreference=int(self._data["local_preference"][index]),
+            metric=int(self._data["metric"][index]),
+            nextHopIp=strings["next_hop_ip"],
+            sourceProtocol=strings["source_protocol"],
+            tag=int(self._data["tag"][index]),
+            weight=int(self._data["weight"][index]),
+        )
+
+    def __getitem__(self, index: int) -> BgpRoute:
+        return self.route(index)
+
+    def __iter__(self) -> Iterator[BgpRoute]:
+        for i in range(len(self)):
+            yield self.route(i)
+
+    def to_frame(self) -> pandas.DataFrame:
+        """Return the scalar fields and AS path lengths as a :py:class:`pandas.DataFrame`."""
+        columns: dict[str, Any] = {}
+        for field, values in self._data.items():
+            if field in self._categories:
+                columns[field] = pandas.Categorical(numpy.array(self._categories[field], dtype=object)[values])
+            else:
+                columns[field] = values
+        columns["as_path_length"] = self.as_path_lengths()
+        return pandas.DataFrame(columns, index=self.rows)
+
+
+class BgpRouteDiffsTable:
+    """Differences between BGP routes stored in NumPy arrays.
+
+    Every diff is a field name code and codes of the old and new values, into
+    :py:attr:`field_names` and :py:attr:`diff_values`. The diffs of each row
+    are stored back to back, starting at :py:attr:`offsets`.
+
+    :ivar rows: for each entry, the index of the answer row it came from
+    """
+
+    def __init__(self, diffs: Iterable[dict[str, Any] | None]) -> None:
+        rows = []
+        offsets = [0]
+        field_names = _Interner()
+        diff_values = _Interner()
+        field_codes: list[int] = []
+        old_codes: list[int] = []
+        new_codes: list[int] = []
+        for row, route_diffs in enumerate(diffs):
+            if route_diffs is None:
+                continue
+            rows.append(row)
+            for diff in route_diffs.get("diffs", []):
+                field_codes.append(field_names(diff["fieldName"]))
+                old_codes.append(diff_values(diff["oldValue"]))
+                new_codes.append(diff_values(diff["newValue"]))
+            offsets.append(len(field_codes))
+        self.offsets = numpy.array(offsets, dtype=numpy.int64)
+        self.field_codes = numpy.array(field_codes, dtype=numpy.int32)
+        self.old_codes = numpy.array(old_codes, dtype=numpy.int32)
+        self.new_codes = numpy.array(new_codes, dtype=numpy.int32)
+        self.field_names: list[str] = field_names.values
+        self.diff_values: list[Any] = diff_values.values
+        self.rows = numpy.array(rows, dtype=numpy.int64)
+
+    @classmethod
+    def from_answer(cls, answer: TableAnswer, column: str) -> BgpRouteDiffsTable:
+        """Decode a ``BgpRouteDiffs`` column of a table answer, skipping empty cells."""
+        _check_schema(answer, column, "BgpRouteDiffs")
+        return cls(answer._raw_column(column))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def changed(self, field_name: str) -> numpy.ndarray:
+        """Return the mask of entries with a difference in the given field (e.g., ``asPath``)."""
+        if field_name not in self.field_names:
+            return numpy.zeros(len(self), dtype=bool)
+        return _any_per_route(self.offsets, self.field_codes == self.field_names.index(field_name))
+
+    def diffs(self, index: int) -> BgpRouteDiffs:
+        """Return the entry at the given position as a :py:class:`~pybatfish.datamodel.route.BgpRouteDiffs`."""
+        return BgpRouteDiffs(
+            [
+                BgpRouteDiff(
+                    self.field_names[self.field_codes[i]],
+                    self.diff_values[self.old_codes[i]],
+                    self.diff_values[self.new_codes[i]],
+                )
+                for i in range(self.offsets[index], self.offsets[index + 1])
+            ]
+        )
+
+    def __getitem__(self, index: int) -> BgpRouteDiffs:
+        return self.diffs(index)
+
+    def __iter__(self) -> Iterator[BgpRouteDiffs]:
+        for i in range(len(self)):
+            yield self.diffs(i)
+
+
+def _check_schema(answer: TableAnswer, column: str, schema: str) -> None:
+    schemas = {cm.name: cm.schema for cm in answer.metadata.column_metadata}
+    if schemas.get(column) != schema:
+        raise ValueError(f"Column {column} of the answer does not hold {schema} values")
+
+
+def _any_per_route(offsets: numpy.ndarray, matches: numpy.ndarray) -> numpy.ndarray:
+    """Return, for each route, whether any of its values (between consecutive offsets) match."""
+    owners = numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets))
+    result = numpy.zeros(len(offsets) - 1, dtype=bool)
+    result[owners[matches]] = True
+    return result
@@ -0,0 +1,329 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Client-side differential of two table answers."""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from collections.abc import Hashable, Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import numpy
+import pandas
+
+from pybatfish.datamodel.answer.base import _parse_json_with_schema
+
+if TYPE_CHECKING:
+    from pybatfish.datamodel.answer.table import TableAnswer
+
+__all__ = ["RowDiff", "TableDiff", "diff_answers", "iter_diff_answers"]
+
+# Entry of a sorted run: canonical key, row position and value digests
+_RunEntry = tuple[str, int, list[str]]
+
+_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+class TableDiff:
+    """Differences between the rows of two answers to the same question.
+
+    Rows are matched on their key columns (``isKey`` in the column
+    metadata). Matched rows whose value columns (``isValue`` and not
+    ``isKey``) differ are changed.
+
+    :ivar key_columns: names of the key columns
+    :ivar value_columns: names of the compared value columns
+    :ivar added: rows of the snapshot answer that have no match in the reference answer
+    :ivar removed: rows of the reference answer that have no match in the snapshot answer
+    :ivar changed: changed rows, with the key columns and ``Snapshot_<column>``
+        and ``Reference_<column>`` for every value column
+    :ivar change_mask: for each changed row, which value columns differ
+    """
+
+    def __init__(
+        self,
+        key_columns: list[str],
+        value_columns: list[str],
+        added: pandas.DataFrame,
+        removed: pandas.DataFrame,
+        changed: pandas.DataFrame,
+        change_mask: pandas.DataFrame,
+    ) -> None:
+        self.key_columns = key_columns
+        self.value_columns = value_columns
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.change_mask = change_mask
+
+    @property
+    def empty(self) -> bool:
+        """Whether the answers have the same rows."""
+        return bool(self.added.empty and self.removed.empty and self.changed.empty)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed rows"
+
+    def __repr__(self) -> str:
+        return f"<TableDiff: {self}>"
+
+
+class RowDiff(NamedTuple):
+    """A difference between two answers, see :py:func:`iter_diff_answers`.
+
+    :ivar kind: ``added``, ``removed`` or ``changed``
+    :ivar snapshot: the decoded snapshot row, ``None`` for removed rows
+    :ivar reference: the decoded reference row, ``None`` for added rows
+    :ivar changed_columns: the value columns that differ, for changed rows
+    """
+
+    kind: str
+    snapshot: dict[str, Any] | None
+    reference: dict[str, Any] | None
+    changed_columns: list[str]
+
+
+def diff_answers(snapshot: TableAnswer, reference: TableAnswer) -> TableDiff:
+    """Compare two answers to the same question, see :py:meth:`TableAnswer.diff
+    <pybatfish.datamodel.answer.table.TableAnswer.diff>`.
+
+    Rows are joined on a hash of their canonicalized key cells, in time
+    linear in the number of rows. Only added, removed and changed rows are
+    decoded.
+    """
+    key_columns, value_columns = _diff_columns(snapshot, reference)
+    reference_rows: dict[Hashable, int] = {}
+    for position, key in enumerate(_row_keys(reference, key_columns)):
+        reference_rows[key] = position
+    reference_values = _row_values(reference, value_columns)
+
+    added = []
+    matched: list[tuple[int, int]] = []
+    for position, key in enumerate(_row_keys(snapshot, key_columns)):
+        reference_position = reference_rows.pop(key, None)
+        if reference_position is None:
+            added.append(position)
+        else:
+            matched.append((position, reference_position))
+    removed = sorted(reference_rows.values())
+
+    snapshot_values = _row_values(snapshot, value_columns)
+    changed = []
+    masks = []
+    for position, reference_position in matched:
+        mask = [a != b for a, b in zip(snapshot_values[position], reference_values[reference_position])]
+        if any(mask):
+            changed.append((position, reference_position))
+            masks.append(mask)
+    return TableDiff(
+        key_columns,
+        value_columns,
+        snapshot._rows_frame(added),
+        reference._rows_frame(removed),
+        _changed_frame(snapshot, reference, changed, key_columns, value_columns),
+        pandas.DataFrame(numpy.array(masks, dtype=bool).reshape(len(masks), len(value_columns)), columns=value_columns),
+    )
+
+
+def _diff_columns(snapshot: TableAnswer, reference: TableAnswer) -> tuple[list[str], list[str]]:
+    """Return the key and value columns to compare two answers on."""
+    schemas = [(cm.name, cm.schema) for cm in snapshot.metadata.column_metadata]
+    reference_schemas = [(cm.name, cm.schema) for cm in reference.metadata.column_metadata]
+    if schemas != reference_schemas:
+        raise ValueError(f"Answers have different columns: {schemas} and {reference_schemas}")
+    key_columns = [cm.name for cm in snapshot.metadata.column_metadata if cm.isKey]
+    value_columns = [cm.name for cm in snapshot.metadata.column_metadata if cm.isValue and not cm.isKey]
+    # Spilled answers created with columns= do not store the other columns
+    snapshot._check_stored(key_columns + value_columns)
+    reference._check_stored(key_columns + value_columns)
+    return key_columns, value_columns
+
+
+def _canonical(value: Any) -> Hashable:
+    """Return a hashable form of a JSON value, equal for equal values."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return _encoder.encode(value)
+
+
+def _row_keys(answer: TableAnswer, columns: Sequence[str]) -> Iterator[Hashable]:
+    """Return the canonical key of every row of an answer.
+
+    Rows with the same key cells are told apart by their occurrence number,
+    so duplicates are matched in order.
+    """
+    occurrences: dict[tuple, int] = {}
+    for cells in _raw_columns(answer, columns):
+        key = tuple(_canonical(cell) for cell in cells)
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        yield key, occurrence
+
+
+def _row_values(answer: TableAnswer, columns: Sequence[str]) -> list[tuple]:
+    return [tuple(_canonical(cell) for cell in cells) for cells in _raw_columns(answer, columns)]
+
+
+def _raw_columns(answer: TableAnswer, columns: Sequence[str]) -> Iterable[tuple]:
+    if not columns:
+        return (() for _ in range(len(answer)))
+    return zip(*(answer._raw_column(name) for name in columns))
+
+
+def _changed_frame(
+    snapshot: TableAnswer,
+    reference: TableAnswer,
+    changed: list[tuple[int, int]],
+    key_columns: list[str],
+    value_columns: list[str],
+) -> pandas.DataFrame:
+    snapshot_frame = snapshot._rows_frame(position for position, _ in changed)
+    reference_frame = reference._rows_frame(position for _, position in changed)
+    columns = {name: snapshot_frame[name] for name in key_columns}
+    for name in value_columns:
+        columns[f"Snapshot_{name}"] = snapshot_frame[name]
+        columns[f"Reference_{name}"] = reference_frame[name]
+    return pandas.DataFrame(columns, columns=list(columns))
+
+
+def iter_diff_answers(
+    snapshot: TableAnswer,
+    reference: TableAnswer,
+    chunk_rows: int = 100000,
+    spill_dir: str | None = None,
+) -> Iterator[RowDiff]:
+    """Compare two answers in bounded memory, see :py:meth:`TableAnswer.iter_diff
+    <pybatfish.datamodel.answer.table.TableAnswer.iter_diff>`.
+
+    The rows of each answer are reduced to their canonical key and digests
+    of their value cells, sorted in runs of ``chunk_rows`` that are written
+    to temporary files, and merged. Differences are yielded in key order.
+    Rows with equal keys are matched in order.
+
+    Memory is only bounded once the answers are spilled: answers fetched
+    from the coordinator are downloaded and parsed whole (see
+    :py:func:`~pybatfish.client.restv2helper.get_answer`) before their rows
+    can be spilled, as the JSON body is not parsed incrementally.
+    """
+    key_columns, value_columns = _diff_columns(snapshot, reference)
+    with tempfile.TemporaryDirectory(prefix="pybf-diff-", dir=spill_dir) as directory:
+        snapshot_groups = _key_groups(_sorted_entries(snapshot, key_columns, value_columns, chunk_rows, directory))
+        reference_groups = _key_groups(_sorted_entries(reference, key_columns, value_columns, chunk_rows, directory))
+        snapshot_group = next(snapshot_groups, None)
+        reference_group = next(reference_groups, None)
+        while snapshot_group is not None or reference_group is not None:
+            # Diff the rows with the smallest key on either side
+            key = min(group[0] for group in (snapshot_group, reference_group) if group is not None)
+            snapshot_entries: list[_RunEntry] = []
+            reference_entries: list[_RunEntry] = []
+            if snapshot_group is not None and snapshot_group[0] == key:
+                snapshot_entries = snapshot_group[1]
+                snapshot_group = next(snapshot_groups, None)
+            if reference_group is not None and reference_group[0] == key:
+                reference_entries = reference_group[1]
+                reference_group = next(reference_groups, None)
+            yield from _diff_group(snapshot, reference, snapshot_entries, reference_entries, value_columns)
+
+
+def _sorted_entries(
+    answer: TableAnswer,
+    key_columns: Sequence[str],
+    value_columns: Sequence[str],
+    chunk_rows: int,
+    directory: str,
+) -> Iterator[_RunEntry]:
+    """Return the run entries of all rows of an answer, sorted by key and position."""
+    runs: list[str] = []
+    chunk: list[_RunEntry] = []
+    rows = zip(_raw_columns(answer, key_columns), _raw_columns(answer, value_columns))
+    for position, (keys, values) in enumerate(rows):
+        chunk.append((_encoder.encode(list(keys)), position, [_digest(value) for value in values]))
+        if len(chunk) >= chunk_rows:
+            runs.append(_write_run(chunk, directory))
+            chunk = []
+    if not runs:
+        chunk.sort()
+        return iter(chunk)
+    if chunk:
+        runs.append(_write_run(chunk, directory))
+    return heapq.merge(*(_read_run(path) for path in runs))
+
+
+def _write_run(chunk: list[_RunEntry], directory: str) -> str:
+    chunk.sort()
+    fd, path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        for entry in chunk:
+            f.write(json.dumps(entry))
+            f.write("\n")
+    return path
+
+
+def _read_run(path: str) -> Iterator[_RunEntry]:
+    with open(path) as f:
+        for line in f:
+            key, position, digests = json.loads(line)
+            yield key, position, digests
+
+
+def _key_groups(entries: Iterator[_RunEntry]) -> Iterator[tuple[str, list[_RunEntry]]]:
+    for key, group in itertools.groupby(entries, key=lambda entry: entry[0]):
+        yield key, list(group)
+
+
+def _diff_group(
+    snapshot: TableAnswer,
+    reference: TableAnswer,
+    snapshot_entries: list[_RunEntry],
+    reference_entries: list[_RunEntry],
+    value_columns: Sequence[str],
+) -> Iterator[RowDiff]:
+    """Yield the differences between rows with the same key."""
+    for snapshot_entry, reference_entry in itertools.zip_longest(snapshot_entries, reference_entries):
+        if reference_entry is None:
+            yield RowDiff("added", _decode_row(snapshot, snapshot_entry[1]), None, [])
+        elif snapshot_entry is None:
+            yield RowDiff("removed", None, _decode_row(reference, reference_entry[1]), [])
+        else:
+            changed = [
+                name for name, new, old in zip(value_columns, snapshot_entry[2], reference_entry[2]) if new != old
+            ]
+            if changed:
+                yield RowDiff(
+                    "changed",
+                    _decode_row(snapshot, snapshot_entry[1]),
+                    _decode_row(reference, reference_entry[1]),
+                    changed,
+                )
+
+
+def _digest(value: Any) -> str:
+    """Return a short digest of a JSON value, equal for equal values."""
+    return hashlib.blake2b(_encoder.encode(value).encode(), digest_size=8).hexdigest()
+
+
+def _decode_row(answer: TableAnswer, position: int) -> dict[str, Any]:
+    row = answer.rows[position]
+    stored = set(answer._stored_columns())
+    with answer._decoding():
+        return {
+            cm.name: _parse_json_with_schema(cm.schema, row.get(cm.name))
+            for cm in answer.metadata.column_metadata
+            if cm.name in stored
+        }
@@ -0,0 +1,328 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Column-oriented storage of many flows in NumPy arrays."""
+
+from __future__ import annotations
+
+import socket
+from collections.abc import Callable, Iterable, Iterator
+from typing import TYPE_CHECKING, Any
+
+import numpy
+import pandas
+
+from pybatfish.datamodel.flow import Flow, HeaderConstraints
+
+if TYPE_CHECKING:
+    from pybatfish.datamodel.answer.table import TableAnswer
+
+__all__ = ["FlowTable"]
+
+# Numeric fields: table field, Flow attribute, dtype, whether it can be missing
+_NUMERIC_FIELDS = [
+    ("src_port", "srcPort", numpy.uint16, True),
+    ("dst_port", "dstPort", numpy.uint16, True),
+    ("icmp_type", "icmpVar", numpy.int16, True),
+    ("icmp_code", "icmpCode", numpy.int16, True),
+    ("dscp", "dscp", numpy.uint8, False),
+    ("ecn", "ecn", numpy.uint8, False),
+    ("fragment_offset", "fragmentOffset", numpy.uint16, False),
+    ("packet_length", "packetLength", numpy.uint32, False),
+]
+# IPv4 address fields, stored as uint32
+_IP_FIELDS = [("src_ip", "srcIp"), ("dst_ip", "dstIp")]
+# String fields, stored as int32 codes into a list of distinct values
+_CATEGORICAL_FIELDS = [
+    ("ip_protocol", "ipProtocol"),
+    ("ingress_node", "ingressNode"),
+    ("ingress_interface", "ingressInterface"),
+    ("ingress_vrf", "ingressVrf"),
+]
+# Bits of the tcp_flags field
+_TCP_FLAG_BITS = [
+    ("tcpFlagsFin", 1),
+    ("tcpFlagsSyn", 2),
+    ("tcpFlagsRst", 4),
+    ("tcpFlagsPsh", 8),
+    ("tcpFlagsAck", 16),
+    ("tcpFlagsUrg", 32),
+    ("tcpFlagsEce", 64),
+    ("tcpFlagsCwr", 128),
+]
+
+
+class FlowTable:
+    """Flows stored field by field in NumPy arrays, for vectorized analysis.
+
+    Fields:
+
+    * ``src_ip``, ``dst_ip``: IPv4 addresses as ``uint32``
+    * ``src_port``, ``dst_port``, ``icmp_type``, ``icmp_code``, ``dscp``,
+      ``ecn``, ``fragment_offset``, ``packet_length``: integers
+    * ``tcp_flags``: bitmask with FIN=1, SYN=2, RST=4, PSH=8, ACK=16, URG=32,
+      ECE=64 and CWR=128
+    * ``ip_protocol``, ``ingress_node``, ``ingress_interface``,
+      ``ingress_vrf``: ``int32`` codes into the list of distinct values,
+      see :py:meth:`categories`
+
+    Optional fields (ports, ICMP type and code, TCP flags) have a missing
+    mask, see :py:meth:`missing`.
+
+    :ivar rows: for each flow, the index of the answer row it came from
+    """
+
+    def __init__(
+        self,
+        data: dict[str, numpy.ndarray],
+        missing: dict[str, numpy.ndarray],
+        categories: dict[str, list[str | None]],
+        rows: numpy.ndarray,
+    ) -> None:
+        self._data = data
+        self._missing = missing
+        self._categories = categories
+        self.rows = rows
+
+    @classmethod
+    def from_answer(cls, answer: TableAnswer, column: str = "Flow") -> FlowTable:
+        """Decode a ``Flow`` column of a table answer, skipping empty cells.
+
+        Flows are decoded from the raw answer JSON without creating
+        :py:class:`~pybatfish.datamodel.flow.Flow` objects.
+        """
+        schemas = {cm.name: cm.schema for cm in answer.metadata.column_metadata}
+        if schemas.get(column) != "Flow":
+            raise ValueError(f"Column {column} of the answer does not hold flows")
+        return cls.from_dicts(answer._raw_column(column))
+
+    @classmethod
+    def from_dicts(cls, flows: Iterable[dict[str, Any] | None]) -> FlowTable:
+        """Create a table from the JSON of flows. ``None`` entries are skipped."""
+        return cls._from_records(flows, dict.get)
+
+    @classmethod
+    def from_flows(cls, flows: Iterable[Flow | None]) -> FlowTable:
+        """Create a table from :py:class:`~pybatfish.datamodel.flow.Flow` objects. ``None`` entries are skipped."""
+        return cls._from_records(flows, getattr)
+
+    @classmethod
+    def _from_records(cls, records: Iterable[Any], get: Callable[[Any, str], Any]) -> FlowTable:
+        rows = []
+        present = []
+        for row, record in enumerate(records):
+            if record is not None:
+                rows.append(row)
+                present.append(record)
+        data: dict[str, numpy.ndarray] = {}
+        missing: dict[str, numpy.ndarray] = {}
+        categories: dict[str, list[str | None]] = {}
+        for field, attr_name in _IP_FIELDS:
+            data[field] = _ipv4_to_uint32([get(r, attr_name) for r in present])
+        for field, attr_name, dtype, optional in _NUMERIC_FIELDS:
+            values = [get(r, attr_name) for r in present]
+            if optional:
+                missing[field] = numpy.array([v is None for v in values], dtype=bool)
+                values = [0 if v is None else v for v in values]
+            data[field] = numpy.array(values, dtype=numpy.int64).astype(dtype)
+        flags = numpy.zeros(len(present), dtype=numpy.uint8)
+        for attr_name, bit in _TCP_FLAG_BITS:
+            flags |= numpy.array([bool(get(r, attr_name)) for r in present], dtype=numpy.uint8) * numpy.uint8(bit)
+        data["tcp_flags"] = flags
+        missing["tcp_flags"] = numpy.array([get(r, "tcpFlagsAck") is None for r in present], dtype=bool)
+        for field, attr_name in _CATEGORICAL_FIELDS:
+            codes: dict[str | None, int] = {}
+            data[field] = numpy.array(
+                [codes.setdefault(get(r, attr_name), len(codes)) for r in present], dtype=numpy.int32
+            )
+            categories[field] = list(codes)
+        return FlowTable(data, missing, categories, numpy.array(rows, dtype=numpy.int64))
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self._data)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, item: Any) -> Any:
+        """Return the values of a field by name, the flow at a position, or
+        the flows selected by a boolean mask, index array or slice as a new
+        table."""
+        if isinstance(item, str):
+            return self.values(item)
+        if isinstance(item, (int, numpy.integer)):
+            return self.flow(int(item))
+        return self._select(item)
+
+    def _select(self, item: Any) -> FlowTable:
+        return FlowTable(
+            {field: values[item] for field, values in self._data.items()},
+            {field: mask[item] for field, mask in self._missing.items()},
+            self._categories,
+            self.rows[item],
+        )
+
+    def array(self, field: str) -> numpy.ndarray:
+        """Return the raw array of a field (codes for string fields)."""
+        self._check_field(field)
+        return self._data[field]
+
+    def values(self, field: str) -> numpy.ndarray:
+        """Return the values of a field, with strings for string fields."""
+        if field in self._categories:
+            values: numpy.ndarray = numpy.array(self._categories[field], dtype=object)[self._data[field]]
+            return values
+        return self.array(field)
+
+    def missing(self, field: str) -> numpy.ndarray:
+        """Return the mask of flows that do not have a value for a field."""
+        self._check_field(field)
+        return self._missing.get(field, numpy.zeros(len(self), dtype=bool))
+
+    def categories(self, field: str) -> list[str | None]:
+        """Return the distinct values of a string field, indexed by code."""
+        self._check_field(field)
+        return list(self._categories[field])
+
+    def where(self, **criteria: Any) -> FlowTable:
+        """Return the flows matching all criteria, given as ``field=value``.
+
+        A value can be a list of alternatives. IP fields also accept prefixes
+        (e.g., ``dst_ip="10.0.0.0/8"``).
+
+        >>> flows.where(ip_protocol="TCP", dst_port=[22, 23], dst_ip="10.0.0.0/8")  # doctest: +SKIP
+        """
+        mask = numpy.ones(len(self), dtype=bool)
+        for field, value in criteria.items():
+            mask &= self.mask(field, value)
+        return self._select(mask)
+
+    def mask(self, field: str, value: Any) -> numpy.ndarray:
+        """Return the mask of flows whose field matches the value (see :py:meth:`where`)."""
+        self._check_field(field)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            mask = numpy.zeros(len(self), dtype=bool)
+            for v in value:
+                mask |= self.mask(field, v)
+            return mask
+        data = self._data[field]
+        result: numpy.ndarray
+        if field in self._categories:
+            categories = self._categories[field]
+            if value not in categories:
+                return numpy.zeros(len(self), dtype=bool)
+            result = data == categories.index(value)
+        elif field in dict(_IP_FIELDS):
+            address, _, length = str(value).partition("/")
+            prefix_length = int(length) if length else 32
+            netmask = numpy.uint32((0xFFFFFFFF << (32 - prefix_length)) & 0xFFFFFFFF)
+            result = (data & netmask) == (_ipv4_to_uint32([address])[0] & netmask)
+        else:
+            result = (data == value) & ~self.missing(field)
+        return result
+
+    def groupby(self, *fields: str) -> dict[tuple, FlowTable]:
+        """Group flows by the values of the given fields.
+
+        Keys are tuples of field values (strings for IPs and string fields,
+        ``None`` for missing values).
+        """
+        if not fields:
+            raise ValueError("At least one field is required")
+        for field in fields:
+            self._check_field(field)
+        columns = [numpy.where(self.missing(field), -1, self._data[field].astype(numpy.int64)) for field in fields]
+        # Number groups field by field with 1-D uniques, which are much faster
+        # than numpy.unique(axis=0). Renumbering densely after each field keeps
+        # the combined numbers small, and in the order of the keys.
+        group = numpy.zeros(len(self), dtype=numpy.int64)
+        for column in columns:
+            values, codes = numpy.unique(column, return_inverse=True)
+            group = numpy.unique(group * len(values) + codes.reshape(-1), return_inverse=True)[1].reshape(-1)
+        order = numpy.argsort(group, kind="stable")
+        bounds = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(group))])
+        first = order[bounds[:-1]]
+        keys = zip(*(column[first] for column in columns))
+        return {
+            tuple(self._decode_key(field, int(raw)) for field, raw in zip(fields, key)): self._select(
+                order[bounds[i] : bounds[i + 1]]
+            )
+            for i, key in enumerate(keys)
+        }
+
+    def to_frame(self) -> pandas.DataFrame:
+        """Return the flows as a :py:class:`pandas.DataFrame` with typed columns."""
+        columns: dict[str, Any] = {}
+        for field, values in self._data.items():
+            if field in self._categories:
+                # pandas has no null categories, missing values have code -1
+                present = [c for c in self._categories[field] if c is not None]
+                codes = numpy.array(
+                    [-1 if c is None else present.index(c) for c in self._categories[field]], dtype=numpy.int32
+                )
+                columns[field] = pandas.Categorical.from_codes(
+                    codes[values], categories=pandas.Index(present, dtype=object)
+                )
+            elif field in self._missing:
+                columns[field] = pandas.arrays.IntegerArray(values, self._missing[field])
+            else:
+                columns[field] = values
+        return pandas.DataFrame(columns, index=self.rows)
+
+    def flow(self, index: int) -> Flow:
+        """Return the flow at the given position as a :py:class:`~pybatfish.datamodel.flow.Flow`."""
+        kwargs: dict[str, Any] = {}
+        for field, attr_name in _IP_FIELDS:
+            kwargs[attr_name] = _uint32_to_ipv4(self._data[field][index])
+        for field, attr_name, _, optional in _NUMERIC_FIELDS:
+            missing = optional and self._missing[field][index]
+            kwargs[attr_name] = None if missing else int(self._data[field][index])
+        flags = int(self._data["tcp_flags"][index])
+        flags_missing = self._missing["tcp_flags"][index]
+        for attr_name, bit in _TCP_FLAG_BITS:
+            kwargs[attr_name] = None if flags_missing else int(bool(flags & bit))
+        for field, attr_name in _CATEGORICAL_FIELDS:
+            kwargs[attr_name] = self._categories[field][self._data[field][index]]
+        return Flow(**kwargs)
+
+    def __iter__(self) -> Iterator[Flow]:
+        for i in range(len(self)):
+            yield self.flow(i)
+
+    def header_constraints(self, index: int) -> HeaderConstraints:
+        """Return header constraints matching the flow at the given position."""
+        return HeaderConstraints.of(self.flow(index))
+
+    def _check_field(self, field: str) -> None:
+        if field not in self._data:
+            raise ValueError(f"Unknown field {field}, valid fields are {self.fields}")
+
+    def _decode_key(self, field: str, raw: int) -> Any:
+        if raw == -1 and field in self._missing:
+            return None
+        if field in self._categories:
+            return self._categories[field][raw]
+        if field in dict(_IP_FIELDS):
+            return _uint32_to_ipv4(raw)
+        return raw
+
+
+def _ipv4_to_uint32(addresses: list[str]) -> numpy.ndarray:
+    """Convert dotted-quad IPv4 addresses to an array of integers."""
+    packed = b"".join(socket.inet_aton(address) for address in addresses)
+    return numpy.frombuffer(packed, dtype=">u4").astype(numpy.uint32)
+
+
+def _uint32_to_ipv4(value: Any) -> str:
+    return socket.inet_ntoa(int(value).to_bytes(4, "big"))
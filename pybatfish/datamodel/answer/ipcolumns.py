@@ -0,0 +1,214 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Integer-encoded IPv4 address and prefix columns, for vectorized matching.
+
+Importing this module registers the ``bf`` accessor on pandas data frames:
+
+>>> routes = answer.frame()  # doctest: +SKIP
+>>> covering = routes[routes.bf.prefix("Network").contains("10.1.2.3")]  # doctest: +SKIP
+"""
+
+from __future__ import annotations
+
+import socket
+from collections.abc import Iterable
+from typing import Any
+
+import numpy
+import pandas
+
+__all__ = ["BatfishAccessor", "IpArray", "PrefixArray"]
+
+
+class IpArray:
+    """IPv4 addresses stored as ``uint32``.
+
+    Values that are missing or not IPv4 addresses (e.g., ``AUTO/NONE(-1l)``
+    next hops) are flagged in :py:attr:`missing`.
+    """
+
+    def __init__(self, values: numpy.ndarray, missing: numpy.ndarray) -> None:
+        self.values = values
+        self.missing = missing
+
+    @classmethod
+    def from_strings(cls, ips: Iterable[str | None]) -> IpArray:
+        """Parse IPv4 addresses in dotted-quad notation."""
+        parsed = [_parse_ip(ip) for ip in ips]
+        return cls(
+            numpy.array([0 if ip is None else ip for ip in parsed], dtype=numpy.uint32),
+            numpy.array([ip is None for ip in parsed], dtype=bool),
+        )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, item: Any) -> IpArray:
+        return IpArray(self.values[item], self.missing[item])
+
+    def in_prefix(self, prefix: str) -> numpy.ndarray:
+        """Return the mask of addresses in the given prefix."""
+        network, length = _parse_prefix(prefix)
+        result: numpy.ndarray = ((self.values & _netmasks(numpy.uint8(length))) == network) & ~self.missing
+        return result
+
+    def to_strings(self) -> list[str | None]:
+        return [None if m else _format_ip(v) for v, m in zip(self.values, self.missing)]
+
+
+class PrefixArray:
+    """IPv4 prefixes stored as ``uint32`` networks and ``uint8`` lengths.
+
+    Host bits are dropped, so ``10.1.2.3/24`` is stored as ``10.1.2.0/24``.
+    Missing and invalid values are flagged in :py:attr:`missing` and never
+    match.
+    """
+
+    def __init__(self, networks: numpy.ndarray, lengths: numpy.ndarray, missing: numpy.ndarray) -> None:
+        self.networks = networks
+        self.lengths = lengths
+        self.missing = missing
+
+    @classmethod
+    def from_strings(cls, prefixes: Iterable[str | None]) -> PrefixArray:
+        """Parse IPv4 prefixes in ``address/length`` notation."""
+        parsed = []
+        for prefix in prefixes:
+            try:
+                parsed.append(None if prefix is None else _parse_prefix(prefix))
+            except ValueError:
+                parsed.append(None)
+        return cls(
+            numpy.array([0 if p is None else p[0] for p in parsed], dtype=numpy.uint32),
+            numpy.array([0 if p is None else p[1] for p in parsed], dtype=numpy.uint8),
+            numpy.array([p is None for p in parsed], dtype=bool),
+        )
+
+    def __len__(self) -> int:
+        return len(self.networks)
+
+    def __getitem__(self, item: Any) -> PrefixArray:
+        return PrefixArray(self.networks[item], self.lengths[item], self.missing[item])
+
+    def contains(self, ip: str | IpArray) -> numpy.ndarray:
+        """Return the mask of prefixes containing an address.
+
+        :param ip: a single address, checked against all prefixes, or an
+            :py:class:`IpArray` of the same length, checked element-wise
+        """
+        if isinstance(ip, IpArray):
+            values, missing = ip.values, self.missing | ip.missing
+        else:
+            values, missing = numpy.uint32(_parse_ip_strict(ip)), self.missing
+        result: numpy.ndarray = ((values & _netmasks(self.lengths)) == self.networks) & ~missing
+        return result
+
+    def overlaps(self, prefix: str | PrefixArray) -> numpy.ndarray:
+        """Return the mask of prefixes sharing at least one address with another prefix.
+
+        :param prefix: a single prefix, checked against all prefixes, or a
+            :py:class:`PrefixArray` of the same length, checked element-wise
+        """
+        if isinstance(prefix, PrefixArray):
+            networks, lengths, missing = prefix.networks, prefix.lengths, self.missing | prefix.missing
+        else:
+            network, length = _parse_prefix(prefix)
+            networks, lengths, missing = numpy.uint32(network), numpy.uint8(length), self.missing
+        masks = _netmasks(numpy.minimum(self.lengths, lengths))
+        result: numpy.ndarray = ((self.networks & masks) == (networks & masks)) & ~missing
+        return result
+
+    def longest_match(self, ips: IpArray | Iterable[str | None]) -> numpy.ndarray:
+        """Return, for each address, the position of the longest prefix containing it, or -1.
+
+        Ties between equal prefixes go to the first one. Runs one binary
+        search per distinct prefix length.
+        """
+        if not isinstance(ips, IpArray):
+            ips = IpArray.from_strings(ips)
+        result = numpy.full(len(ips), -1, dtype=numpy.int64)
+        unmatched = ~ips.missing
+        for length in sorted(set(self.lengths[~self.missing].tolist()), reverse=True):
+            (positions,) = numpy.nonzero((self.lengths == length) & ~self.missing)
+            order = numpy.argsort(self.networks[positions], kind="stable")
+            positions = positions[order]
+            networks = self.networks[positions]
+            keys = ips.values & _netmasks(numpy.uint8(length))
+            found = numpy.minimum(numpy.searchsorted(networks, keys), len(networks) - 1)
+            match = unmatched & (networks[found] == keys)
+            result[match] = positions[found[match]]
+            unmatched &= ~match
+            if not unmatched.any():
+                break
+        return result
+
+    def to_strings(self) -> list[str | None]:
+        return [
+            None if m else f"{_format_ip(n)}/{int(length)}"
+            for n, length, m in zip(self.networks, self.lengths, self.missing)
+        ]
+
+
+@pandas.api.extensions.register_dataframe_accessor("bf")
+class BatfishAccessor:
+    """Batfish helpers on data frames, available as ``frame.bf``."""
+
+    def __init__(self, frame: pandas.DataFrame) -> None:
+        self._frame = frame
+
+    def ip(self, column: str) -> IpArray:
+        """Return a column of IPv4 addresses as an :py:class:`IpArray`."""
+        return IpArray.from_strings(self._frame[column])
+
+    def prefix(self, column: str) -> PrefixArray:
+        """Return a column of IPv4 prefixes as a :py:class:`PrefixArray`."""
+        return PrefixArray.from_strings(self._frame[column])
+
+
+def _netmasks(lengths: Any) -> numpy.ndarray:
+    """Return the netmasks of prefix lengths, as ``uint32``."""
+    lengths = numpy.asarray(lengths, dtype=numpy.uint64)
+    masks: numpy.ndarray = (
+        (numpy.uint64(0xFFFFFFFF) << (numpy.uint64(32) - lengths)) & numpy.uint64(0xFFFFFFFF)
+    ).astype(numpy.uint32)
+    return masks
+
+
+def _parse_ip(ip: Any) -> int | None:
+    if not isinstance(ip, str):
+        return None
+    try:
+        return _parse_ip_strict(ip)
+    except ValueError:
+        return None
+
+
+def _parse_ip_strict(ip: str) -> int:
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        raise ValueError(f"Invalid IPv4 address: {ip}") from None
+
+
+def _parse_prefix(prefix: str) -> tuple[int, int]:
+    """Return the network (without host bits) and length of a prefix."""
+    address, sep, length_str = str(prefix).partition("/")
+    if not sep or not length_str.isdigit() or int(length_str) > 32:
+        raise ValueError(f"Invalid IPv4 prefix: {prefix}")
+    length = int(length_str)
+    return _parse_ip_strict(address) & int(_netmasks(length)), length
+
+
+def _format_ip(value: Any) -> str:
+    return socket.inet_ntoa(int(value).to_bytes(4, "big"))
@@ -0,0 +1,146 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Aggregation of many traces into a graph of the hops they take."""
+
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterable
+from typing import Any
+
+from pybatfish.datamodel.flow import (
+    EnterInputIfaceStepDetail,
+    ExitOutputIfaceStepDetail,
+    Hop,
+    Trace,
+)
+from pybatfish.util import escape_html, escape_name
+
+__all__ = ["PathDag", "aggregate_traces"]
+
+# A hop in the graph: node, input interface and output interface
+HopKey = tuple[str, str | None, str | None]
+
+
+class PathDag:
+    """Traces merged into a graph of hops, with the number of traces taking
+    every hop and edge, and the dispositions of the traces ending at a hop.
+
+    Hops at the same node that enter and exit through the same interfaces are
+    merged, so equal-cost paths that diverge and converge again are shown
+    once. Traces are added one at a time with :py:meth:`add`.
+    """
+
+    def __init__(self) -> None:
+        self.num_traces: int = 0
+        # Hops in the order they were first seen
+        self.hops: list[HopKey] = []
+        self._hop_ids: dict[HopKey, int] = {}
+        self.hop_counts: Counter[int] = Counter()
+        # Number of traces going from a hop to each next hop
+        self.edge_counts: dict[int, Counter[int]] = {}
+        # Start hops and dispositions of traces ending at each hop (None if
+        # the trace has no hops)
+        self.start_counts: Counter[int] = Counter()
+        self.end_dispositions: dict[int | None, Counter[str]] = {}
+
+    def add(self, trace: Trace) -> None:
+        """Add a trace to the graph."""
+        self.num_traces += 1
+        previous: int | None = None
+        for hop in trace.hops:
+            hop_id = self._hop_id(hop)
+            self.hop_counts[hop_id] += 1
+            if previous is None:
+                self.start_counts[hop_id] += 1
+            else:
+                self.edge_counts.setdefault(previous, Counter())[hop_id] += 1
+            previous = hop_id
+        self.end_dispositions.setdefault(previous, Counter())[trace.disposition] += 1
+
+    def successors(self, hop_id: int) -> list[tuple[int, int]]:
+        """Return the next hops of a hop and the number of traces taking each edge."""
+        return list(self.edge_counts.get(hop_id, Counter()).items())
+
+    def hop_label(self, hop_id: int) -> str:
+        """Return a short description of a hop, e.g. ``n1[e1->e2]``."""
+        node, in_iface, out_iface = self.hops[hop_id]
+        if in_iface is None and out_iface is None:
+            return escape_name(node)
+        return "{node}[{in_iface}->{out_iface}]".format(
+            node=escape_name(node),
+            in_iface=escape_name(in_iface) if in_iface else "",
+            out_iface=escape_name(out_iface) if out_iface else "",
+        )
+
+    def _hop_id(self, hop: Hop) -> int:
+        key = _hop_key(hop)
+        hop_id = self._hop_ids.get(key)
+        if hop_id is None:
+            hop_id = self._hop_ids[key] = len(self.hops)
+            self.hops.append(key)
+        return hop_id
+
+    def _lines(self) -> list[tuple[int, str]]:
+        """Return (indentation level, text) lines of the rendering."""
+        lines = [(0, f"{self.num_traces} traces")]
+        if None in self.end_dispositions:
+            lines.append((0, f"No hops: {_format_dispositions(self.end_dispositions[None])}"))
+        for hop_id in range(len(self.hops)):
+            start = f", {self.start_counts[hop_id]} start here" if hop_id in self.start_counts else ""
+            lines.append((0, f"{self.hop_label(hop_id)} ({self.hop_counts[hop_id]}{start})"))
+            for dst, count in self.successors(hop_id):
+                lines.append((1, f"-> {self.hop_label(dst)} ({count})"))
+            if hop_id in self.end_dispositions:
+                lines.append((1, f"ends: {_format_dispositions(self.end_dispositions[hop_id])}"))
+        return lines
+
+    def __str__(self) -> str:
+        return "\n".join("  " * indent + text for indent, text in self._lines())
+
+    def _repr_html_(self) -> str:
+        return "<br>".join("&nbsp;&nbsp;" * indent + escape_html(text) for indent, text in self._lines())
+
+
+def aggregate_traces(traces: Iterable[Any]) -> PathDag:
+    """Merge traces into a :py:class:`PathDag` in a single pass.
+
+    :param traces: traces, or cells of an answer column holding traces or
+        lists of traces (e.g., ``answer.frame()["Traces"]``)
+    """
+    dag = PathDag()
+    for item in traces:
+        if item is None:
+            continue
+        if isinstance(item, Trace):
+            dag.add(item)
+        else:
+            for trace in item:
+                dag.add(trace)
+    return dag
+
+
+def _hop_key(hop: Hop) -> HopKey:
+    in_iface = None
+    out_iface = None
+    for step in hop.steps:
+        if isinstance(step.detail, EnterInputIfaceStepDetail):
+            in_iface = step.detail.inputInterface
+        elif isinstance(step.detail, ExitOutputIfaceStepDetail):
+            out_iface = step.detail.outputInterface
+    return hop.node, in_iface, out_iface
+
+
+def _format_dispositions(counts: Counter[str]) -> str:
+    return ", ".join(f"{disposition} ({count})" for disposition, count in counts.most_common())
@@ -0,0 +1,117 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Local longest-prefix-match lookups in routing table answers."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+import numpy
+import pandas
+
+from pybatfish.datamodel.answer.ipcolumns import IpArray, PrefixArray
+
+if TYPE_CHECKING:
+    from pybatfish.datamodel.answer.table import TableAnswer
+
+__all__ = ["RouteIndex"]
+
+
+class _VrfTable:
+    """Distinct networks of one VRF and the rows that have each of them."""
+
+    def __init__(self, networks: list[str], network_ids: numpy.ndarray, positions: numpy.ndarray) -> None:
+        self.prefixes = PrefixArray.from_strings(networks)
+        self.networks = networks
+        # Rows grouped by network: rows of network i are positions[order[bounds[i]:bounds[i + 1]]]
+        order = numpy.argsort(network_ids, kind="stable")
+        self.rows = positions[order]
+        self.bounds = numpy.searchsorted(network_ids[order], numpy.arange(len(networks) + 1))
+
+
+class RouteIndex:
+    """Longest-prefix-match index over the rows of a ``routes`` or ``bgpRib``
+    answer, per node and VRF.
+
+    Equal-cost routes (several rows with the same network) are all returned.
+    Lookups do not model forwarding beyond the routing table, e.g. recursive
+    next hop resolution or ACLs; use ``traceroute`` for that.
+
+    >>> index = RouteIndex.from_answer(bf.q.routes().answer())  # doctest: +SKIP
+    >>> index.lookup("border1", "default", ["10.1.2.3", "8.8.8.8"])  # doctest: +SKIP
+    """
+
+    def __init__(
+        self,
+        frame: pandas.DataFrame,
+        node_column: str = "Node",
+        vrf_column: str = "VRF",
+        network_column: str = "Network",
+    ) -> None:
+        missing = [c for c in (node_column, vrf_column, network_column) if c not in frame.columns]
+        if missing:
+            raise ValueError(f"Route frame is missing columns {missing}, it has {list(frame.columns)}")
+        self.frame = frame.reset_index(drop=True)
+        self._tables: dict[tuple[str, str], _VrfTable] = {}
+        network_values = self.frame[network_column]
+        groups = self.frame.groupby([node_column, vrf_column], sort=False).indices
+        for (node, vrf), positions in groups.items():
+            ids: dict[str, int] = {}
+            network_ids = numpy.array(
+                [ids.setdefault(network_values.iat[p], len(ids)) for p in positions], dtype=numpy.int64
+            )
+            self._tables[(node, vrf)] = _VrfTable(list(ids), network_ids, numpy.asarray(positions))
+
+    @classmethod
+    def from_answer(cls, answer: TableAnswer) -> RouteIndex:
+        """Build the index from a ``routes`` or ``bgpRib`` answer."""
+        return cls(answer.frame())
+
+    def keys(self) -> list[tuple[str, str]]:
+        """Return the (node, VRF) pairs in the index."""
+        return list(self._tables)
+
+    def longest_match(self, node: str, vrf: str, ips: Iterable[str | None]) -> list[str | None]:
+        """Return, for each IP, the longest network of the VRF containing it, or ``None``."""
+        table = self._tables.get((node, vrf))
+        ips = list(ips)
+        if table is None:
+            return [None] * len(ips)
+        return [None if m < 0 else table.networks[m] for m in table.prefixes.longest_match(ips)]
+
+    def lookup(self, node: str, vrf: str, ips: Iterable[str | None]) -> pandas.DataFrame:
+        """Return the routes used for each IP, with the IP in a leading ``IP`` column.
+
+        IPs without a matching route have no rows.
+        """
+        table = self._tables.get((node, vrf))
+        ips = list(ips)
+        if table is None:
+            return self._result([], numpy.zeros(0, dtype=numpy.int64))
+        matches = table.prefixes.longest_match(IpArray.from_strings(ips))
+        (queries,) = numpy.nonzero(matches >= 0)
+        matches = matches[queries]
+        # Expand every match to all the rows of its network
+        starts = table.bounds[matches]
+        counts = table.bounds[matches + 1] - starts
+        query_rows = numpy.repeat(queries, counts)
+        offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        rows = table.rows[numpy.repeat(starts, counts) + offsets]
+        return self._result([ips[q] for q in query_rows], rows)
+
+    def _result(self, ips: list[str | None], rows: numpy.ndarray) -> pandas.DataFrame:
+        result = self.frame.iloc[rows].reset_index(drop=True)
+        result.insert(0, "IP", pandas.Series(ips, dtype=object))
+        return result
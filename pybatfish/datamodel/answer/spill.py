@@ -0,0 +1,152 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""On-disk, memory-mapped storage for the rows of large table answers."""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, overload
+
+import numpy
+
+__all__ = ["SpilledRows"]
+
+_DATA_FILE = "cells.bin"
+_OFFSETS_FILE = "offsets.npy"
+
+
+class SpilledRows(Sequence[dict[str, Any]]):
+    """Rows of a table answer stored column by column in a local file.
+
+    Every column is written as the concatenated JSON encodings of its cells,
+    together with an index of cell offsets. Both are memory-mapped, so the
+    rows take (almost) no Python heap and a cell is only read and decoded
+    when it is accessed.
+
+    The backing files are deleted when this object is garbage collected or
+    :py:meth:`close` is called. Pickling reads all rows back; they are
+    spilled again to a new temporary directory when unpickled.
+    """
+
+    def __init__(
+        self,
+        column_names: Sequence[str],
+        rows: Iterable[dict[str, Any]],
+        directory: str | None = None,
+    ) -> None:
+        self.column_names: list[str] = list(column_names)
+        self._column_index = {name: i for i, name in enumerate(self.column_names)}
+        self.path: str = tempfile.mkdtemp(prefix="pybatfish-answer-", dir=directory)
+        try:
+            offsets = _write_columns(self.column_names, rows, os.path.join(self.path, _DATA_FILE))
+            numpy.save(os.path.join(self.path, _OFFSETS_FILE), offsets)
+            self._offsets = numpy.load(os.path.join(self.path, _OFFSETS_FILE), mmap_mode="r")
+            self._data = _map_file(os.path.join(self.path, _DATA_FILE))
+        except BaseException:
+            shutil.rmtree(self.path, ignore_errors=True)
+            raise
+        self._num_rows: int = self._offsets.shape[1] - 1
+        self._finalizer = weakref.finalize(self, _cleanup, self._data, self.path)
+
+    def __len__(self) -> int:
+        return self._num_rows
+
+    @overload
+    def __getitem__(self, item: int) -> dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, item: slice) -> list[dict[str, Any]]: ...
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.row(i) for i in range(*item.indices(self._num_rows))]
+        return self.row(item)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(self._num_rows):
+            yield self.row(i)
+
+    def row(self, index: int, columns: Sequence[str] | None = None) -> dict[str, Any]:
+        """Return the raw JSON of a row, optionally restricted to some columns."""
+        index = self._check_index(index)
+        names = self.column_names if columns is None else columns
+        return {name: self._cell(index, self._column_index[name]) for name in names}
+
+    def cell(self, index: int, column: str) -> Any:
+        """Return the raw JSON value of a single cell."""
+        return self._cell(self._check_index(index), self._column_index[column])
+
+    def column(self, name: str) -> Iterator[Any]:
+        """Iterate over the raw JSON values of a column."""
+        col = self._column_index[name]
+        for i in range(self._num_rows):
+            yield self._cell(i, col)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # The memory map cannot be pickled, and the files are deleted with this object
+        return self.__class__, (self.column_names, list(self))
+
+    def close(self) -> None:
+        """Release the memory map and delete the backing files."""
+        self._finalizer()
+
+    def _check_index(self, index: int) -> int:
+        if index < 0:
+            index += self._num_rows
+        if not 0 <= index < self._num_rows:
+            raise IndexError(f"Row index {index} out of range")
+        return index
+
+    def _cell(self, index: int, col: int) -> Any:
+        start = int(self._offsets[col, index])
+        end = int(self._offsets[col, index + 1])
+        return json.loads(self._data[start:end])
+
+
+def _write_columns(column_names: Sequence[str], rows: Iterable[dict[str, Any]], path: str) -> numpy.ndarray:
+    """Write cells column by column to path and return the offsets index."""
+    rows = rows if isinstance(rows, Sequence) else list(rows)
+    offsets = numpy.zeros((len(column_names), len(rows) + 1), dtype=numpy.int64)
+    encoder = json.JSONEncoder(separators=(",", ":"))
+    position = 0
+    with open(path, "wb") as f:
+        for col, name in enumerate(column_names):
+            for i, row in enumerate(rows):
+                encoded = encoder.encode(row.get(name)).encode("utf-8")
+                f.write(encoded)
+                position += len(encoded)
+                offsets[col, i + 1] = position
+            if col + 1 < len(column_names):
+                offsets[col + 1, 0] = position
+    return offsets
+
+
+def _map_file(path: str) -> mmap.mmap | bytes:
+    if os.path.getsize(path) == 0:
+        # Empty files cannot be memory-mapped
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _cleanup(data: mmap.mmap | bytes, path: str) -> None:
+    if isinstance(data, mmap.mmap):
+        data.close()
+    shutil.rmtree(path, ignore_errors=True)
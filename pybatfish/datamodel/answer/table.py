@@ -12,14 +12,26 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from contextlib import ExitStack
 from typing import Any
 
+import numpy
 import pandas
 
 from pybatfish.datamodel.answer.base import Answer, _parse_json_with_schema
+from pybatfish.datamodel.answer.diff import RowDiff, TableDiff, diff_answers, iter_diff_answers
+from pybatfish.datamodel.answer.spill import SpilledRows
+from pybatfish.datamodel.answer.traceindex import TraceIndex
+from pybatfish.datamodel.answer.tracestore import TraceStore, trace_store
+from pybatfish.datamodel.primitives import flyweights
+from pybatfish.util import escape_html, get_html
 
 __all__ = ["ColumnMetadata", "TableAnswer", "Row", "TableMetadata"]
 
+# Filter on table rows, see TableAnswer
+RowFilter = Mapping[str, Any] | Callable[[dict[str, Any]], bool]
+
 
 class ColumnMetadata:
     """Metadata for a single column."""
@@ -37,21 +49,89 @@ class ColumnMetadata:
 
 
 class TableAnswer(Answer):
-    """Batfish answer in the form of a table."""
+    """Batfish answer in the form of a table.
+
+    :param dictionary: the JSON dictionary of the answer
+    :param spill_threshold: if set, answers with more rows than this are not
+        decoded in memory. Their rows are written to a memory-mapped file
+        (see :py:class:`~pybatfish.datamodel.answer.spill.SpilledRows`) and
+        decoded only when accessed. The rows of such answers are not in the
+        answer dictionary itself (e.g., ``dict(answer)``), use
+        :py:meth:`dict` to get them back.
+    :param spill_dir: directory for spilled rows (system temp dir by default)
+    :param columns: if set, only these columns are decoded into the answer frame.
+        Spilled answers only store these columns.
+    :param where: if set, only rows matching it are kept. Either a mapping from
+        column names to values (a row matches if each named column equals the
+        given value) or a callable that receives the raw JSON of a row and
+        returns whether to keep it. Rows are filtered before the remaining
+        columns are decoded.
+    :param flyweight: if set, equal immutable values (interfaces, flows, trace
+        steps, ...) in the answer are decoded to a single shared instance
+        (see :py:func:`~pybatfish.datamodel.primitives.flyweights`)
+    :param compact_traces: if set, traces in the answer are kept in a shared
+        :py:class:`~pybatfish.datamodel.answer.tracestore.TraceStore` (available
+        as :py:attr:`trace_store`) and ``List<Trace>`` cells are
+        :py:class:`~pybatfish.datamodel.answer.tracestore.TraceList` objects
+        whose traces share their hops
+    :param html_max_rows: if set, only the first and last rows of the answer,
+        up to this many in total, are rendered in notebooks. Otherwise all
+        rows are rendered by pandas.
+    :param html_max_cell_items: when ``html_max_rows`` is set, list cells show
+        at most this many elements, followed by the number of elements left out
+    """
 
-    def __init__(self, dictionary):
+    def __init__(
+        self,
+        dictionary: dict,
+        spill_threshold: int | None = None,
+        spill_dir: str | None = None,
+        columns: Iterable[str] | None = None,
+        where: RowFilter | None = None,
+        flyweight: bool = False,
+        compact_traces: bool = False,
+        html_max_rows: int | None = None,
+        html_max_cell_items: int = 10,
+    ) -> None:
         if "answerElements" not in dictionary:
             raise ValueError("Answer elements not found in dictionary")
         if len(dictionary["answerElements"]) == 0:
             raise ValueError("Empty answer elements list in dictionary")
         if "metadata" not in dictionary["answerElements"][0]:
             raise ValueError("TableMetadata not found in dictionary")
-        super().__init__(dictionary)
         answer_element = dictionary["answerElements"][0]
         self.metadata = TableMetadata(answer_element["metadata"])
-        self.rows = [Row(row) for row in answer_element.get("rows", [])]
+        self._columns = _check_columns(self.metadata, columns)
+        self._flyweights: dict[Any, Any] | None = {} if flyweight else None
+        self.trace_store: TraceStore | None = TraceStore() if compact_traces else None
+        self._trace_index: TraceIndex | None = None
+        self.html_max_rows = html_max_rows
+        self.html_max_cell_items = html_max_cell_items
+        # Rendered truncated views, by max rows and max cell items
+        self._html: dict[tuple[int, int], str] = {}
+        raw_rows = answer_element.get("rows", [])
+        if where is not None:
+            keep = _row_filter(self.metadata, where)
+            raw_rows = [row for row in raw_rows if keep(row)]
+            # Do not keep the filtered out rows in the answer dictionary either
+            answer_element = dict(answer_element, rows=raw_rows)
+            dictionary = dict(dictionary, answerElements=[answer_element] + dictionary["answerElements"][1:])
 
-        self.table_data = _rows_to_frame(self.metadata, self.rows)
+        self._table_data: pandas.DataFrame | None = None
+        # Columns outside the projection, decoded by frame() on request
+        self._other_columns: dict[str, pandas.Series] = {}
+        self.rows: list[Row] | SpilledRows
+        if spill_threshold is not None and len(raw_rows) > spill_threshold:
+            stored = self._columns if self._columns is not None else self.metadata.get_column_names()
+            self.rows = SpilledRows(stored, raw_rows, spill_dir)
+            # Do not keep a second, in-memory copy of the rows around
+            answer_element = {k: v for k, v in answer_element.items() if k != "rows"}
+            dictionary = dict(dictionary, answerElements=[answer_element] + dictionary["answerElements"][1:])
+        else:
+            self.rows = [Row(row) for row in raw_rows]
+            with self._decoding():
+                self._table_data = _rows_to_frame(self.metadata, self.rows, self._columns)
+        super().__init__(dictionary)
 
         self.excluded_rows = {}
         for exclusion in answer_element.get("excludedRows", []):
@@ -64,24 +144,238 @@ class TableAnswer(Answer):
         """Return the excluded data for exclusion_name as a :py:class:`pandas.DataFrame`."""
         if exclusion_name not in self.excluded_rows:
             raise ValueError(f"Exclusion name {exclusion_name} does not exist")
-        return _rows_to_frame(self.metadata, self.excluded_rows[exclusion_name])
+        with self._decoding():
+            return _rows_to_frame(self.metadata, self.excluded_rows[exclusion_name])
+
+    @property
+    def spilled(self):
+        # type: () -> bool
+        """Whether the rows of this answer are stored on disk rather than in memory."""
+        return isinstance(self.rows, SpilledRows)
+
+    @property
+    def traces(self) -> TraceIndex:
+        """Index of the traces in this answer, built on first access.
+
+        For example, ``answer.traces.where(node="n1", action="DENIED").frame()``
+        returns the rows with a trace denied at node ``n1``.
+        """
+        if self._trace_index is None:
+            self._trace_index = TraceIndex(self)
+        return self._trace_index
+
+    @property
+    def table_data(self):
+        # type: () -> pandas.DataFrame
+        """The answer data as a :py:class:`pandas.DataFrame`.
+
+        For spilled answers, all rows are decoded on every access, unless a
+        frame was assigned. Select rows and columns with :py:meth:`frame` to
+        decode less.
+        """
+        if self._table_data is not None:
+            return self._table_data
+        # Spilled answers are decoded on every access to keep memory bounded
+        with self._decoding():
+            return _rows_to_frame(self.metadata, self.rows, self._columns)
+
+    @table_data.setter
+    def table_data(self, value):
+        # type: (pandas.DataFrame) -> None
+        self._table_data = value
+        self._other_columns = {}
+        self._html = {}
+
+    def frame(self, columns: Iterable[str] | None = None, where: RowFilter | None = None) -> pandas.DataFrame:
+        """Return answer data as a :py:class:`pandas.DataFrame`.
+
+        :param columns: if set, only include these columns. Spilled answers
+            only have the columns they were created with.
+        :param where: if set, only include matching rows (see :py:class:`TableAnswer`)
+        """
+        if columns is None and where is None:
+            return self.table_data
+        columns = _check_columns(self.metadata, columns) if columns is not None else self._columns
+        df = self._table_data
+        if df is None:
+            self._check_stored(list(columns or []) + ([] if where is None or callable(where) else list(where)))
+            with self._decoding():
+                return _rows_to_frame(self.metadata, self.rows, columns, where)
+        if columns is not None:
+            missing = [c for c in columns if c not in df.columns and c not in self._other_columns]
+            if missing:
+                # Columns left out of the answer frame are decoded from the
+                # raw rows once
+                with self._decoding():
+                    self._other_columns.update(_rows_to_frame(self.metadata, self.rows, missing).items())
+            df = pandas.DataFrame(
+                {c: df[c] if c in df.columns else self._other_columns[c] for c in columns}, columns=columns
+            )
+        if where is not None:
+            keep = _row_filter(self.metadata, where)
+            df = df.loc[numpy.array([keep(row) for row in self.rows], dtype=bool)].reset_index(drop=True)
+        return df
+
+    def diff(self, reference: "TableAnswer") -> TableDiff:
+        """Compare this answer with an answer to the same question on a reference snapshot.
+
+        Rows are matched on their key columns and compared on their value
+        columns (see :py:class:`ColumnMetadata`), like differential questions
+        on the service, but without recomputing either answer.
+
+        >>> answer.diff(reference_answer).changed  # doctest: +SKIP
+        """
+        return diff_answers(self, reference)
+
+    def iter_diff(
+        self, reference: "TableAnswer", chunk_rows: int = 100000, spill_dir: str | None = None
+    ) -> Iterator[RowDiff]:
+        """Compare this answer with a reference answer in bounded memory.
+
+        Like :py:meth:`diff`, but rows are externally sorted by key in runs of
+        ``chunk_rows`` rows kept in temporary files under ``spill_dir``, then
+        merged, and the differences are yielded one at a time as
+        :py:class:`~pybatfish.datamodel.answer.diff.RowDiff` in key order.
+        Combine with spilled answers (see ``spill_threshold``) to diff answers
+        that do not fit in memory. Note that an answer fetched from the
+        service is parsed whole before its rows are spilled, so each answer
+        must still fit in memory once.
+        """
+        return iter_diff_answers(self, reference, chunk_rows, spill_dir)
+
+    def _stored_columns(self) -> list[str]:
+        """Names of the columns whose raw values are kept for this answer."""
+        if isinstance(self.rows, SpilledRows):
+            return self.rows.column_names
+        return self.metadata.get_column_names()
 
-    def frame(self):
-        """Return answer data as a :py:class:`pandas.DataFrame`."""
-        return self.table_data
+    def _check_stored(self, columns: Iterable[str]) -> None:
+        stored = self._stored_columns()
+        missing = [c for c in columns if c not in stored]
+        if missing:
+            raise ValueError(f"Column(s) {missing} are not stored for this answer, stored columns are {stored}")
+
+    def _decoding(self) -> ExitStack:
+        """Context for decoding rows of this answer."""
+        stack = ExitStack()
+        if self._flyweights is not None:
+            stack.enter_context(flyweights(self._flyweights))
+        if self.trace_store is not None:
+            stack.enter_context(trace_store(self.trace_store))
+        return stack
+
+    def _rows_frame(self, indices: Iterable[int], columns: list[str] | None = None) -> pandas.DataFrame:
+        """Return the rows at the given positions as a frame, with the given
+        columns (all by default).
+
+        Only these rows are decoded, unless they are already in the answer frame.
+        """
+        indices = list(indices)
+        names = self._stored_columns() if columns is None else columns
+        if self._table_data is not None and set(names).issubset(self._table_data.columns):
+            return self._table_data.iloc[indices][names].reset_index(drop=True)
+        rows: list[dict[str, Any]]
+        if isinstance(self.rows, SpilledRows):
+            rows = [self.rows.row(i, names) for i in indices]
+        else:
+            rows = [self.rows[i] for i in indices]
+        with self._decoding():
+            return _rows_to_frame(self.metadata, rows, names)
+
+    def _raw_column(self, name: str) -> Iterable[Any]:
+        """Return the undecoded JSON values of a column."""
+        if isinstance(self.rows, SpilledRows):
+            return self.rows.column(name)
+        return (row.get(name) for row in self.rows)
+
+    def dict(self):
+        # type: () -> dict
+        """A dictionary representation of the full answer, including spilled rows."""
+        d = dict(self)
+        if isinstance(self.rows, SpilledRows):
+            elements = d["answerElements"]
+            d["answerElements"] = [dict(elements[0], rows=list(self.rows))] + elements[1:]
+        return d
 
     def __repr__(self):
-        return repr(self.table_data)
+        return self._text()
 
     def _repr_html_(self):
-        return self.table_data._repr_html_()
+        max_rows = self.html_max_rows
+        if max_rows is None:
+            # pandas shows at most display.max_rows rows, do not decode all
+            # rows of larger spilled answers for that
+            display_rows = pandas.get_option("display.max_rows")
+            if self._table_data is not None or display_rows is None or len(self.rows) <= display_rows:
+                return self.table_data._repr_html_()
+            max_rows = display_rows
+        return self._truncated_html(max_rows, self.html_max_cell_items)
+
+    def _text(self) -> str:
+        """Render the answer as text, like its frame.
+
+        Only the displayed rows of spilled answers are decoded.
+        """
+        if self._table_data is not None:
+            return str(self._table_data)
+        max_rows = pandas.get_option("display.max_rows") or len(self.rows)
+        df = self._head_tail_frame(max_rows)
+        if len(self.rows) <= max_rows:
+            return str(df)
+        return f"{df}\n\n[{len(self.rows)} rows x {len(df.columns)} columns]"
+
+    def _head_tail_frame(self, max_rows: int) -> pandas.DataFrame:
+        """Return the first and last rows of the answer, up to max_rows in
+        total, with a marker row between them if rows are left out.
+
+        Only these rows are decoded for spilled answers.
+        """
+        num_rows = len(self.rows)
+        if num_rows > max_rows:
+            head = (max_rows + 1) // 2
+            positions = list(range(head)) + list(range(num_rows - (max_rows - head), num_rows))
+        else:
+            positions = list(range(num_rows))
+        if self._table_data is not None:
+            df = self._table_data.iloc[positions]
+        else:
+            df = self._rows_frame(positions, self._columns)
+            df.index = pandas.Index(positions)
+        if num_rows > max_rows:
+            # Marker row between head and tail, like pandas
+            marker = pandas.DataFrame([["..."] * len(df.columns)], columns=df.columns, index=["..."])
+            df = pandas.concat([df.iloc[:head], marker, df.iloc[head:]])
+        return df
+
+    def _truncated_html(self, max_rows: int, max_cell_items: int) -> str:
+        """Render the first and last rows of the answer, up to max_rows in total.
+
+        Only the rendered rows are decoded for spilled answers. The HTML is
+        kept on the answer, so it is rendered once for each view.
+        """
+        cached = self._html.get((max_rows, max_cell_items))
+        if cached is not None:
+            return cached
+        num_rows = len(self.rows)
+        df = self._head_tail_frame(max_rows)
+        # Format cells up front: pandas does not apply formatters to list cells
+        cells = pandas.DataFrame(
+            {
+                escape_html(column): df[column].map(lambda value: _cell_html(value, max_cell_items))
+                for column in df.columns
+            },
+            index=df.index,
+        )
+        html = f"{cells.to_html(escape=False)}\n<p>{num_rows} rows × {len(df.columns)} columns</p>"
+        self._html[(max_rows, max_cell_items)] = html
+        return html
 
     def __str__(self):
-        return str(self.table_data)
+        return self._text()
 
     def __len__(self):
         # type: () -> int
-        return len(self.table_data)
+        return len(self.rows)
 
 
 class Row(dict):
@@ -103,12 +397,54 @@ class TableMetadata:
         return [cm.name for cm in self.column_metadata]
 
 
-def _rows_to_frame(table_metadata, rows):
-    # type: (TableMetadata, list[Row]) -> pandas.DataFrame
-    row_based = [
-        [_parse_json_with_schema(cm.schema, row.get(cm.name)) for cm in table_metadata.column_metadata] for row in rows
-    ]
-    column_names = table_metadata.get_column_names()
+def _check_columns(table_metadata: TableMetadata, columns: Iterable[str] | None) -> list[str] | None:
+    if columns is None:
+        return None
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    unknown = [c for c in columns if c not in table_metadata.get_column_names()]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown}, valid columns are {table_metadata.get_column_names()}")
+    return columns
+
+
+def _row_filter(table_metadata: TableMetadata, where: RowFilter) -> Callable[[dict[str, Any]], bool]:
+    """Return a predicate over raw JSON rows for the given filter."""
+    if callable(where):
+        return where
+    schemas = {cm.name: cm.schema for cm in table_metadata.column_metadata}
+    unknown = [name for name in where if name not in schemas]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown}, valid columns are {list(schemas)}")
+    conditions = [(name, schemas[name], value) for name, value in where.items()]
+
+    def keep(row: dict[str, Any]) -> bool:
+        # Only the columns named in the filter are decoded
+        return all(_parse_json_with_schema(schema, row.get(name)) == value for name, schema, value in conditions)
+
+    return keep
+
+
+def _rows_to_frame(
+    table_metadata: TableMetadata,
+    rows: Sequence[dict[str, Any]],
+    columns: list[str] | None = None,
+    where: RowFilter | None = None,
+) -> pandas.DataFrame:
+    column_metadata = table_metadata.column_metadata
+    if columns is not None:
+        by_name = {cm.name: cm for cm in column_metadata}
+        column_metadata = [by_name[name] for name in columns]
+    row_iter: Iterable[dict[str, Any]] = iter(rows)
+    if isinstance(rows, SpilledRows) and (columns is not None or where is not None) and not callable(where):
+        # Only read the cells that are needed from disk
+        needed = list({cm.name: None for cm in column_metadata})
+        needed.extend(name for name in (where or {}) if name not in needed)
+        row_iter = (rows.row(i, needed) for i in range(len(rows)))
+    if where is not None:
+        keep = _row_filter(table_metadata, where)
+        row_iter = (row for row in row_iter if keep(row))
+    row_based = [[_parse_json_with_schema(cm.schema, row.get(cm.name)) for cm in column_metadata] for row in row_iter]
+    column_names = [cm.name for cm in column_metadata]
     # convert data to column format and force dtype=object on Series
     # This gets us consistent `None` values across columns -- no columns
     # are treated as numeric.
@@ -120,6 +456,18 @@ def _rows_to_frame(table_metadata, rows):
     return df.reindex(labels=column_names, axis="columns")
 
 
+def _cell_html(value: Any, max_items: int) -> str:
+    """Return the HTML of a table cell, with at most max_items list elements."""
+    if isinstance(value, str):
+        return escape_html(value)
+    if isinstance(value, Sequence):
+        items = [get_html(item) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"<em>... {len(value) - max_items} more</em>")
+        return "<br><br>".join(items)
+    return str(get_html(value))
+
+
 def is_table_ans(d):
     # type: (dict) -> bool
     """Check if a given dictionary represents a table answer."""
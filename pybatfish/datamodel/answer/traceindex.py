@@ -0,0 +1,201 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Index of the traces in a table answer, for path queries."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Hashable, Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Any
+
+import pandas
+
+from pybatfish.datamodel.answer.base import _get_base_schema
+from pybatfish.datamodel.flow import (
+    EnterInputIfaceStepDetail,
+    ExitOutputIfaceStepDetail,
+    FilterStepDetail,
+    Hop,
+    Trace,
+)
+from pybatfish.datamodel.primitives import Interface
+
+if TYPE_CHECKING:
+    from pybatfish.datamodel.answer.table import TableAnswer
+
+__all__ = ["TraceIndex", "TraceQuery"]
+
+# Index keys are (kind, value) pairs
+_Key = tuple[str, Hashable]
+
+
+class TraceIndex:
+    """Index from nodes, interfaces, filters, step actions and dispositions to
+    the traces of a table answer that contain them.
+
+    Built once per answer, see :py:attr:`TableAnswer.traces
+    <pybatfish.datamodel.answer.table.TableAnswer.traces>`. Queries are
+    answered with set intersections:
+
+    >>> answer.traces.where(node="border1", filter="acl_in", action="DENIED")  # doctest: +SKIP
+    """
+
+    def __init__(self, answer: TableAnswer) -> None:
+        self._answer = answer
+        # Where each trace is: row index, column name and position in the
+        # cell. Cells are decoded again when their traces are accessed.
+        self._locations: list[tuple[int, str, int]] = []
+        self._index: dict[_Key, set[int]] = defaultdict(set)
+        stored = answer._stored_columns()
+        columns = [
+            cm.name
+            for cm in answer.metadata.column_metadata
+            if _get_base_schema(cm.schema) == "Trace" and cm.name in stored
+        ]
+        if columns:
+            self._build(answer.frame(columns=columns), columns)
+
+    def _build(self, frame: pandas.DataFrame, columns: Sequence[str]) -> None:
+        # Hops are often shared between traces (see TraceStore and flyweights),
+        # compute the keys of each distinct hop object only once.
+        hop_keys: dict[int, tuple[Hop, frozenset[_Key]]] = {}
+        for column in columns:
+            for row, cell in enumerate(frame[column]):
+                if cell is None:
+                    continue
+                traces = [cell] if isinstance(cell, Trace) else cell
+                for position, trace in enumerate(traces):
+                    trace_id = len(self._locations)
+                    self._locations.append((row, column, position))
+                    self._index[("disposition", trace.disposition)].add(trace_id)
+                    for hop in trace.hops:
+                        cached = hop_keys.get(id(hop))
+                        if cached is None:
+                            cached = hop_keys[id(hop)] = (hop, _hop_keys(hop))
+                        for key in cached[1]:
+                            self._index[key].add(trace_id)
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def all(self) -> TraceQuery:
+        """Return a query matching all traces."""
+        return TraceQuery(self, frozenset(range(len(self._locations))))
+
+    def where(
+        self,
+        node: str | None = None,
+        interface: Interface | str | None = None,
+        filter: str | None = None,
+        action: str | None = None,
+        disposition: str | None = None,
+    ) -> TraceQuery:
+        """Return the traces matching all given criteria.
+
+        :param node: a hop of the trace is at this node
+        :param interface: the trace enters or exits this interface. Either an
+            :py:class:`~pybatfish.datamodel.primitives.Interface` or an
+            interface name on any node.
+        :param filter: the trace goes through this filter. If ``action`` is
+            also given, the filter step itself must have that action (e.g.
+            ``DENIED``).
+        :param action: a step of the trace has this action
+        :param disposition: the trace has this disposition
+        """
+        return self.all().where(node, interface, filter, action, disposition)
+
+    def _lookup(self, key: _Key) -> set[int]:
+        return self._index.get(key, set())
+
+    def _traces(self, trace_ids: Iterable[int]) -> Iterator[Trace]:
+        """Return the traces with the given ids, decoding each cell once for
+        consecutive traces in the same cell."""
+        location = None
+        cell: Any = None
+        for trace_id in trace_ids:
+            row, column, position = self._locations[trace_id]
+            if (row, column) != location:
+                location = (row, column)
+                cell = self._answer._rows_frame([row], [column])[column].iat[0]
+            yield cell if isinstance(cell, Trace) else cell[position]
+
+
+class TraceQuery:
+    """Set of traces of an answer matching a :py:meth:`TraceIndex.where` query."""
+
+    def __init__(self, index: TraceIndex, trace_ids: frozenset[int]) -> None:
+        self._index = index
+        self.trace_ids = trace_ids
+
+    def where(
+        self,
+        node: str | None = None,
+        interface: Interface | str | None = None,
+        filter: str | None = None,
+        action: str | None = None,
+        disposition: str | None = None,
+    ) -> TraceQuery:
+        """Narrow down the query, see :py:meth:`TraceIndex.where`."""
+        keys: list[_Key] = []
+        if node is not None:
+            keys.append(("node", node))
+        if interface is not None:
+            keys.append(("interface", interface) if isinstance(interface, Interface) else ("interface_name", interface))
+        if filter is not None and action is not None:
+            keys.append(("filter_action", (filter, action)))
+        elif filter is not None:
+            keys.append(("filter", filter))
+        elif action is not None:
+            keys.append(("action", action))
+        if disposition is not None:
+            keys.append(("disposition", disposition))
+        # Intersect starting from the smallest set
+        sets = sorted((self._index._lookup(key) for key in keys), key=len)
+        trace_ids = self.trace_ids
+        for s in sets:
+            trace_ids = trace_ids.intersection(s)
+        return TraceQuery(self._index, trace_ids)
+
+    def __len__(self) -> int:
+        return len(self.trace_ids)
+
+    def __iter__(self) -> Iterator[Trace]:
+        return self._index._traces(sorted(self.trace_ids))
+
+    def rows(self) -> list[int]:
+        """Return the indices of the answer rows that have a matching trace."""
+        return sorted({self._index._locations[trace_id][0] for trace_id in self.trace_ids})
+
+    def frame(self) -> pandas.DataFrame:
+        """Return the answer rows that have a matching trace."""
+        answer = self._index._answer
+        return answer._rows_frame(self.rows(), answer._columns)
+
+
+def _hop_keys(hop: Hop) -> frozenset[_Key]:
+    """Return the index keys of a hop."""
+    keys: set[_Key] = {("node", hop.node)}
+    for step in hop.steps:
+        keys.add(("action", step.action))
+        detail = step.detail
+        if isinstance(detail, EnterInputIfaceStepDetail):
+            keys.add(("interface", Interface(hop.node, detail.inputInterface)))
+            keys.add(("interface_name", detail.inputInterface))
+        elif isinstance(detail, ExitOutputIfaceStepDetail):
+            keys.add(("interface", Interface(hop.node, detail.outputInterface)))
+            keys.add(("interface_name", detail.outputInterface))
+        elif isinstance(detail, FilterStepDetail):
+            keys.add(("filter", detail.filter))
+            keys.add(("filter_action", (detail.filter, step.action)))
+    return frozenset(keys)
@@ -0,0 +1,199 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Compact storage for the traces of large forwarding answers."""
+
+from __future__ import annotations
+
+import json
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from pybatfish.datamodel.flow import Hop, Step, Trace
+from pybatfish.datamodel.primitives import ListWrapper
+
+__all__ = ["TraceList", "TraceStore", "trace_store"]
+
+# Store that traces are decoded into, see trace_store()
+_active_store: ContextVar[TraceStore | None] = ContextVar("_active_store", default=None)
+
+
+class TraceStore:
+    """Pool of the unique hops and steps of a set of traces.
+
+    Many flows in a forwarding answer take the same paths, so their traces
+    repeat the same hops. The store decodes every distinct step once, keeps
+    every distinct hop as the ids of its steps, and every distinct trace as
+    the ids of its hops. :py:class:`~pybatfish.datamodel.flow.Trace` objects
+    built from the store share their hops.
+
+    Adding a trace that is already in the store returns its existing id, so
+    decoding the same answer again does not grow the store.
+    """
+
+    def __init__(self) -> None:
+        self._step_ids: dict[str, int] = {}
+        self._steps: list[Step] = []
+        self._hop_ids: dict[tuple[str, tuple[int, ...]], int] = {}
+        self._hop_keys: list[tuple[str, tuple[int, ...]]] = []
+        self._hops: list[Hop | None] = []
+        # Hop ids of all traces, back to back, and where each trace starts
+        self._trace_hops = array("l")
+        self._trace_offsets = array("l", [0])
+        self._trace_ids: dict[tuple[str, bytes], int] = {}
+        self._dispositions: list[str] = []
+        self._encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+    @property
+    def num_traces(self) -> int:
+        """Number of distinct traces."""
+        return len(self._dispositions)
+
+    @property
+    def num_hops(self) -> int:
+        """Number of distinct hops."""
+        return len(self._hop_keys)
+
+    @property
+    def num_steps(self) -> int:
+        """Number of distinct steps."""
+        return len(self._steps)
+
+    def add(self, json_dict: dict[str, Any]) -> int:
+        """Add the JSON of a trace to the store and return its id."""
+        hop_ids = array("l", [self._add_hop(hop) for hop in json_dict.get("hops", [])])
+        key = (json_dict["disposition"], hop_ids.tobytes())
+        trace_id = self._trace_ids.get(key)
+        if trace_id is None:
+            trace_id = self._trace_ids[key] = len(self._dispositions)
+            self._trace_hops.extend(hop_ids)
+            self._trace_offsets.append(len(self._trace_hops))
+            self._dispositions.append(sys.intern(json_dict["disposition"]))
+        return trace_id
+
+    def traces(self, json_list: list[dict[str, Any]]) -> TraceList:
+        """Add the JSON of a list of traces to the store and return a view on them."""
+        return TraceList(self, [self.add(trace) for trace in json_list])
+
+    def trace(self, trace_id: int) -> Trace:
+        """Return the trace with the given id."""
+        return Trace(self._dispositions[trace_id], [self.hop(hop_id) for hop_id in self.hop_ids(trace_id)])
+
+    def disposition(self, trace_id: int) -> str:
+        """Return the disposition of the trace with the given id."""
+        return self._dispositions[trace_id]
+
+    def hop_ids(self, trace_id: int) -> array[int]:
+        """Return the ids of the hops of the trace with the given id."""
+        return self._trace_hops[self._trace_offsets[trace_id] : self._trace_offsets[trace_id + 1]]
+
+    def hop(self, hop_id: int) -> Hop:
+        """Return the hop with the given id."""
+        hop = self._hops[hop_id]
+        if hop is None:
+            node, step_ids = self._hop_keys[hop_id]
+            hop = Hop(node, [self._steps[step_id] for step_id in step_ids])
+            self._hops[hop_id] = hop
+        return hop
+
+    def _add_hop(self, json_dict: dict[str, Any]) -> int:
+        step_ids = []
+        for step in json_dict["steps"]:
+            step_id = self._add_step(step)
+            if step_id is not None:
+                step_ids.append(step_id)
+        key = (json_dict.get("node", {}).get("name"), tuple(step_ids))
+        hop_id = self._hop_ids.get(key)
+        if hop_id is None:
+            hop_id = self._hop_ids[key] = len(self._hop_keys)
+            self._hop_keys.append(key)
+            self._hops.append(None)
+        return hop_id
+
+    def _add_step(self, json_dict: dict[str, Any]) -> int | None:
+        key = self._encoder.encode(json_dict)
+        step_id = self._step_ids.get(key)
+        if step_id is None:
+            step = Step.from_dict(json_dict)
+            if step is None:
+                # Unknown step type, skipped like in Hop.from_dict
+                return None
+            step_id = self._step_ids[key] = len(self._steps)
+            self._steps.append(step)
+        return step_id
+
+
+class TraceList(ListWrapper):
+    """List of traces decoded from a :py:class:`TraceStore`.
+
+    Its traces share their hops (and steps) with all other traces in the
+    store. Compares equal to a list of the same traces.
+    """
+
+    def __init__(self, store: TraceStore, trace_ids: Iterable[int]) -> None:
+        self.store = store
+        self.trace_ids = array("l", trace_ids)
+        super().__init__(store.trace(trace_id) for trace_id in self.trace_ids)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return TraceList(self.store, self.trace_ids[item])
+        return super().__getitem__(item)
+
+    # Other operations building a new list return a plain ListWrapper
+    def union(self, other):
+        return ListWrapper(self).union(other)
+
+    __add__ = __iadd__ = union
+
+    def __radd__(self, other):
+        return ListWrapper(self).__radd__(other)
+
+    def __mul__(self, other):
+        return ListWrapper(self).__mul__(other)
+
+    __imul__ = __mul__
+
+    def difference(self, other):
+        return ListWrapper(self).difference(other)
+
+    def __reduce__(self):
+        return TraceList, (self.store, list(self.trace_ids))
+
+    def __hash__(self) -> int:
+        # Traces are not hashable, equal lists of traces have equal dispositions
+        return hash(tuple(trace.disposition for trace in self))
+
+
+@contextmanager
+def trace_store(store: TraceStore | None = None) -> Iterator[TraceStore]:
+    """Decode traces in answers into a :py:class:`TraceStore`.
+
+    While the context is active, ``List<Trace>`` answer values decode to a
+    :py:class:`TraceList` backed by ``store`` instead of a list of
+    :py:class:`~pybatfish.datamodel.flow.Trace` objects.
+    """
+    store = TraceStore() if store is None else store
+    token = _active_store.set(store)
+    try:
+        yield store
+    finally:
+        _active_store.reset(token)
+
+
+def _get_trace_store() -> TraceStore | None:
+    return _active_store.get()
@@ -14,14 +14,14 @@
 import json
 import re
 from abc import ABCMeta, abstractmethod
-from collections.abc import Iterable, Sequence
+from collections.abc import Callable, Iterable, Sequence
 from typing import Any
 
 import attr
 
 from pybatfish.util import escape_html, escape_name
 
-from .primitives import DataModelElement, Edge
+from .primitives import DataModelElement, Edge, _flyweight
 from .route import NextHop
 
 __all__ = [
@@ -58,7 +58,7 @@ def _optional_int(x):
     return int(x)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Flow(DataModelElement):
     """A concrete IPv4 flow.
 
@@ -101,7 +101,7 @@ class Flow(DataModelElement):
 
     @classmethod
     def from_dict(cls, json_dict: dict[str, Any]) -> "Flow":
-        return Flow(
+        flow = Flow(
             json_dict["dscp"],
             json_dict["dstIp"],
             json_dict.get("dstPort"),
@@ -125,6 +125,7 @@ class Flow(DataModelElement):
             json_dict.get("tcpFlagsSyn"),
             json_dict.get("tcpFlagsUrg"),
         )
+        return _flyweight(flow)
 
     def __str__(self):
         # type: () -> str
@@ -235,7 +236,7 @@ class Flow(DataModelElement):
             return ip
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class FlowDiff(DataModelElement):
     """A difference between two Flows.
 
@@ -258,7 +259,7 @@ class FlowDiff(DataModelElement):
         return f"{self.fieldName}: {self.oldValue} -> {self.newValue}"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class FlowTrace(DataModelElement):
     """A trace of a flow through the network.
 
@@ -309,7 +310,7 @@ class FlowTrace(DataModelElement):
         return f'<span style="color:{_get_color_for_disposition(self.disposition)}; text-weight:bold;">{escape_html(self.notes)}</span>'
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class FlowTraceHop(DataModelElement):
     """A single hop in a flow trace.
 
@@ -354,23 +355,19 @@ class FlowTraceHop(DataModelElement):
 class SessionAction(DataModelElement):
     """An action that a firewall session takes for return traffic matching the session."""
 
+    __slots__ = ()
+
     @classmethod
     def from_dict(cls, json_dict):
         # type: (dict) -> SessionAction
         action = json_dict.get("type")
-        if action == "Accept":
-            return Accept()
-        if action == "PreNatFibLookup":
-            return PreNatFibLookup()
-        if action == "PostNatFibLookup" or action == "FibLookup":
-            # action == "FibLookup" supported for backwards compatibility
-            return PostNatFibLookup()
-        if action == "ForwardOutInterface":
-            return ForwardOutInterface.from_dict(json_dict)
-        raise ValueError(f"Invalid session action type: {action}")
-
-
-@attr.s(frozen=True)
+        decoder = _SESSION_ACTION_DECODERS.get(action)
+        if decoder is None:
+            raise ValueError(f"Invalid session action type: {action}")
+        return decoder(json_dict)
+
+
+@attr.s(frozen=True, slots=True)
 class Accept(SessionAction):
     """A SessionAction whereby return traffic is accepted by the node from which it
     originated.
@@ -381,7 +378,7 @@ class Accept(SessionAction):
         return "Accept"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class PreNatFibLookup(SessionAction):
     """A SessionAction whereby return traffic is forwarded according to the result of a lookup
     on the FIB of the interface on which the return traffic is received before NAT is applied.
@@ -392,7 +389,7 @@ class PreNatFibLookup(SessionAction):
         return "PreNatFibLookup"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class PostNatFibLookup(SessionAction):
     """A SessionAction whereby return traffic is forwarded according to the result of a lookup
     on the FIB of the interface on which the return traffic is received after NAT is applied.
@@ -403,7 +400,7 @@ class PostNatFibLookup(SessionAction):
         return "PostNatFibLookup"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ForwardOutInterface(SessionAction):
     """A SessionAction whereby a return flow is forwarded out a specified interface to a
     specified next hop with neither FIB resolution nor ARP lookup.
@@ -432,7 +429,23 @@ class ForwardOutInterface(SessionAction):
         return f"ForwardOutInterface(Next Hop: {self.nextHopHostname}, Next Hop Interface: {self.nextHopInterface}, Outgoing Interface: {self.outgoingInterface})"
 
 
-@attr.s(frozen=True)
+# Session actions without fields are immutable, so a single instance is shared
+_ACCEPT = Accept()
+_PRE_NAT_FIB_LOOKUP = PreNatFibLookup()
+_POST_NAT_FIB_LOOKUP = PostNatFibLookup()
+
+# Decoders of SessionAction subclasses, by "type"
+_SESSION_ACTION_DECODERS: dict[str | None, Callable[[dict[str, Any]], SessionAction]] = {
+    "Accept": lambda _: _ACCEPT,
+    "PreNatFibLookup": lambda _: _PRE_NAT_FIB_LOOKUP,
+    "PostNatFibLookup": lambda _: _POST_NAT_FIB_LOOKUP,
+    # "FibLookup" supported for backwards compatibility
+    "FibLookup": lambda _: _POST_NAT_FIB_LOOKUP,
+    "ForwardOutInterface": ForwardOutInterface.from_dict,
+}
+
+
+@attr.s(frozen=True, slots=True)
 class SessionMatchExpr(DataModelElement):
     """
     Represents a match criteria for a firewall session.
@@ -475,17 +488,18 @@ class SessionScope(DataModelElement):
     Represents the scope of a firewall session.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_dict(cls, json_dict):
         # type: (dict) -> SessionScope
-        if "incomingInterfaces" in json_dict:
-            return IncomingSessionScope.from_dict(json_dict)
-        elif "originatingVrf" in json_dict:
-            return OriginatingSessionScope.from_dict(json_dict)
+        for key, decoder in _SESSION_SCOPE_DECODERS:
+            if key in json_dict:
+                return decoder(json_dict)
         raise ValueError(f"Invalid session scope: {json_dict}")
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class IncomingSessionScope(SessionScope):
     """
     Represents scope of a firewall session established by traffic leaving specific interfaces.
@@ -505,7 +519,7 @@ class IncomingSessionScope(SessionScope):
         return "Incoming Interfaces: [{}]".format(", ".join(self.incomingInterfaces))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class OriginatingSessionScope(SessionScope):
     """
     Represents scope of a firewall session established by traffic accepted into a specific VRF.
@@ -525,7 +539,14 @@ class OriginatingSessionScope(SessionScope):
         return f"Originating VRF: {self.originatingVrf}"
 
 
-@attr.s(frozen=True)
+# Decoders of SessionScope subclasses, by the key that identifies them
+_SESSION_SCOPE_DECODERS: tuple[tuple[str, Callable[[dict[str, Any]], SessionScope]], ...] = (
+    ("incomingInterfaces", IncomingSessionScope.from_dict),
+    ("originatingVrf", OriginatingSessionScope.from_dict),
+)
+
+
+@attr.s(frozen=True, slots=True)
 class ArpErrorStepDetail(DataModelElement):
     """Details of a step representing the arp error of a flow when sending out of a Hop.
 
@@ -554,7 +575,7 @@ class ArpErrorStepDetail(DataModelElement):
         return ", ".join(detail_info)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class DeliveredStepDetail(DataModelElement):
     """Details of a step representing the flow is delivered or exiting the network.
 
@@ -583,7 +604,7 @@ class DeliveredStepDetail(DataModelElement):
         return ", ".join(detail_info)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class EnterInputIfaceStepDetail(DataModelElement):
     """Details of a step representing the entering of a flow into a Hop.
 
@@ -608,7 +629,7 @@ class EnterInputIfaceStepDetail(DataModelElement):
         return str_output
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ExitOutputIfaceStepDetail(DataModelElement):
     """Details of a step representing the exiting of a flow out of a Hop.
 
@@ -632,7 +653,7 @@ class ExitOutputIfaceStepDetail(DataModelElement):
         return str(self.outputInterface)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class InboundStepDetail(DataModelElement):
     """Details of a step representing the receiving (acceptance) of a flow into a Hop.
 
@@ -650,7 +671,7 @@ class InboundStepDetail(DataModelElement):
         return str(self.interface)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class LoopStepDetail(DataModelElement):
     """Details of a step representing a forwarding loop being detected."""
 
@@ -662,7 +683,7 @@ class LoopStepDetail(DataModelElement):
         return ""
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class MatchSessionStepDetail(DataModelElement):
     """Details of a step for when a flow matches a firewall session.
 
@@ -708,6 +729,8 @@ class MatchSessionStepDetail(DataModelElement):
 
 
 class ForwardingDetail(DataModelElement, metaclass=ABCMeta):
+    __slots__ = ()
+
     def _repr_html_(self) -> str:
         return escape_html(str(self))
 
@@ -720,19 +743,13 @@ class ForwardingDetail(DataModelElement, metaclass=ABCMeta):
         if "type" not in json_dict:
             raise ValueError(f"Unknown type of ForwardingDetail, missing the type property in: {json.dumps(json_dict)}")
         fd_type = json_dict["type"]
-        if fd_type == "DelegatedToNextVrf":
-            return DelegatedToNextVrf.from_dict(json_dict)
-        elif fd_type == "ForwardedIntoVxlanTunnel":
-            return ForwardedIntoVxlanTunnel.from_dict(json_dict)
-        elif fd_type == "ForwardedOutInterface":
-            return ForwardedOutInterface.from_dict(json_dict)
-        elif fd_type == "Discarded":
-            return Discarded.from_dict(json_dict)
-        else:
+        decoder = _FORWARDING_DETAIL_DECODERS.get(fd_type)
+        if decoder is None:
             raise ValueError(f"Unhandled ForwardingDetail type: {json.dumps(fd_type)} in: {json.dumps(json_dict)}")
+        return decoder(json_dict)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class DelegatedToNextVrf(ForwardingDetail):
     """A flow being delegated to a different VRF for further processing."""
 
@@ -753,10 +770,10 @@ class DelegatedToNextVrf(ForwardingDetail):
         assert json_dict["type"] == "DelegatedToNextVrf"
         next_vrf = json_dict["nextVrf"]
         assert isinstance(next_vrf, str)
-        return DelegatedToNextVrf(next_vrf)
+        return _flyweight(DelegatedToNextVrf(next_vrf))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ForwardedIntoVxlanTunnel(ForwardingDetail):
     """A flow being forwarded into a VXLAN tunnel."""
 
@@ -780,10 +797,10 @@ class ForwardedIntoVxlanTunnel(ForwardingDetail):
         vtep = json_dict["vtep"]
         assert isinstance(vni, int)
         assert isinstance(vtep, str)
-        return ForwardedIntoVxlanTunnel(vni, vtep)
+        return _flyweight(ForwardedIntoVxlanTunnel(vni, vtep))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ForwardedOutInterface(ForwardingDetail):
     """A flow being forwarded out an interface.
 
@@ -820,10 +837,10 @@ class ForwardedOutInterface(ForwardingDetail):
         if "resolvedNextHopIp" in json_dict:
             resolved_next_hop_ip = json_dict["resolvedNextHopIp"]
             assert resolved_next_hop_ip is None or isinstance(resolved_next_hop_ip, str)
-        return ForwardedOutInterface(output_interface, resolved_next_hop_ip)
+        return _flyweight(ForwardedOutInterface(output_interface, resolved_next_hop_ip))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Discarded(ForwardingDetail):
     """A flow being discarded."""
 
@@ -840,10 +857,19 @@ class Discarded(ForwardingDetail):
     @classmethod
     def from_dict(cls, json_dict: dict[str, Any]) -> "Discarded":
         assert json_dict == {"type": "Discarded"}
-        return Discarded()
+        return _flyweight(Discarded())
+
+
+# Decoders of ForwardingDetail subclasses, by "type"
+_FORWARDING_DETAIL_DECODERS: dict[str, Callable[[dict[str, Any]], ForwardingDetail]] = {
+    "DelegatedToNextVrf": DelegatedToNextVrf.from_dict,
+    "ForwardedIntoVxlanTunnel": ForwardedIntoVxlanTunnel.from_dict,
+    "ForwardedOutInterface": ForwardedOutInterface.from_dict,
+    "Discarded": Discarded.from_dict,
+}
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class OriginateStepDetail(DataModelElement):
     """Details of a step representing the originating of a flow in a Hop.
 
@@ -862,7 +888,7 @@ class OriginateStepDetail(DataModelElement):
         return str(self.originatingVrf)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class RouteInfo(DataModelElement):
     """Contains information about the routes which led to the selection of the forwarding action for the ExitOutputIfaceStep"""
 
@@ -911,10 +937,10 @@ class RouteInfo(DataModelElement):
         assert isinstance(admin, int)
         metric = json_dict.get("metric")
         assert isinstance(metric, int)
-        return RouteInfo(protocol, network, next_hop, next_hop_ip, admin, metric)
+        return _flyweight(RouteInfo(protocol, network, next_hop, next_hop_ip, admin, metric))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class RoutingStepDetail(DataModelElement):
     """Details of a step representing the routing from input interface to output interface.
 
@@ -974,7 +1000,7 @@ class RoutingStepDetail(DataModelElement):
         return ", ".join(output)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class SetupSessionStepDetail(DataModelElement):
     """Details of a step for when a firewall session is created.
 
@@ -1019,7 +1045,7 @@ class SetupSessionStepDetail(DataModelElement):
         return ", ".join(strings)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class FilterStepDetail(DataModelElement):
     """Details of a step representing a filter step.
 
@@ -1050,7 +1076,7 @@ class FilterStepDetail(DataModelElement):
         return f"{self.filter} ({self.filterType})"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class PolicyStepDetail(DataModelElement):
     """Details of a step representing a generic policy processing step
        (e.g., PBR or equivalent).
@@ -1069,7 +1095,7 @@ class PolicyStepDetail(DataModelElement):
         return f"{self.policy}"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TransformationStepDetail(DataModelElement):
     """Details of a step representation a packet transformation.
 
@@ -1098,7 +1124,25 @@ class TransformationStepDetail(DataModelElement):
         )
 
 
-@attr.s(frozen=True)
+# Decoders of step details, by the "type" of the step
+_STEP_DETAIL_DECODERS: dict[str | None, Callable[[dict[str, Any]], Any]] = {
+    "ArpError": ArpErrorStepDetail.from_dict,
+    "Delivered": DeliveredStepDetail.from_dict,
+    "EnterInputInterface": EnterInputIfaceStepDetail.from_dict,
+    "ExitOutputInterface": ExitOutputIfaceStepDetail.from_dict,
+    "Inbound": InboundStepDetail.from_dict,
+    "Loop": LoopStepDetail.from_dict,
+    "MatchSession": MatchSessionStepDetail.from_dict,
+    "Originate": OriginateStepDetail.from_dict,
+    "Routing": RoutingStepDetail.from_dict,
+    "SetupSession": SetupSessionStepDetail.from_dict,
+    "Transformation": TransformationStepDetail.from_dict,
+    "Policy": PolicyStepDetail.from_dict,
+    "Filter": FilterStepDetail.from_dict,
+}
+
+
+@attr.s(frozen=True, slots=True)
 class Step(DataModelElement):
     """Represents a step in a hop.
 
@@ -1112,32 +1156,11 @@ class Step(DataModelElement):
     @classmethod
     def from_dict(cls, json_dict):
         # type: (dict) -> None|Step
-
-        from_dicts = {
-            "ArpError": ArpErrorStepDetail.from_dict,
-            "Delivered": DeliveredStepDetail.from_dict,
-            "EnterInputInterface": EnterInputIfaceStepDetail.from_dict,
-            "ExitOutputInterface": ExitOutputIfaceStepDetail.from_dict,
-            "Inbound": InboundStepDetail.from_dict,
-            "Loop": LoopStepDetail.from_dict,
-            "MatchSession": MatchSessionStepDetail.from_dict,
-            "Originate": OriginateStepDetail.from_dict,
-            "Routing": RoutingStepDetail.from_dict,
-            "SetupSession": SetupSessionStepDetail.from_dict,
-            "Transformation": TransformationStepDetail.from_dict,
-            "Policy": PolicyStepDetail.from_dict,
-            "Filter": FilterStepDetail.from_dict,
-        }
-
-        action = json_dict.get("action")
-
-        detail = json_dict.get("detail", {})
-        type = json_dict.get("type")
-
-        if type not in from_dicts:
+        decoder = _STEP_DETAIL_DECODERS.get(json_dict.get("type"))
+        if decoder is None:
             return None
-        else:
-            return Step(from_dicts[type](detail), action)
+        detail = _flyweight(decoder(json_dict.get("detail", {})))
+        return _flyweight(Step(detail, json_dict.get("action")))
 
     def __str__(self):
         # type: () -> str
@@ -1153,7 +1176,7 @@ class Step(DataModelElement):
         return str(self)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Hop(DataModelElement):
     """A single hop in a flow trace.
 
@@ -1206,7 +1229,7 @@ class Hop(DataModelElement):
         return routes_str
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Trace(DataModelElement):
     """A trace of a flow through the network.
 
@@ -1251,7 +1274,7 @@ class Trace(DataModelElement):
         )
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TcpFlags(DataModelElement):
     """
     Represents a set of TCP flags in a packet.
@@ -1277,7 +1300,7 @@ class TcpFlags(DataModelElement):
 
     @classmethod
     def from_dict(cls, json_dict):
-        return TcpFlags(
+        flags = TcpFlags(
             ack=json_dict["ack"],
             cwr=json_dict["cwr"],
             ece=json_dict["ece"],
@@ -1287,9 +1310,10 @@ class TcpFlags(DataModelElement):
             syn=json_dict["syn"],
             urg=json_dict["urg"],
         )
+        return _flyweight(flags)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class MatchTcpFlags(DataModelElement):
     """
     Match given :py:class:`TcpFlags`.
@@ -1442,7 +1466,7 @@ def _normalize_phc_strings(value):
     raise ValueError(f"Invalid value {value}")
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class HeaderConstraints(DataModelElement):
     """Constraints on an IPv4 packet header space.
 
@@ -1556,7 +1580,7 @@ class HeaderConstraints(DataModelElement):
         )
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class PathConstraints(DataModelElement):
     """
     Constraints on the path of a flow.
@@ -12,8 +12,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 from abc import ABCMeta, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import Enum
-from typing import Any
+from typing import Any, TypeVar
 
 import attr
 from pandas.core.indexes.frozen import FrozenList
@@ -31,8 +34,43 @@ __all__ = [
     "ListWrapper",
 ]
 
+_T = TypeVar("_T")
 
-@attr.s
+# Table of shared instances used while decoding, see flyweights()
+_flyweight_table: ContextVar[dict[Any, Any] | None] = ContextVar("_flyweight_table", default=None)
+
+
+@contextmanager
+def flyweights(table: dict[Any, Any] | None = None) -> Iterator[dict[Any, Any]]:
+    """Decode equal immutable datamodel values to a single shared instance.
+
+    While the context is active, ``from_dict`` of frequently repeated values
+    (interfaces, flows, next hops, step details, ...) returns the instance
+    already in ``table`` if there is an equal one. Pass the same table to
+    several contexts to share instances across them.
+    """
+    table = {} if table is None else table
+    token = _flyweight_table.set(table)
+    try:
+        yield table
+    finally:
+        _flyweight_table.reset(token)
+
+
+def _flyweight(value: _T) -> _T:
+    """Return the shared instance equal to value if flyweights are enabled."""
+    table = _flyweight_table.get()
+    if table is None:
+        return value
+    try:
+        shared: _T = table.setdefault(value, value)
+    except TypeError:
+        # Unhashable, e.g. contains a list
+        return value
+    return shared
+
+
+@attr.s(slots=True)
 class DataModelElement:
     __metaclass__ = ABCMeta
 
@@ -58,7 +96,7 @@ class AssertionType(str, Enum):
     EQUALS = "equals"  #: Result equals to value (list of rows). **Experimental**
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Assertion(DataModelElement):
     """A Batfish assertion.
 
@@ -154,7 +192,7 @@ class VariableType(str, Enum):
     ZONE = "zone"  #: names of zones
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AutoCompleteSuggestion(DataModelElement):
     """Represent one auto complete suggestion.
 
@@ -200,7 +238,7 @@ class AutoCompleteSuggestion(DataModelElement):
         )
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Interface(DataModelElement):
     """A network interface --- a combination of node and interface names.
 
@@ -214,7 +252,7 @@ class Interface(DataModelElement):
     @classmethod
     def from_dict(cls, json_dict):
         # type: (dict) -> Interface
-        return Interface(json_dict["hostname"], json_dict["interface"])
+        return _flyweight(Interface(json_dict["hostname"], json_dict["interface"]))
 
     def __str__(self):
         # type: () -> str
@@ -233,7 +271,7 @@ def _interface_converter(val):
         return str(val)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class Edge(DataModelElement):
     """A network edge (i.e., a link between two node/interface pairs).
 
@@ -267,7 +305,7 @@ class Edge(DataModelElement):
         return f"{self.node1}:{self.node1interface} &rarr; {self.node2}:{self.node2interface}"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class FileLines(DataModelElement):
     """A class that represents a set of lines in a file.
 
@@ -50,7 +50,7 @@ def _make_string_list(value):
     return _make_typed_list(value, str)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AddressGroup(DataModelElement):
     """
     Information about an address group.
@@ -85,7 +85,7 @@ def _make_interface_list(value):
     return _make_typed_list(value, Interface)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class InterfaceGroup(DataModelElement):
     """
     Information about an interface group.
@@ -106,7 +106,7 @@ class InterfaceGroup(DataModelElement):
         )
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class RoleMapping(DataModelElement):
     """
     A mapping from node name to role dimensions.
@@ -142,7 +142,7 @@ def _make_role_mappings(value):
     return _make_typed_list(value, RoleMapping)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class NodeRolesData(DataModelElement):
     """
     Information about a node roles data.
@@ -179,7 +179,7 @@ def _make_interface_groups(value):
 # TODO: Extend ReferenceBook other types of references beyond address groups
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ReferenceBook(DataModelElement):
     """
     Information about a reference book.
@@ -208,7 +208,7 @@ def _make_reference_books(value):
     return _make_typed_list(value, ReferenceBook)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ReferenceLibrary(DataModelElement):
     """
     Information about a reference library.
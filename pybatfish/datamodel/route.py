@@ -14,12 +14,12 @@
 import builtins
 import json
 from abc import ABCMeta, abstractmethod
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 from typing import Any
 
 import attr
 
-from pybatfish.datamodel.primitives import DataModelElement
+from pybatfish.datamodel.primitives import DataModelElement, _flyweight
 from pybatfish.util import escape_html, escape_name
 
 __all__ = [
@@ -37,7 +37,7 @@ __all__ = [
 ]
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class BgpRoute(DataModelElement):
     """A BGP routing advertisement.
 
@@ -151,7 +151,7 @@ def _string_list_brc_converter(value):
     raise ValueError(f"Invalid value {value}")
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class BgpRouteConstraints(DataModelElement):
     """Constraints on a BGP route announcement.
 
@@ -185,7 +185,7 @@ class BgpRouteConstraints(DataModelElement):
         )
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class BgpRouteDiff(DataModelElement):
     """A difference between two BGP routes.
 
@@ -225,7 +225,7 @@ class BgpRouteDiff(DataModelElement):
         return f"{prettyFieldName}: {self.oldValue} --> {self.newValue}"
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class BgpRouteDiffs(DataModelElement):
     """A set of differences between two BGP routes.
 
@@ -244,7 +244,7 @@ class BgpRouteDiffs(DataModelElement):
         return "<br>".join(diff._repr_html_() for diff in self.diffs)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class BgpSessionProperties(DataModelElement):
     """Properties of a BGP session.
 
@@ -283,6 +283,8 @@ class BgpSessionProperties(DataModelElement):
 class NextHop(DataModelElement, metaclass=ABCMeta):
     """A next-hop of a route"""
 
+    __slots__ = ()
+
     def _repr_html_(self) -> str:
         return escape_html(str(self))
 
@@ -295,21 +297,13 @@ class NextHop(DataModelElement, metaclass=ABCMeta):
         if "type" not in json_dict:
             raise ValueError(f"Unknown type of NextHop, missing the type property in: {json.dumps(json_dict)}")
         nh_type = json_dict["type"]
-        if nh_type == "discard":
-            return NextHopDiscard.from_dict(json_dict)
-        elif nh_type == "interface":
-            return NextHopInterface.from_dict(json_dict)
-        elif nh_type == "ip":
-            return NextHopIp.from_dict(json_dict)
-        elif nh_type == "vrf":
-            return NextHopVrf.from_dict(json_dict)
-        elif nh_type == "vtep":
-            return NextHopVtep.from_dict(json_dict)
-        else:
+        decoder = _NEXT_HOP_DECODERS.get(nh_type)
+        if decoder is None:
             raise ValueError(f"Unhandled NextHop type: {json.dumps(nh_type)} in: {json.dumps(json_dict)}")
+        return decoder(json_dict)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class NextHopDiscard(NextHop):
     """Indicates the packet should be dropped"""
 
@@ -329,10 +323,10 @@ class NextHopDiscard(NextHop):
     @classmethod
     def from_dict(cls, json_dict: builtins.dict[str, Any]) -> "NextHopDiscard":
         assert json_dict == {"type": "discard"}
-        return NextHopDiscard()
+        return _flyweight(NextHopDiscard())
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class NextHopInterface(NextHop):
     """A next-hop of a route with a fixed output interface and optional next gateway IP.
 
@@ -365,10 +359,10 @@ class NextHopInterface(NextHop):
         if "ip" in json_dict:
             ip = json_dict["ip"]
             assert ip is None or isinstance(ip, str)
-        return NextHopInterface(interface, ip)
+        return _flyweight(NextHopInterface(interface, ip))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class NextHopIp(NextHop):
     """A next-hop of a route including the next gateway IP"""
 
@@ -389,10 +383,10 @@ class NextHopIp(NextHop):
         assert json_dict["type"] == "ip"
         ip = json_dict["ip"]
         assert isinstance(ip, str)
-        return NextHopIp(ip)
+        return _flyweight(NextHopIp(ip))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class NextHopVrf(NextHop):
     """A next-hop of a route indicating the destination IP should be resolved in another VRF"""
 
@@ -413,10 +407,10 @@ class NextHopVrf(NextHop):
         assert json_dict["type"] == "vrf"
         vrf = json_dict["vrf"]
         assert isinstance(vrf, str)
-        return NextHopVrf(vrf)
+        return _flyweight(NextHopVrf(vrf))
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class NextHopVtep(NextHop):
     """A next-hop of a route indicating the packet should be routed through a VXLAN tunnel"""
 
@@ -440,4 +434,14 @@ class NextHopVtep(NextHop):
         vtep = json_dict["vtep"]
         assert isinstance(vni, int)
         assert isinstance(vtep, str)
-        return NextHopVtep(vni, vtep)
+        return _flyweight(NextHopVtep(vni, vtep))
+
+
+# Decoders of NextHop subclasses, by "type"
+_NEXT_HOP_DECODERS: dict[str, Callable[[dict[str, Any]], NextHop]] = {
+    "discard": NextHopDiscard.from_dict,
+    "interface": NextHopInterface.from_dict,
+    "ip": NextHopIp.from_dict,
+    "vrf": NextHopVrf.from_dict,
+    "vtep": NextHopVtep.from_dict,
+}
@@ -28,6 +28,7 @@ import attr
 from pybatfish.client.internal import _bf_get_question_templates
 from pybatfish.datamodel import Assertion, AssertionType, BgpRoute, VariableType
 from pybatfish.datamodel.answer.base import Answer
+from pybatfish.datamodel.answer.table import RowFilter
 from pybatfish.exception import QuestionValidationException
 from pybatfish.util import BfJsonEncoder, get_uuid, validate_question_name
 
@@ -131,6 +132,8 @@ class QuestionBase:
         include_one_table_keys: bool | None = None,
         background: bool = False,
         extra_args: dict[str, Any] | None = None,
+        columns: Iterable[str] | None = None,
+        where: RowFilter | None = None,
     ) -> str | Answer:
         """
         Ask and return the answer for this question.
@@ -148,6 +151,10 @@ class QuestionBase:
         :type background: bool
         :param extra_args: extra arguments to be passed with the question.
         :type extra_args: dict
+        :param columns: for table answers, only decode these columns.
+        :type columns: list[str]
+        :param where: for table answers, only keep rows matching this filter
+            (see :py:class:`~pybatfish.datamodel.answer.table.TableAnswer`).
         :rtype: :py:class:`~pybatfish.datamodel.answer.base.Answer` or
             :py:class:`~pybatfish.datamodel.answer.table.TableAnswer`
 
@@ -160,6 +167,13 @@ class QuestionBase:
         _validate(self.dict())
         if include_one_table_keys is not None:
             self._set_include_one_table_keys(include_one_table_keys)
+        # Only pass decoding options when set, to support sessions that
+        # override answer_question without them
+        decode_kwargs: dict[str, Any] = {}
+        if columns is not None:
+            decode_kwargs["columns"] = columns
+        if where is not None:
+            decode_kwargs["where"] = where
         return session.answer_question(
             question_str=self.json(),
             question_name=self.get_name(),
@@ -167,6 +181,7 @@ class QuestionBase:
             snapshot=real_snapshot,
             reference_snapshot=reference_snapshot,
             extra_args=extra_args,
+            **decode_kwargs,
         )
 
     def dict(self):
@@ -15,17 +15,30 @@
 
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import contextlib
+import fnmatch
+import functools
+import hashlib
 import os
+import posixpath
+import queue
 import string
-import tempfile
+import struct
+import threading
 import uuid
 import zipfile
+import zlib
 from collections.abc import (
+    Callable,
+    Collection,
     Iterable,
+    Iterator,
     Mapping,
     Sized,
 )
-from typing import IO
+from typing import IO, Any, cast
 
 import simplejson
 
@@ -35,10 +48,6 @@ from pybatfish.exception import QuestionValidationException
 # Not 255 to accommodate potential folders/extensions, etc.
 _MAX_FILENAME_LEN = 150
 
-# Minimum timestamp supported by ZIP format
-# See issue https://bugs.python.org/issue34097
-_MIN_ZIP_TIMESTAMP = 315561600.0
-
 # Characters that must be escaped in name
 # Should be in sync with SPECIAL_CHARS in CommonParser.java
 _NAME_SPECIAL_CHARS_ = " \t,\\&()[]@" + "!#$%^;?<>={}"
@@ -46,13 +55,16 @@ _NAME_SPECIAL_CHARS_ = " \t,\\&()[]@" + "!#$%^;?<>={}"
 __all__ = [
     "BfJsonEncoder",
     "conditional_str",
+    "content_hash",
     "escape_html",
     "escape_name",
+    "file_manifest",
     "get_html",
     "get_uuid",
     "validate_name",
     "validate_question_name",
     "zip_dir",
+    "zip_dir_stream",
 ]
 
 
@@ -139,7 +151,131 @@ def validate_question_name(name):
     return True
 
 
-def zip_dir(dir_path: str, out_file: str | IO[bytes]) -> None:
+def content_hash(
+    path: str, include: str | Iterable[str] | None = None, exclude: str | Iterable[str] | None = None
+) -> str:
+    """
+    Return a stable SHA-256 hex digest of the contents of a file or directory.
+
+    For a directory, the digest covers the relative paths and contents of all
+    files under it, but not the name of the directory itself or timestamps.
+
+    :param path: path to the file or directory
+    :type path: str
+    :param include: patterns of the only files of a directory to cover, see :py:func:`zip_dir`
+    :type include: str | list[str]
+    :param exclude: patterns of files and directories of a directory to skip, see :py:func:`zip_dir`
+    :type exclude: str | list[str]
+    """
+    digest = hashlib.sha256()
+    if not os.path.isdir(path):
+        _hash_file(digest, path)
+        return digest.hexdigest()
+    for root, _rel_dir, dirs, files in _walk(path, include, exclude):
+        # Walk in a fixed order
+        dirs.sort()
+        for f in sorted(files):
+            filename = os.path.join(root, f)
+            digest.update(os.path.relpath(filename, path).replace(os.sep, "/").encode())
+            digest.update(b"\0")
+            file_digest = hashlib.sha256()
+            _hash_file(file_digest, filename)
+            digest.update(file_digest.digest())
+    return digest.hexdigest()
+
+
+def file_manifest(
+    dir_path: str, include: str | Iterable[str] | None = None, exclude: str | Iterable[str] | None = None
+) -> dict[str, str]:
+    """
+    Return the SHA-256 hex digest of every file under a directory.
+
+    :param dir_path: path to the directory
+    :type dir_path: str
+    :param include: patterns of the only files to cover, see :py:func:`zip_dir`
+    :type include: str | list[str]
+    :param exclude: patterns of files and directories to skip, see :py:func:`zip_dir`
+    :type exclude: str | list[str]
+    :return: digests by path relative to the directory, with ``/`` separators
+    :rtype: dict[str, str]
+    """
+    manifest = {}
+    for root, rel_dir, _dirs, files in _walk(dir_path, include, exclude):
+        for f in files:
+            digest = hashlib.sha256()
+            _hash_file(digest, os.path.join(root, f))
+            manifest[posixpath.join(rel_dir, f)] = digest.hexdigest()
+    return manifest
+
+
+class _PathFilter:
+    """Include and exclude patterns of files and directories, see :py:func:`zip_dir`."""
+
+    def __init__(self, include: str | Iterable[str] | None, exclude: str | Iterable[str] | None) -> None:
+        self._include = None if include is None else _parse_patterns(include)
+        self._exclude = _parse_patterns(exclude or [])
+
+    def keep_dir(self, rel_path: str) -> bool:
+        return not _any_match(self._exclude, rel_path, True)
+
+    def keep_file(self, rel_path: str) -> bool:
+        if _any_match(self._exclude, rel_path, False):
+            return False
+        return self._include is None or _any_match(self._include, rel_path, False)
+
+
+def _parse_patterns(patterns: str | Iterable[str]) -> list[tuple[str, bool, bool]]:
+    """Return each pattern without leading and trailing slashes, whether it
+    matches paths rather than names, and whether it only matches directories."""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return [(p.strip("/"), "/" in p.rstrip("/"), p.endswith("/")) for p in patterns]
+
+
+def _any_match(patterns: list[tuple[str, bool, bool]], rel_path: str, is_dir: bool) -> bool:
+    name = posixpath.basename(rel_path)
+    return any(
+        fnmatch.fnmatchcase(rel_path if is_path else name, pattern)
+        for pattern, is_path, dir_only in patterns
+        if is_dir or not dir_only
+    )
+
+
+def _walk(
+    dir_path: str, include: str | Iterable[str] | None = None, exclude: str | Iterable[str] | None = None
+) -> Iterator[tuple[str, str, list[str], list[str]]]:
+    """Walk a directory like :py:func:`os.walk`, without the excluded
+    directories and files and the files that are not included.
+
+    Yields the path of each directory, its path relative to ``dir_path`` with
+    ``/`` separators (empty for ``dir_path``), and its subdirectories and
+    files. Excluded directories are not walked; callers can remove more
+    subdirectories, like with :py:func:`os.walk`.
+    """
+    path_filter = None if include is None and exclude is None else _PathFilter(include, exclude)
+    for root, dirs, files in os.walk(dir_path):
+        rel_dir = os.path.relpath(root, dir_path).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        if path_filter is not None:
+            dirs[:] = [d for d in dirs if path_filter.keep_dir(posixpath.join(rel_dir, d))]
+            files = [f for f in files if path_filter.keep_file(posixpath.join(rel_dir, f))]
+        yield root, rel_dir, dirs, files
+
+
+def _hash_file(digest: Any, filename: str) -> None:
+    with open(filename, "rb") as f:
+        for block in iter(functools.partial(f.read, 1 << 20), b""):
+            digest.update(block)
+
+
+def zip_dir(
+    dir_path: str,
+    out_file: str | IO[bytes],
+    workers: int = 1,
+    files: Collection[str] | None = None,
+    include: str | Iterable[str] | None = None,
+    exclude: str | Iterable[str] | None = None,
+) -> None:
     """
     ZIP a specified directory and write it to the given output file path.
 
@@ -147,28 +283,382 @@ def zip_dir(dir_path: str, out_file: str | IO[bytes]) -> None:
     :type dir_path: str
     :param out_file: path to the resulting zipfile
     :type out_file: str
+    :param workers: number of threads compressing files in parallel. The
+        archive has the same members for any number of workers.
+    :type workers: int
+    :param files: paths relative to ``dir_path``, with ``/`` separators, of
+        the only files to add (with their parent directories). All files are
+        added by default.
+    :type files: collections.abc.Collection[str]
+    :param include: glob patterns of the only files to add (all files by
+        default). Like in ``.gitignore`` files, a pattern without a slash,
+        e.g. ``*.cfg``, matches names at any depth; other patterns, e.g.
+        ``configs/*.cfg``, match paths relative to ``dir_path``.
+    :type include: str | list[str]
+    :param exclude: glob patterns of files and directories to leave out,
+        matched like ``include``, e.g. ``[".git", "*.pcap", "backups/"]``.
+        Patterns with a trailing slash only match directories. Excluded
+        directories are not walked.
+    :type exclude: str | list[str]
+    """
+    if workers > 1:
+        _zip_entries_parallel(out_file, _zip_entries(dir_path, files, include, exclude), workers)
+        return
+    # Zipped files must be from 1980 or later, older timestamps are clamped
+    # to 1980 on the archive member (see https://bugs.python.org/issue34097)
+    with zipfile.ZipFile(out_file, "w", zipfile.ZIP_DEFLATED, strict_timestamps=False) as zipWriter:
+        for filename, arcname, is_dir in _zip_entries(dir_path, files, include, exclude):
+            zipWriter.write(filename, arcname, zipfile.ZIP_STORED if is_dir else None)
+
+
+def _zip_entries(
+    dir_path: str,
+    selected: Collection[str] | None = None,
+    include: str | Iterable[str] | None = None,
+    exclude: str | Iterable[str] | None = None,
+) -> Iterator[tuple[str, str, bool]]:
+    """Return the path, name in the archive and whether it is a directory of
+    everything under a directory, or of the selected files and their parent
+    directories, in archive order."""
+    rel_root = os.path.abspath(os.path.join(dir_path, os.path.pardir))
+    selected_files = None if selected is None else set(selected)
+    selected_dirs = set()
+    for path in selected_files or ():
+        while path:
+            path = posixpath.dirname(path)
+            selected_dirs.add(path)
+    for root, rel_dir, dirs, files in _walk(dir_path, include, exclude):
+        if selected_files is not None:
+            # Do not descend into directories without selected files
+            dirs[:] = [d for d in dirs if posixpath.join(rel_dir, d) in selected_dirs]
+            files = [f for f in files if posixpath.join(rel_dir, f) in selected_files]
+        yield root, os.path.relpath(root, rel_root), True
+        for f in files:
+            yield os.path.join(root, f), os.path.join(os.path.relpath(root, rel_root), f), False
+
+
+def _zip_entries_parallel(out_file: str | IO[bytes], entries: Iterable[tuple[str, str, bool]], workers: int) -> None:
+    """Write entries to a zip archive, deflating files in a thread pool.
+
+    zlib releases the GIL, so files are compressed in parallel. zipfile cannot
+    write precompressed data, so the archive is framed by :py:class:`_ZipStreamWriter`.
+    Members are written in order as they complete, with a bounded number in
+    flight. Only files up to ``_PARALLEL_MAX_FILE_SIZE`` bytes are read whole
+    by the workers; larger files are streamed from disk by the calling thread.
     """
-    with zipfile.ZipFile(out_file, "w", zipfile.ZIP_DEFLATED) as zipWriter:
-        rel_root = os.path.abspath(os.path.join(dir_path, os.path.pardir))
-
-        for root, _dirs, files in os.walk(dir_path):
-            zipWriter.write(root, os.path.relpath(root, rel_root), zipfile.ZIP_STORED)
-            for f in files:
-                filename = os.path.join(root, f)
-                arcname = os.path.join(os.path.relpath(root, rel_root), f)
-
-                # Zipped files must be from 1980 or later
-                # So copy any file older than that to a tempfile to bump the timestamp
-                if os.path.getmtime(filename) < _MIN_ZIP_TIMESTAMP:
-                    with (
-                        tempfile.NamedTemporaryFile("w+b") as temp_file,
-                        open(filename, "rb") as file_src,
-                    ):
-                        temp_file.write(file_src.read())
-                        temp_file.flush()
-                        zipWriter.write(temp_file.name, arcname)
-                else:
-                    zipWriter.write(filename, arcname)
+    with contextlib.ExitStack() as stack:
+        fp = stack.enter_context(open(out_file, "wb")) if isinstance(out_file, str) else out_file
+        writer = _ZipStreamWriter(fp)
+        pool = stack.enter_context(
+            concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="pybatfish-deflate")
+        )
+        pending: collections.deque[tuple[str, zipfile.ZipInfo, concurrent.futures.Future[_Deflated] | None]]
+        pending = collections.deque()
+        for filename, arcname, is_dir in entries:
+            # Clamp pre-1980 timestamps, like zip_dir
+            zinfo = zipfile.ZipInfo.from_file(filename, arcname, strict_timestamps=False)
+            deflated = None
+            if not is_dir and zinfo.file_size <= _PARALLEL_MAX_FILE_SIZE:
+                deflated = pool.submit(_deflate_file, filename)
+            pending.append((filename, zinfo, deflated))
+            while len(pending) > workers * 2:
+                _write_pending(writer, *pending.popleft())
+        while pending:
+            _write_pending(writer, *pending.popleft())
+        writer.close()
+
+
+# Files up to this size are read whole and compressed by the workers when
+# zipping in parallel, see _zip_entries_parallel
+_PARALLEL_MAX_FILE_SIZE = 1 << 20
+
+# CRC-32, size and raw deflate stream of a file
+_Deflated = tuple[int, int, bytes]
+
+
+def _deflate_file(filename: str) -> _Deflated:
+    with open(filename, "rb") as f:
+        data = f.read()
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return zlib.crc32(data), len(data), compressor.compress(data) + compressor.flush()
+
+
+def _write_pending(
+    writer: _ZipStreamWriter,
+    filename: str,
+    zinfo: zipfile.ZipInfo,
+    deflated: concurrent.futures.Future[_Deflated] | None,
+) -> None:
+    if zinfo.is_dir():
+        writer.write(zinfo, 0, 0, [])
+    elif deflated is None:
+        writer.write_file(zinfo, filename)
+    else:
+        crc, file_size, compressed = deflated.result()
+        zinfo.file_size = file_size
+        writer.write(zinfo, crc, len(compressed), [compressed], zipfile.ZIP_DEFLATED)
+
+
+class _ZipStreamWriter:
+    """Writes a zip archive of already compressed members to a file object,
+    which need not be seekable.
+
+    Follows the zip specification (APPNOTE.TXT) like zipfile, including ZIP64
+    extensions for large archives, but takes the raw member data from the
+    caller.
+    """
+
+    _LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+    _CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+    _END = struct.Struct("<4s4H2LH")
+    _END64 = struct.Struct("<4sQ2H2L4Q")
+    _END64_LOCATOR = struct.Struct("<4sLQL")
+    _LIMIT = 0xFFFFFFFF
+
+    def __init__(self, fp: IO[bytes]) -> None:
+        self._fp = fp
+        self._offset = 0
+        self._central: list[bytes] = []
+
+    def _emit(self, data: bytes) -> None:
+        self._fp.write(data)
+        self._offset += len(data)
+
+    def write(
+        self,
+        zinfo: zipfile.ZipInfo,
+        crc: int,
+        compress_size: int,
+        chunks: Iterable[bytes],
+        compress_type: int = zipfile.ZIP_STORED,
+    ) -> None:
+        """Add a member with the given CRC-32 and sizes and its raw data."""
+        zinfo.CRC, zinfo.compress_size, zinfo.compress_type = crc, compress_size, compress_type
+        zinfo.header_offset = self._offset
+        zip64 = max(zinfo.file_size, compress_size) >= self._LIMIT
+        extra = struct.pack("<2H2Q", 1, 16, zinfo.file_size, compress_size) if zip64 else b""
+        sizes = (self._LIMIT, self._LIMIT) if zip64 else (compress_size, zinfo.file_size)
+        self._emit_local_header(zinfo, 0, crc, *sizes, extra, zip64)
+        for chunk in chunks:
+            self._emit(chunk)
+        self._add_central_header(zinfo, 0, zip64)
+
+    def write_file(self, zinfo: zipfile.ZipInfo, filename: str) -> None:
+        """Add a member deflated from a file while it is written, with its
+        CRC-32 and sizes in a data descriptor after the data."""
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.header_offset = self._offset
+        # Decided before the data is known, with the same margin as zipfile
+        zip64 = zinfo.file_size * 1.05 > self._LIMIT
+        extra = struct.pack("<2H2Q", 1, 16, 0, 0) if zip64 else b""
+        self._emit_local_header(zinfo, 0x08, 0, 0, 0, extra, zip64)
+        crc = file_size = 0
+        start = self._offset
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        with open(filename, "rb") as f:
+            for block in iter(functools.partial(f.read, 1 << 20), b""):
+                crc = zlib.crc32(block, crc)
+                file_size += len(block)
+                self._emit(compressor.compress(block))
+        self._emit(compressor.flush())
+        zinfo.CRC, zinfo.file_size, zinfo.compress_size = crc, file_size, self._offset - start
+        if not zip64 and max(file_size, zinfo.compress_size) >= self._LIMIT:
+            raise RuntimeError(f"File {filename} grew too large while it was zipped")
+        size_format = "<4sL2Q" if zip64 else "<4s3L"
+        self._emit(struct.pack(size_format, b"PK\x07\x08", crc, zinfo.compress_size, file_size))
+        self._add_central_header(zinfo, 0x08, zip64)
+
+    def close(self) -> None:
+        """Write the central directory."""
+        start = self._offset
+        for header in self._central:
+            self._emit(header)
+        count, size = len(self._central), self._offset - start
+        if count > 0xFFFF or size >= self._LIMIT or start >= self._LIMIT:
+            end64 = self._offset
+            self._emit(self._END64.pack(b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, size, start))
+            self._emit(self._END64_LOCATOR.pack(b"PK\x06\x07", 0, end64, 1))
+        self._emit(
+            self._END.pack(
+                b"PK\x05\x06",
+                0,
+                0,
+                min(count, 0xFFFF),
+                min(count, 0xFFFF),
+                min(size, self._LIMIT),
+                min(start, self._LIMIT),
+                0,
+            )
+        )
+        self._fp.flush()
+
+    def _emit_local_header(
+        self,
+        zinfo: zipfile.ZipInfo,
+        flags: int,
+        crc: int,
+        compress_size: int,
+        file_size: int,
+        extra: bytes,
+        zip64: bool,
+    ) -> None:
+        name, name_flags = _zip_name(zinfo.filename)
+        dos_time, dos_date = _dos_time(zinfo.date_time)
+        self._emit(
+            self._LOCAL_HEADER.pack(
+                b"PK\x03\x04",
+                45 if zip64 else 20,
+                flags | name_flags,
+                zinfo.compress_type,
+                dos_time,
+                dos_date,
+                crc,
+                compress_size,
+                file_size,
+                len(name),
+                len(extra),
+            )
+        )
+        self._emit(name + extra)
+
+    def _add_central_header(self, zinfo: zipfile.ZipInfo, flags: int, zip64: bool) -> None:
+        name, name_flags = _zip_name(zinfo.filename)
+        dos_time, dos_date = _dos_time(zinfo.date_time)
+        # Values that do not fit are replaced by the ZIP64 extra field
+        fields = [zinfo.file_size, zinfo.compress_size, zinfo.header_offset]
+        large = [value for value in fields if value >= self._LIMIT]
+        extra = struct.pack(f"<2H{len(large)}Q", 1, 8 * len(large), *large) if large else b""
+        file_size, compress_size, offset = (min(value, self._LIMIT) for value in fields)
+        version = 45 if zip64 or large else 20
+        self._central.append(
+            self._CENTRAL_HEADER.pack(
+                b"PK\x01\x02",
+                zinfo.create_system << 8 | version,
+                version,
+                flags | name_flags,
+                zinfo.compress_type,
+                dos_time,
+                dos_date,
+                zinfo.CRC,
+                compress_size,
+                file_size,
+                len(name),
+                len(extra),
+                0,
+                0,
+                0,
+                zinfo.external_attr,
+                offset,
+            )
+            + name
+            + extra
+        )
+
+
+def _zip_name(filename: str) -> tuple[bytes, int]:
+    """Return the encoded name of a zip member and its general purpose flags."""
+    try:
+        return filename.encode("ascii"), 0
+    except UnicodeEncodeError:
+        return filename.encode("utf-8"), 0x800
+
+
+def _dos_time(date_time: tuple[int, int, int, int, int, int]) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+
+def zip_dir_stream(
+    dir_path: str,
+    chunk_size: int = 1 << 20,
+    max_pending: int = 8,
+    workers: int = 1,
+    include: str | Iterable[str] | None = None,
+    exclude: str | Iterable[str] | None = None,
+) -> Iterator[bytes]:
+    """
+    ZIP a specified directory and return the zip file as an iterator of chunks.
+
+    The directory is compressed in a background thread while the chunks are
+    consumed (e.g., sent as the body of an HTTP request), so at most
+    ``max_pending`` chunks of about ``chunk_size`` bytes are held in memory
+    and nothing is written to disk.
+
+    :param dir_path: path to the directory to be zipped up
+    :param chunk_size: minimum size in bytes of the chunks, except for the last one
+    :param max_pending: maximum number of chunks compressed ahead of the consumer
+    :param workers: number of threads compressing files, see :py:func:`zip_dir`
+    :param include: patterns of the only files to add, see :py:func:`zip_dir`
+    :param exclude: patterns of files and directories to leave out, see :py:func:`zip_dir`
+    """
+    chunks: queue.Queue[bytes | BaseException | None] = queue.Queue(maxsize=max_pending)
+    stopped = threading.Event()
+
+    def put(item: bytes | BaseException | None) -> None:
+        # Give up if the consumer went away, rather than block forever
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise _StreamClosed()
+
+    def produce() -> None:
+        try:
+            writer = _ChunkWriter(put, chunk_size)
+            zip_dir(dir_path, cast(IO[bytes], writer), workers, include=include, exclude=exclude)
+            writer.flush_chunk()
+            put(None)
+        except _StreamClosed:
+            pass
+        except BaseException as e:
+            try:
+                put(e)
+            except _StreamClosed:
+                pass
+
+    thread = threading.Thread(target=produce, name="pybatfish-zip", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+class _StreamClosed(Exception):
+    """The consumer of a :py:func:`zip_dir_stream` stopped reading."""
+
+
+class _ChunkWriter:
+    """Write-only, unseekable file that hands written bytes over in chunks."""
+
+    def __init__(self, emit: Callable[[bytes], None], chunk_size: int) -> None:
+        self._emit = emit
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_size:
+            self.flush_chunk()
+        return len(data)
+
+    def flush(self) -> None:
+        # Chunks are only handed over once full, see flush_chunk
+        pass
+
+    def flush_chunk(self) -> None:
+        if self._buffer:
+            self._emit(bytes(self._buffer))
+            self._buffer.clear()
 
 
 def escape_html(s: str) -> str:
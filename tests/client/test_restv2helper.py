@@ -11,8 +11,14 @@
 #   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
+import hashlib
+import http.server
 import io
 import json
+import os
+import socket
+import threading
+import urllib.parse
 from unittest.mock import Mock, patch
 
 import pytest
@@ -20,22 +26,25 @@ import requests
 from requests import HTTPError, Response
 
 from pybatfish.client import restv2helper
-from pybatfish.client.consts import CoordConsts
+from pybatfish.client.consts import CoordConsts, CoordConstsV2
 from pybatfish.client.options import Options
 from pybatfish.client.restv2helper import (
     _adapter,
     _adapter_fail_fast,
     _delete,
     _encoder,
+    _fixed_size_parts,
     _get,
     _get_headers,
     _post,
     _put,
     _requests_session,
     _requests_session_fail_fast,
+    _retryable_body,
     get_api_version,
 )
 from pybatfish.client.session import Session
+from pybatfish.client.transfer import _Transfer
 
 BASE_URL = "base"
 
@@ -204,6 +213,25 @@ def test_session_adapters():
     assert not retries.allowed_methods
 
 
+def test_sessions_per_thread():
+    """Each thread sends requests with its own session, sharing the adapters."""
+    thread_sessions = []
+
+    def send():
+        with patch("requests.Session.send", autospec=True) as send:
+            _requests_session.get("http://localhost/v2/version")
+        thread_sessions.append(send.call_args.args[0])
+
+    for _ in range(2):
+        thread = threading.Thread(target=send)
+        thread.start()
+        thread.join()
+    send()
+    assert len({id(session) for session in thread_sessions}) == 3
+    assert _requests_session not in thread_sessions
+    assert all(session.adapters["http://"] is _adapter for session in thread_sessions)
+
+
 def test_fail_fast_session_adapters():
     """Confirm fast-failing session is configured with correct http and https adapters."""
     http = _requests_session_fail_fast.adapters["http://"]
@@ -235,5 +263,284 @@ def test_get_api_version_new(session: Session, request_session: Mock) -> None:
         assert get_api_version(session) == "2.1.0"
 
 
+class _StandInCoordinator(http.server.ThreadingHTTPServer):
+    """Local stand-in for the coordinator that fails uploads as scripted.
+
+    Each upload request takes the next outcome: ``"drop"`` closes the
+    connection in the middle of the body, an int is returned as the status
+    after reading the body. Completed bodies are kept in ``bodies``.
+    """
+
+    def __init__(self, outcomes, handler=None):
+        super().__init__(("127.0.0.1", 0), handler or _StandInHandler)
+        self.outcomes = list(outcomes)
+        self.bodies = []
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    server: _StandInCoordinator
+
+    def do_POST(self):
+        self.do_PUT()
+
+    def do_PUT(self):
+        outcome = self.server.outcomes.pop(0) if self.server.outcomes else 200
+        if outcome == "drop":
+            self.rfile.read(10)
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        body = self._read_body()
+        if outcome == 200:
+            self.server.bodies.append(body)
+        self.send_response(outcome)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _read_body(self):
+        if "Content-Length" in self.headers:
+            return self.rfile.read(int(self.headers["Content-Length"]))
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if size == 0:
+                return body
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def coordinator():
+    servers = []
+
+    def start(outcomes):
+        server = _StandInCoordinator(outcomes)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        s = Session(load_questions=False, host="127.0.0.1", port=server.server_address[1])
+        s.network = "net"
+        s.transfer_callback = None
+        return server, s
+
+    with patch("pybatfish.client.restv2helper.time.sleep"):
+        yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_upload_restarts(coordinator):
+    """Uploads from re-iterable chunks are sent again after transient failures."""
+    server, s = coordinator(["drop", 503])
+    chunks = [os.urandom(1000) for _ in range(100)]
+    restv2helper.upload_snapshot(s, "ss", chunks)
+    assert server.bodies == [b"".join(chunks)]
+    assert s.transfers[-1].retries == 2
+    assert s.transfers[-1].bytes == 100000
+
+
+def test_upload_restarts_give_up(coordinator):
+    server, s = coordinator([503] * 3)
+    with patch("pybatfish.client.restv2helper._MAX_RESTARTS", 2):
+        with pytest.raises(HTTPError):
+            restv2helper.upload_snapshot(s, "ss", [b"data"])
+    assert not server.bodies
+
+
+def test_upload_iterator_not_restarted(coordinator):
+    """One-shot iterators are not sent again, since they cannot be re-read."""
+    server, s = coordinator([400])
+    with pytest.raises(HTTPError):
+        restv2helper.upload_snapshot(s, "ss", iter([b"data"]))
+    restv2helper.upload_snapshot(s, "ss", iter([b"data"]))
+    assert server.bodies == [b"data"]
+
+
+def test_upload_iterator_no_retries(coordinator):
+    """One-shot iterators are not retried by urllib3 either, which would send an empty body."""
+    server, s = coordinator(["drop"])
+    with pytest.raises(requests.ConnectionError):
+        restv2helper.upload_snapshot(s, "ss", (chunk for chunk in [os.urandom(1000)] * 100))
+    assert not server.bodies
+
+
+def test_retryable_body():
+    """Only bodies urllib3 can send again from the start are retried."""
+
+    class OneShotReader(io.RawIOBase):
+        # Has seek and tell, but cannot seek
+        def readinto(self, buffer):
+            return 0
+
+    transfer = _Transfer(Session(load_questions=False), "upload", "/url")
+    assert _retryable_body(None)
+    assert _retryable_body(b"data")
+    assert _retryable_body(io.BytesIO(b"data"))
+    assert _retryable_body(transfer.upload_body(io.BytesIO(b"data")))
+    # Empty files are sent as a generator
+    assert not _retryable_body(transfer.upload_body(io.BytesIO(b"")))
+    assert not _retryable_body(OneShotReader())
+    assert not _retryable_body(iter([b"data"]))
+
+
+def test_upload_connection_refused():
+    """Uploads to a coordinator that refuses connections are restarted less often."""
+    with socket.socket() as listener:
+        # A free port that nothing listens on once the socket is closed
+        listener.bind(("127.0.0.1", 0))
+        port = listener.getsockname()[1]
+    s = Session(load_questions=False, host="127.0.0.1", port=port)
+    s.network = "net"
+    with (
+        patch("pybatfish.client.restv2helper._MAX_CONNECT_RESTARTS", 1),
+        patch("pybatfish.client.restv2helper.time.sleep") as sleep,
+    ):
+        with pytest.raises(requests.ConnectionError):
+            restv2helper.upload_snapshot(s, "ss", [b"data"])
+    assert sleep.call_count == 1
+
+
+class _PartsCoordinator(_StandInCoordinator):
+    """Local stand-in for a coordinator supporting uploads in parts.
+
+    Objects are kept in ``objects`` by path and key. The index of every part
+    stored is appended to ``part_puts``, and of every part sent to
+    ``part_attempts``. ``failures`` maps part indices to outcomes for their
+    next uploads, as for :py:class:`_StandInCoordinator`. Joined snapshots
+    are kept in ``snapshots``.
+    """
+
+    def __init__(self, failures):
+        super().__init__([], _PartsHandler)
+        self.failures = failures
+        self.objects = {}
+        self.part_puts = []
+        self.part_attempts = []
+        self.snapshots = {}
+
+
+class _PartsHandler(_StandInHandler):
+    server: _PartsCoordinator
+
+    def do_GET(self):
+        path, key = self._path_and_key()
+        data = self.server.objects.get((path, key))
+        if data is None:
+            self._respond(404)
+        else:
+            self._respond(200, data)
+
+    def do_PUT(self):
+        path, key = self._path_and_key()
+        index = int(key.rsplit("/", 1)[1]) if "/parts/" in key and not key.endswith(".sha256") else None
+        if index is not None:
+            self.server.part_attempts.append(index)
+        outcomes = self.server.failures.get(index) or [200]
+        outcome = outcomes.pop(0)
+        if outcome == "drop":
+            self.rfile.read(10)
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        body = self._read_body()
+        if outcome != 200:
+            self._respond(outcome)
+            return
+        digest = self.headers.get(CoordConstsV2.HTTP_HEADER_BATFISH_CONTENT_SHA256)
+        if digest is not None and digest != hashlib.sha256(body).hexdigest():
+            self._respond(400)
+            return
+        self.server.objects[(path, key)] = body
+        if index is not None:
+            self.server.part_puts.append(index)
+        self._respond(200)
+
+    def do_POST(self):
+        path, key = self._path_and_key()
+        request = json.loads(self._read_body())
+        assert path.endswith("/parts")
+        target = path[: -len("/parts")]
+        if target.endswith("/objects"):
+            parts_path = target
+        else:
+            parts_path = target.split("/snapshots/")[0] + "/objects"
+        data = b"".join(self.server.objects.pop((parts_path, part["key"])) for part in request["parts"])
+        for part in request["parts"]:
+            del self.server.objects[(parts_path, part["key"] + ".sha256")]
+        if hashlib.sha256(data).hexdigest() != request["sha256"]:
+            self._respond(400)
+        elif target.endswith("/objects"):
+            self.server.objects[(target, key)] = data
+            self._respond(200)
+        else:
+            self.server.snapshots[target.rsplit("/", 1)[1]] = data
+            self._respond(200)
+
+    def _path_and_key(self):
+        url = urllib.parse.urlsplit(self.path)
+        return url.path, urllib.parse.parse_qs(url.query).get(CoordConstsV2.QP_KEY, [None])[0]
+
+    def _respond(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def parts_coordinator():
+    servers = []
+
+    def start(failures):
+        server = _PartsCoordinator(failures)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        s = Session(load_questions=False, host="127.0.0.1", port=server.server_address[1])
+        s.network = "net"
+        s.snapshot = "ss"
+        s.transfer_callback = None
+        return server, s
+
+    with patch("pybatfish.client.restv2helper.time.sleep"), patch.object(Options, "upload_part_size", 1000):
+        yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_upload_parts_resends_failed_part(parts_coordinator):
+    """Only the part that failed is sent again, and the coordinator joins the parts."""
+    server, s = parts_coordinator({2: ["drop", 503]})
+    data = os.urandom(4500)
+    restv2helper.upload_snapshot(s, "ss", [data[:700], data[700:]])
+    assert server.snapshots == {"ss": data}
+    assert sorted(server.part_puts) == [0, 1, 2, 3, 4]
+    assert not server.objects
+    assert sorted(server.part_attempts) == [0, 1, 2, 2, 2, 3, 4]
+
+
+def test_upload_parts_resume(parts_coordinator):
+    """A failed upload to the same target resumes after the stored parts."""
+    server, s = parts_coordinator({3: [503, 503]})
+    data = os.urandom(4500)
+    with patch("pybatfish.client.restv2helper._MAX_RESTARTS", 1):
+        with pytest.raises(HTTPError):
+            restv2helper.put_snapshot_object(s, "big", data)
+        assert server.part_puts == [0, 1, 2]
+        restv2helper.put_snapshot_object(s, "big", data)
+    assert server.part_puts == [0, 1, 2, 3, 4]
+    assert server.objects == {("/v2/networks/net/snapshots/ss/objects", "big"): data}
+
+
+def test_fixed_size_parts():
+    assert list(_fixed_size_parts(b"abcdefg", 3)) == [b"abc", b"def", b"g"]
+    assert list(_fixed_size_parts([b"ab", b"cdef"], 3)) == [b"abc", b"def"]
+    assert list(_fixed_size_parts(io.BytesIO(b"abcd"), 2)) == [b"ab", b"cd"]
+    assert list(_fixed_size_parts(b"", 3)) == [b""]
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -11,12 +11,20 @@
 #   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
-from unittest.mock import patch
+import io
+import json
+import os
+import threading
+import zipfile
+from unittest.mock import MagicMock, patch
 
 import pytest
+from requests import HTTPError
 
-from pybatfish.client.session import Session
+from pybatfish.client.options import Options
+from pybatfish.client.session import _SNAPSHOT_DIGEST_KEY, Session
 from pybatfish.datamodel import VariableType
+from pybatfish.exception import BatfishException
 
 
 class MockEntryPoint:
@@ -157,3 +165,373 @@ def test_request_kwargs_explicit_params_override_generic():
     # Explicit timeout and proxies should win
     assert result["timeout"] == 10
     assert result["proxies"] == {"http": "http://proxy:8080"}
+
+
+def test_get_answer_spill_threshold(tmpdir):
+    """Confirm table answers are spilled according to session settings."""
+    s = Session(load_questions=False, answer_spill_threshold=0, answer_spill_dir=str(tmpdir))
+    answer = {
+        "answerElements": [
+            {
+                "class": "org.batfish.datamodel.table.TableAnswerElement",
+                "metadata": {"columnMetadata": [{"name": "col1", "schema": "String"}]},
+                "rows": [{"col1": "v1"}],
+            }
+        ]
+    }
+    with patch("pybatfish.client.restv2helper.get_answer", return_value=answer):
+        table = s.get_answer("q", "ss")
+    assert table.spilled
+    assert table.frame()["col1"][0] == "v1"
+
+
+def test_get_answer_columns_where():
+    """Confirm decoding options are passed through to table answers."""
+    s = Session(load_questions=False)
+    answer = {
+        "answerElements": [
+            {
+                "class": "org.batfish.datamodel.table.TableAnswerElement",
+                "metadata": {
+                    "columnMetadata": [
+                        {"name": "col1", "schema": "String"},
+                        {"name": "col2", "schema": "String"},
+                    ]
+                },
+                "rows": [{"col1": "v1", "col2": "x"}, {"col1": "v2", "col2": "y"}],
+            }
+        ]
+    }
+    with patch("pybatfish.client.restv2helper.get_answer", return_value=answer):
+        table = s.get_answer("q", "ss", columns=["col2"], where={"col1": "v2"})
+    assert table.frame().to_dict(orient="list") == {"col2": ["y"]}
+
+
+def test_init_snapshot_streams_directory(tmpdir):
+    """Snapshot directories are zipped while they are uploaded, without a temp file."""
+    snapshot_dir = tmpdir.mkdir("snapshot")
+    snapshot_dir.mkdir("configs").join("r1.cfg").write("hostname r1")
+    s = Session(load_questions=False)
+    s.network = "net"
+    uploaded = {}
+
+    def upload(session, name, fd):
+        uploaded[name] = b"".join(fd)
+        # The directory is zipped again if the upload is restarted
+        assert b"".join(fd) == uploaded[name]
+
+    with (
+        patch.object(s, "list_snapshots", return_value=[]),
+        patch.object(s, "_parse_snapshot", return_value="ss"),
+        patch("pybatfish.client.restv2helper.upload_snapshot", side_effect=upload),
+        patch("tempfile.NamedTemporaryFile") as temp_file,
+    ):
+        assert s.init_snapshot(str(snapshot_dir), name="ss") == "ss"
+    temp_file.assert_not_called()
+    with zipfile.ZipFile(io.BytesIO(uploaded["ss"])) as zf:
+        assert zf.read("snapshot/configs/r1.cfg") == b"hostname r1"
+
+
+def test_init_snapshot_dedupe(tmpdir):
+    """Snapshots with the same content are reused instead of being uploaded again."""
+    snapshot_dir = tmpdir.mkdir("snapshot")
+    snapshot_dir.mkdir("configs").join("r1.cfg").write("hostname r1")
+    s = Session(load_questions=False)
+    s.network = "net"
+    objects = {}
+    snapshot_objects = {}
+    snapshots = []
+
+    def get_object(key):
+        if key not in objects:
+            raise HTTPError(response=MagicMock(status_code=404))
+        return objects[key]
+
+    def get_snapshot_object(key, snapshot=None):
+        if (snapshot, key) not in snapshot_objects:
+            raise HTTPError(response=MagicMock(status_code=404))
+        return snapshot_objects[(snapshot, key)]
+
+    def init(upload, name=None, **kwargs):
+        # Initializing a snapshot replaces any snapshot of the same name
+        snapshot_objects.pop((name, _SNAPSHOT_DIGEST_KEY), None)
+        if name not in snapshots:
+            snapshots.append(name)
+        s.snapshot = name
+        return name
+
+    with (
+        patch.object(s, "get_network_object_text", side_effect=get_object),
+        patch.object(s, "put_network_object", side_effect=objects.__setitem__),
+        patch.object(s, "get_snapshot_object_text", side_effect=get_snapshot_object),
+        patch.object(
+            s,
+            "put_snapshot_object",
+            side_effect=lambda key, data: snapshot_objects.__setitem__((s.snapshot, key), data),
+        ),
+        patch.object(s, "list_snapshots", side_effect=lambda: list(snapshots)),
+        patch.object(s, "_init_snapshot", side_effect=init) as init_snapshot,
+    ):
+        assert s.init_snapshot(str(snapshot_dir), name="ss1", dedupe=True) == "ss1"
+        assert s.init_snapshot(str(snapshot_dir), name="ss2", dedupe=True) == "ss1"
+        assert s.snapshot == "ss1"
+        assert init_snapshot.call_count == 1
+        # Different parse arguments or content are not deduplicated
+        s.init_snapshot(str(snapshot_dir), name="ss3", dedupe=True, extra_args={"parsereuse": False})
+        snapshot_dir.join("configs", "r1.cfg").write("hostname r2")
+        s.init_snapshot(str(snapshot_dir), name="ss4", dedupe=True)
+        assert snapshots == ["ss1", "ss3", "ss4"]
+        # Deleted snapshots are not reused
+        snapshots.remove("ss4")
+        assert s.init_snapshot(str(snapshot_dir), name="ss5", dedupe=True) == "ss5"
+
+
+def test_init_snapshot_dedupe_overwritten(tmpdir):
+    """A snapshot overwritten with other content is not reused for its old content."""
+    snapshot_dir = tmpdir.mkdir("snapshot")
+    config = snapshot_dir.mkdir("configs").join("r1.cfg")
+    s = Session(load_questions=False)
+    s.network = "net"
+    objects = {}
+    snapshot_objects = {}
+
+    def get_object(key):
+        if key not in objects:
+            raise HTTPError(response=MagicMock(status_code=404))
+        return objects[key]
+
+    def get_snapshot_object(key, snapshot=None):
+        if (snapshot, key) not in snapshot_objects:
+            raise HTTPError(response=MagicMock(status_code=404))
+        return snapshot_objects[(snapshot, key)]
+
+    def init(upload, name=None, **kwargs):
+        snapshot_objects.pop((name, _SNAPSHOT_DIGEST_KEY), None)
+        s.snapshot = name
+        return name
+
+    with (
+        patch.object(s, "get_network_object_text", side_effect=get_object),
+        patch.object(s, "put_network_object", side_effect=objects.__setitem__),
+        patch.object(s, "get_snapshot_object_text", side_effect=get_snapshot_object),
+        patch.object(
+            s,
+            "put_snapshot_object",
+            side_effect=lambda key, data: snapshot_objects.__setitem__((s.snapshot, key), data),
+        ),
+        patch.object(s, "list_snapshots", return_value=["current"]),
+        patch.object(s, "_init_snapshot", side_effect=init) as init_snapshot,
+    ):
+        config.write("hostname a")
+        s.init_snapshot(str(snapshot_dir), name="current", overwrite=True, dedupe=True)
+        config.write("hostname b")
+        s.init_snapshot(str(snapshot_dir), name="current", overwrite=True, dedupe=True)
+        config.write("hostname a")
+        s.init_snapshot(str(snapshot_dir), name="current", overwrite=True, dedupe=True)
+        assert init_snapshot.call_count == 3
+        # Now the content matches again
+        s.init_snapshot(str(snapshot_dir), name="other", dedupe=True)
+        assert init_snapshot.call_count == 3
+        assert s.snapshot == "current"
+
+
+def test_init_snapshot_incremental(tmpdir):
+    """Only changed files are uploaded on top of a snapshot with a manifest."""
+    snapshot_dir = tmpdir.mkdir("snapshot")
+    snapshot_dir.mkdir("configs").join("r1.cfg").write("hostname r1")
+    snapshot_dir.join("configs", "r2.cfg").write("hostname r2")
+    s = Session(load_questions=False)
+    s.network = "net"
+    objects = {}
+    forks = []
+    zip_files = []
+
+    def get_object(key, snapshot=None):
+        if (snapshot, key) not in objects:
+            raise HTTPError(response=MagicMock(status_code=404))
+        return objects[(snapshot, key)]
+
+    def init(upload, name=None, **kwargs):
+        s.snapshot = name
+        return name
+
+    def fork(base_name, name=None, add_files=None, remove_files=None, **kwargs):
+        added = None
+        if add_files is not None:
+            # The zip file must be closed, to be read again on Windows
+            with open(add_files, "rb") as f, zipfile.ZipFile(f) as zf:
+                added = {n: zf.read(n) for n in zf.namelist() if not n.endswith("/")}
+            zip_files.append(add_files)
+        forks.append((base_name, name, added, remove_files))
+        s.snapshot = name
+        return name
+
+    with (
+        patch.object(s, "get_snapshot_object_text", side_effect=get_object),
+        patch.object(
+            s, "put_snapshot_object", side_effect=lambda key, data: objects.__setitem__((s.snapshot, key), data)
+        ),
+        patch.object(s, "_init_snapshot", side_effect=init) as init_snapshot,
+        patch.object(s, "_fork_snapshot", side_effect=fork),
+    ):
+        # Without a manifest, everything is uploaded
+        assert s.init_snapshot_incremental("base", str(snapshot_dir), name="ss1") == "ss1"
+        assert init_snapshot.call_count == 1
+        assert not forks
+        # Changed and added files are forked on top of the base snapshot
+        snapshot_dir.join("configs", "r2.cfg").write("hostname r2-new")
+        snapshot_dir.join("configs", "r3.cfg").write("hostname r3")
+        assert s.init_snapshot_incremental("ss1", str(snapshot_dir), name="ss2") == "ss2"
+        assert forks == [
+            (
+                "ss1",
+                "ss2",
+                {"snapshot/configs/r2.cfg": b"hostname r2-new", "snapshot/configs/r3.cfg": b"hostname r3"},
+                None,
+            )
+        ]
+        # The temporary zip file is deleted afterwards
+        assert not os.path.exists(zip_files[0])
+        # Nothing changed
+        assert s.init_snapshot_incremental("ss2", str(snapshot_dir), name="ss3") == "ss3"
+        assert forks[-1] == ("ss2", "ss3", None, None)
+        # Deleted files are removed from the fork
+        snapshot_dir.join("configs", "r1.cfg").remove()
+        assert s.init_snapshot_incremental("ss3", str(snapshot_dir), name="ss4") == "ss4"
+        assert forks[-1] == ("ss3", "ss4", None, ["configs/r1.cfg"])
+        assert init_snapshot.call_count == 1
+        assert sorted(json.loads(objects[("ss4", "pybatfish/manifest.json")])) == ["configs/r2.cfg", "configs/r3.cfg"]
+
+
+@pytest.mark.parametrize("spool_max_size", [64 << 20, 10])
+def test_init_snapshot_from_texts(spool_max_size):
+    """Texts are zipped without a snapshot directory, in memory or spooled to a temp file."""
+    s = Session(load_questions=False)
+    s.network = "net"
+    uploaded = {}
+
+    def upload(session, name, fd):
+        uploaded[name] = b"".join(fd)
+        assert b"".join(fd) == uploaded[name]
+
+    texts = ((f"r{i}.cfg" if i % 2 else f"site/r{i}.cfg", f"hostname r{i}") for i in range(3))
+    with (
+        patch.object(s, "list_snapshots", return_value=[]),
+        patch.object(s, "_parse_snapshot", return_value="ss"),
+        patch("pybatfish.client.restv2helper.upload_snapshot", side_effect=upload),
+        patch.object(Options, "snapshot_spool_max_size", spool_max_size),
+    ):
+        assert s.init_snapshot_from_texts(texts, snapshot_name="ss", platform="arista") == "ss"
+    with zipfile.ZipFile(io.BytesIO(uploaded["ss"])) as zf:
+        assert zf.namelist() == [
+            "snapshot/configs/site/r0.cfg",
+            "snapshot/configs/r1.cfg",
+            "snapshot/configs/site/r2.cfg",
+        ]
+        assert zf.read("snapshot/configs/r1.cfg") == b"!RANCID-CONTENT-TYPE: arista\nhostname r1"
+
+
+def test_init_snapshot_from_texts_duplicate():
+    s = Session(load_questions=False)
+    s.network = "net"
+    with pytest.raises(ValueError, match="Duplicate configuration file name: r1"):
+        s.init_snapshot_from_texts([("r1", "hostname r1"), ("r1", "hostname r2")])
+
+
+def test_init_snapshot_filters(tmpdir):
+    """Excluded files are not uploaded and do not count for deduplication."""
+    snapshot_dir = tmpdir.mkdir("snapshot")
+    snapshot_dir.mkdir("configs").join("r1.cfg").write("hostname r1")
+    snapshot_dir.mkdir(".git").join("HEAD").write("ref")
+    s = Session(load_questions=False)
+    s.network = "net"
+    uploaded = {}
+
+    def upload(session, name, fd):
+        uploaded[name] = b"".join(fd)
+
+    with (
+        patch.object(s, "list_snapshots", return_value=[]),
+        patch.object(s, "_parse_snapshot", side_effect=lambda name, *args: name),
+        patch.object(s, "get_network_object_text", side_effect=HTTPError(response=MagicMock(status_code=404))),
+        patch.object(s, "put_network_object") as put_object,
+        patch.object(s, "put_snapshot_object"),
+        patch("pybatfish.client.restv2helper.upload_snapshot", side_effect=upload),
+    ):
+        s.init_snapshot(str(snapshot_dir), name="ss", exclude=".git", dedupe=True)
+        snapshot_dir.join(".git", "HEAD").write("other ref")
+        s.init_snapshot(str(snapshot_dir), name="ss2", exclude=".git", dedupe=True)
+    with zipfile.ZipFile(io.BytesIO(uploaded["ss"])) as zf:
+        assert [info.filename for info in zf.infolist() if not info.is_dir()] == ["snapshot/configs/r1.cfg"]
+    # Same digest key for both snapshots
+    assert put_object.call_args_list[0][0][0] == put_object.call_args_list[1][0][0]
+
+
+def test_init_snapshot_filters_zip(tmpdir):
+    zip_file = tmpdir.join("snapshot.zip")
+    zip_file.write("")
+    s = Session(load_questions=False)
+    with pytest.raises(ValueError, match="not a directory"):
+        s.init_snapshot(str(zip_file), exclude=".git")
+
+
+def test_init_snapshots():
+    """Snapshots are uploaded one at a time while others are parsed, and
+    failures are reported per snapshot."""
+    s = Session(load_questions=False)
+    s.network = "net"
+    s.snapshot = "before"
+    lock = threading.Lock()
+    uploading = []
+    parsing = []
+    most_uploading = []
+    most_parsing = []
+    ss1_uploaded = threading.Event()
+    ss2_parsing = threading.Barrier(2, timeout=5)
+
+    def upload(upload, name=None, **kwargs):
+        with lock:
+            uploading.append(name)
+            most_uploading.append(len(uploading))
+        with lock:
+            uploading.remove(name)
+        if upload == "bad":
+            raise ValueError("bad is not a valid zip file")
+        if name == "ss1":
+            ss1_uploaded.set()
+        return name
+
+    def parse(name, extra_args):
+        # Workers never change the current snapshot
+        assert s.snapshot == "before"
+        with lock:
+            parsing.append(name)
+            most_parsing.append(len(parsing))
+        if name == "ss0":
+            # The next snapshot is uploaded while this one is parsed
+            assert ss1_uploaded.wait(5)
+        if name in ("ss1", "ss2"):
+            # Two snapshots are parsed at the same time
+            ss2_parsing.wait()
+        with lock:
+            parsing.remove(name)
+        if name == "ss3":
+            raise BatfishException("Initializing snapshot ss3 failed")
+
+    with (
+        patch.object(s, "_upload_snapshot", side_effect=upload),
+        patch.object(s, "_wait_for_parse", side_effect=parse) as wait_for_parse,
+    ):
+        results = s.init_snapshots(
+            {"ss0": "dir0", "ss1": "dir1", "ss2": "dir2", "ss3": "dir3", "bad": "bad"}, max_parallel=2
+        )
+    assert [r.name for r in results] == ["ss0", "ss1", "ss2", "ss3", "bad"]
+    assert [r.error for r in results[:3]] == [None] * 3
+    assert isinstance(results[3].error, BatfishException)
+    assert isinstance(results[4].error, ValueError)
+    assert max(most_uploading) == 1
+    assert max(most_parsing) == 2
+    assert wait_for_parse.call_count == 4
+    assert s.snapshot == "ss2"
+    with pytest.raises(ValueError):
+        s.init_snapshots({"ss": "dir"}, max_parallel=0)
@@ -0,0 +1,142 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import io
+import logging
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from requests.utils import super_len
+
+from pybatfish.client import restv2helper
+from pybatfish.client.options import Options
+from pybatfish.client.session import Session
+from pybatfish.client.transfer import TransferMetrics, _Transfer, log_progress
+
+
+@pytest.fixture
+def session() -> Session:
+    s = Session(load_questions=False)
+    s.network = "net"
+    s.snapshot = "ss"
+    return s
+
+
+def _response(body: bytes = b"", retries: int = 0) -> Mock:
+    response = Mock(spec=requests.Response)
+    response.raw = io.BytesIO(body)
+    response.raw.retries = Mock(history=[None] * retries)
+    response.headers = {"Content-Length": str(len(body))}
+    return response
+
+
+def test_throughput():
+    assert TransferMetrics("upload", "/url", 1000, None, 2.0).throughput == 500
+    assert TransferMetrics("upload", "/url", 1000, None, 0.0).throughput == 0
+
+
+def test_log_progress(caplog):
+    with caplog.at_level(logging.DEBUG, logger="pybatfish.client.transfer"):
+        log_progress(TransferMetrics("upload", "/url", 500, 1000, 1.0))
+        log_progress(TransferMetrics("download", "/url", 1000, None, 2.0, retries=1, done=True))
+    assert [r.levelno for r in caplog.records] == [logging.DEBUG, logging.INFO]
+    assert caplog.records[0].getMessage() == "Upload /url: 500/1000 bytes in 1.0s (0.5 KB/s, 0 retries)..."
+    assert caplog.records[1].getMessage() == "Download /url: 1000 bytes in 2.0s (0.5 KB/s, 1 retries)"
+
+
+def test_upload_file(session):
+    """File bodies keep their size and can be rewound, and every byte read is counted."""
+    reports = []
+    session.transfer_callback = reports.append
+    transfer = _Transfer(session, "upload", "/url")
+    data = io.BytesIO(b"0123456789")
+    data.seek(2)
+    body = transfer.upload_body(data)
+    assert super_len(body) == 8
+    assert transfer.total_bytes == 8
+    start = body.tell()
+    assert body.read(4) == b"2345"
+    body.seek(start)
+    assert transfer.bytes == 0
+    assert body.read() == b"23456789"
+    transfer.finish_upload(_response(retries=1))
+    assert reports == [session.transfers[-1]]
+    assert reports[0].bytes == 8
+    assert reports[0].retries == 1
+    assert reports[0].done
+
+
+def test_upload_chunks_and_bytes(session):
+    transfer = _Transfer(session, "upload", "/url")
+    assert b"".join(transfer.upload_body(iter([b"ab", b"cde"]))) == b"abcde"
+    transfer.finish_upload(_response())
+    transfer = _Transfer(session, "upload", "/url")
+    assert transfer.upload_body("text") == "text"
+    transfer.finish_upload(_response())
+    assert [(m.bytes, m.total_bytes) for m in session.transfers] == [(5, None), (4, 4)]
+
+
+def test_progress_interval(session):
+    reports = []
+    session.transfer_callback = reports.append
+    transfer = _Transfer(session, "upload", "/url")
+    with patch.object(Options, "transfer_progress_interval", 0):
+        transfer.add(1)
+        transfer.add(2)
+    transfer.add(3)
+    assert [m.bytes for m in reports] == [1, 3]
+    assert not any(m.done for m in reports)
+
+
+def test_put_and_get_stream(session):
+    """Object uploads and downloads are reported with their retries."""
+    reports = []
+    session.transfer_callback = reports.append
+    requests_session = Mock(spec=requests.Session)
+    requests_session.put.return_value = _response(retries=2)
+    requests_session.get.return_value = _response(b"goodbye")
+    with patch("pybatfish.client.restv2helper._requests_session", requests_session):
+        session.put_network_object("key", b"hello")
+        with session.get_network_object_stream("key") as stream:
+            assert stream.read(3) == b"goo"
+            assert len(session.transfers) == 1
+            assert stream.read() == b"dbye"
+    upload, download = session.transfers
+    assert reports[-1] == download
+    assert (upload.direction, upload.bytes, upload.retries) == ("upload", 5, 2)
+    assert (download.direction, download.bytes, download.total_bytes) == ("download", 7, 7)
+    assert upload.url == download.url == "/networks/net/objects"
+
+
+def test_get_stream_lines(session):
+    """Downloads can be read by lines or iterated, and every byte is counted."""
+    requests_session = Mock(spec=requests.Session)
+    requests_session.get.side_effect = [_response(b"a\nbb\nccc"), _response(b"x\ny\n")]
+    with patch("pybatfish.client.restv2helper._requests_session", requests_session):
+        with session.get_network_object_stream("key") as stream:
+            assert stream.readline() == b"a\n"
+            assert list(stream) == [b"bb\n", b"ccc"]
+        assert session.get_snapshot_object_stream("key").readlines() == [b"x\n", b"y\n"]
+    assert [(m.bytes, m.done) for m in session.transfers] == [(8, True), (4, True)]
+
+
+def test_upload_snapshot(session):
+    requests_session = Mock(spec=requests.Session)
+    requests_session.post.side_effect = lambda *args, data, **kwargs: (b"".join(data), _response())[1]
+    session.transfer_callback = None
+    # One-shot iterators are sent without retries
+    with patch("pybatfish.client.restv2helper._requests_session_no_retry", requests_session):
+        restv2helper.upload_snapshot(session, "ss", iter([b"zip", b"data"]))
+    assert session.transfers[-1].bytes == 7
+    assert session.transfers[-1].url == "/networks/net/snapshots/ss"
@@ -0,0 +1,116 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for column-oriented BGP route decoding."""
+
+import pytest
+
+from pybatfish.datamodel.answer.bgpcolumns import BgpRouteDiffsTable, BgpRouteTable
+from pybatfish.datamodel.answer.table import TableAnswer
+from pybatfish.datamodel.route import BgpRoute, BgpRouteDiffs
+
+
+def _route(network, as_path, communities, local_preference=100):
+    return {
+        "network": network,
+        "originatorIp": "1.1.1.1",
+        "originType": "igp",
+        "protocol": "bgp",
+        "asPath": as_path,
+        "communities": communities,
+        "localPreference": local_preference,
+        "metric": 10,
+        "nextHopIp": "2.2.2.2",
+        "srcProtocol": None,
+        "tag": 0,
+        "weight": 0,
+    }
+
+
+_ROUTES = [
+    _route("10.0.0.0/8", [65001, 65002], ["65001:100"]),
+    _route("10.1.0.0/16", [65003, [65004, 65005]], ["65001:100", "65001:200"], local_preference=200),
+    _route("10.2.0.0/16", [], []),
+]
+
+_DIFFS = [
+    {"diffs": [{"fieldName": "localPreference", "oldValue": "100", "newValue": "200"}]},
+    {
+        "diffs": [
+            {"fieldName": "asPath", "oldValue": "[1]", "newValue": "[1, 2]"},
+            {"fieldName": "metric", "oldValue": "100", "newValue": "200"},
+        ]
+    },
+]
+
+_ANSWER = {
+    "answerElements": [
+        {
+            "metadata": {
+                "columnMetadata": [
+                    {"name": "Route", "schema": "BgpRoute"},
+                    {"name": "Diffs", "schema": "BgpRouteDiffs"},
+                ]
+            },
+            "rows": [
+                {"Route": _ROUTES[0], "Diffs": _DIFFS[0]},
+                {"Route": None, "Diffs": None},
+                {"Route": _ROUTES[1], "Diffs": _DIFFS[1]},
+                {"Route": _ROUTES[2], "Diffs": None},
+            ],
+        }
+    ]
+}
+
+
+def test_route_table_roundtrip():
+    """Routes are rebuilt from the arrays unchanged."""
+    table = BgpRouteTable(_ROUTES)
+    assert len(table) == 3
+    assert list(table) == [BgpRoute.from_dict(r) for r in _ROUTES]
+
+
+def test_route_table_columns():
+    table = BgpRouteTable(_ROUTES)
+    assert list(table.values("network")) == ["10.0.0.0/8", "10.1.0.0/16", "10.2.0.0/16"]
+    assert table.categories("protocol") == ["bgp"]
+    assert list(table.array("local_preference")) == [100, 200, 100]
+    assert list(table.as_path_lengths()) == [2, 2, 0]
+    assert list(table.as_path_values) == [65001, 65002, 65003, -1]
+    assert table.as_sets == [[65004, 65005]]
+    assert table.communities == ["65001:100", "65001:200"]
+    assert list(table.has_community("65001:200")) == [False, True, False]
+    assert list(table.has_community("1:1")) == [False, False, False]
+    assert list(table.has_as(65002)) == [True, False, False]
+    assert list(table.networks().contains("10.1.2.3")) == [True, True, False]
+    df = table.to_frame()
+    assert list(df["network"]) == ["10.0.0.0/8", "10.1.0.0/16", "10.2.0.0/16"]
+    assert list(df["as_path_length"]) == [2, 2, 0]
+    with pytest.raises(ValueError):
+        table.array("bogus")
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_from_answer(spill, tmpdir):
+    kwargs = {"spill_threshold": 0, "spill_dir": str(tmpdir)} if spill else {}
+    answer = TableAnswer(_ANSWER, **kwargs)
+    routes = BgpRouteTable.from_answer(answer, "Route")
+    assert list(routes.rows) == [0, 2, 3]
+    assert routes[1] == BgpRoute.from_dict(_ROUTES[1])
+    diffs = BgpRouteDiffsTable.from_answer(answer, "Diffs")
+    assert list(diffs.rows) == [0, 2]
+    assert list(diffs) == [BgpRouteDiffs.from_dict(d) for d in _DIFFS]
+    assert list(diffs.changed("metric")) == [False, True]
+    assert list(diffs.changed("tag")) == [False, False]
+    with pytest.raises(ValueError):
+        BgpRouteTable.from_answer(answer, "Diffs")
@@ -0,0 +1,130 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for client-side answer differentials."""
+
+import pytest
+
+from pybatfish.datamodel.answer.table import TableAnswer
+
+_METADATA = {
+    "columnMetadata": [
+        {"name": "Node", "schema": "Node", "isKey": True, "isValue": False},
+        {"name": "Interface", "schema": "Interface", "isKey": True, "isValue": False},
+        {"name": "MTU", "schema": "Integer", "isKey": False, "isValue": True},
+        {"name": "Prefixes", "schema": "List<String>", "isKey": False, "isValue": True},
+        {"name": "Description", "schema": "String", "isKey": False, "isValue": False},
+    ]
+}
+
+
+def _row(node, iface, mtu, prefixes, description="d"):
+    return {
+        "Node": {"name": node},
+        "Interface": {"hostname": node, "interface": iface},
+        "MTU": mtu,
+        "Prefixes": prefixes,
+        "Description": description,
+    }
+
+
+def _answer(rows, **kwargs):
+    return TableAnswer({"answerElements": [{"metadata": _METADATA, "rows": rows}]}, **kwargs)
+
+
+_REFERENCE = [
+    _row("n1", "e1", 1500, ["10.0.0.1/24"]),
+    _row("n1", "e2", 1500, ["10.0.1.1/24"]),
+    _row("n2", "e1", 1500, []),
+]
+_SNAPSHOT = [
+    _row("n1", "e1", 1500, ["10.0.0.1/24"], description="changed, but not a value column"),
+    _row("n2", "e1", 9000, ["10.0.2.1/24"]),
+    _row("n1", "e2", 1500, ["10.0.1.2/24"]),
+    _row("n3", "e1", 1500, []),
+]
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_diff(spill, tmpdir):
+    kwargs = {"spill_threshold": 0, "spill_dir": str(tmpdir)} if spill else {}
+    diff = _answer(_SNAPSHOT, **kwargs).diff(_answer(_REFERENCE, **kwargs))
+    assert diff.key_columns == ["Node", "Interface"]
+    assert diff.value_columns == ["MTU", "Prefixes"]
+    assert list(diff.added["Node"]) == ["n3"]
+    assert diff.removed.empty
+    assert list(diff.changed.columns) == [
+        "Node",
+        "Interface",
+        "Snapshot_MTU",
+        "Reference_MTU",
+        "Snapshot_Prefixes",
+        "Reference_Prefixes",
+    ]
+    assert list(diff.changed["Node"]) == ["n2", "n1"]
+    assert list(diff.changed["Snapshot_MTU"]) == [9000, 1500]
+    assert list(diff.changed["Reference_Prefixes"]) == [[], ["10.0.1.1/24"]]
+    assert diff.change_mask.values.tolist() == [[True, True], [False, True]]
+    assert str(diff) == "1 added, 0 removed, 2 changed rows"
+
+    reverse = _answer(_REFERENCE).diff(_answer(_SNAPSHOT))
+    assert list(reverse.removed["Node"]) == ["n3"]
+    assert reverse.added.empty
+    assert _answer(_REFERENCE).diff(_answer(_REFERENCE)).empty
+
+
+def test_diff_duplicate_keys():
+    """Rows with equal keys are matched in order."""
+    snapshot = _answer([_row("n1", "e1", 1, []), _row("n1", "e1", 2, [])])
+    reference = _answer([_row("n1", "e1", 1, []), _row("n1", "e1", 3, []), _row("n1", "e1", 4, [])])
+    diff = snapshot.diff(reference)
+    assert list(diff.changed["Snapshot_MTU"]) == [2]
+    assert list(diff.removed["MTU"]) == [4]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 100])
+def test_iter_diff(chunk_rows, tmpdir):
+    """The streaming diff finds the same differences, in key order."""
+    snapshot = _answer(_SNAPSHOT, spill_threshold=0, spill_dir=str(tmpdir))
+    run_dir = tmpdir.mkdir("runs")
+    diffs = list(snapshot.iter_diff(_answer(_REFERENCE), chunk_rows=chunk_rows, spill_dir=str(run_dir)))
+    assert [(d.kind, (d.snapshot or d.reference)["Node"], d.changed_columns) for d in diffs] == [
+        ("changed", "n1", ["Prefixes"]),
+        ("changed", "n2", ["MTU", "Prefixes"]),
+        ("added", "n3", []),
+    ]
+    assert diffs[1].snapshot["MTU"] == 9000
+    assert diffs[1].reference["MTU"] == 1500
+    assert diffs[2].reference is None
+    # Temporary runs are removed
+    assert run_dir.listdir() == []
+
+    reverse = list(_answer(_REFERENCE).iter_diff(_answer(_SNAPSHOT), chunk_rows=chunk_rows))
+    assert [d.kind for d in reverse] == ["changed", "changed", "removed"]
+
+
+def test_iter_diff_duplicate_keys():
+    snapshot = _answer([_row("n1", "e1", 1, []), _row("n1", "e1", 2, [])])
+    reference = _answer([_row("n1", "e1", 1, []), _row("n1", "e1", 3, []), _row("n1", "e1", 4, [])])
+    diffs = list(snapshot.iter_diff(reference, chunk_rows=1))
+    assert [(d.kind, (d.snapshot or d.reference)["MTU"]) for d in diffs] == [("changed", 2), ("removed", 4)]
+
+
+def test_diff_different_columns():
+    other = TableAnswer(
+        {"answerElements": [{"metadata": {"columnMetadata": [{"name": "Node", "schema": "Node"}]}, "rows": []}]}
+    )
+    with pytest.raises(ValueError):
+        _answer(_SNAPSHOT).diff(other)
+    with pytest.raises(ValueError):
+        list(_answer(_SNAPSHOT).iter_diff(other))
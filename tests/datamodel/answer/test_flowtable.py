@@ -0,0 +1,172 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for column-oriented flow tables."""
+
+import tracemalloc
+
+import numpy
+import pytest
+
+from pybatfish.datamodel.answer.flowtable import FlowTable
+from pybatfish.datamodel.answer.table import TableAnswer
+from pybatfish.datamodel.flow import Flow, HeaderConstraints
+
+
+def _flow_dict(src_ip, dst_ip, protocol="TCP", dst_port=22, syn=0, ack=0, node="n1"):
+    tcp = protocol == "TCP"
+    return {
+        "dscp": 0,
+        "dstIp": dst_ip,
+        "dstPort": dst_port if protocol in ("TCP", "UDP") else None,
+        "ecn": 0,
+        "fragmentOffset": 0,
+        "icmpCode": 0 if protocol == "ICMP" else None,
+        "icmpVar": 8 if protocol == "ICMP" else None,
+        "ingressInterface": None,
+        "ingressNode": node,
+        "ingressVrf": "default",
+        "ipProtocol": protocol,
+        "packetLength": 512,
+        "srcIp": src_ip,
+        "srcPort": 49152 if protocol in ("TCP", "UDP") else None,
+        "tcpFlagsAck": ack if tcp else None,
+        "tcpFlagsCwr": 0 if tcp else None,
+        "tcpFlagsEce": 0 if tcp else None,
+        "tcpFlagsFin": 0 if tcp else None,
+        "tcpFlagsPsh": 0 if tcp else None,
+        "tcpFlagsRst": 0 if tcp else None,
+        "tcpFlagsSyn": syn if tcp else None,
+        "tcpFlagsUrg": 0 if tcp else None,
+    }
+
+
+_FLOWS = [
+    _flow_dict("1.1.1.1", "10.0.0.1", syn=1),
+    _flow_dict("1.1.1.2", "10.0.0.2", dst_port=23, ack=1, node="n2"),
+    _flow_dict("1.1.1.3", "192.168.0.1", protocol="UDP", dst_port=53),
+    _flow_dict("1.1.1.4", "10.1.0.1", protocol="ICMP"),
+]
+
+
+def test_flow_roundtrip():
+    """Flows are rebuilt from the arrays unchanged."""
+    table = FlowTable.from_dicts(_FLOWS)
+    flows = [Flow.from_dict(d) for d in _FLOWS]
+    assert len(table) == 4
+    assert list(table) == flows
+    assert FlowTable.from_flows(flows).to_frame().equals(table.to_frame())
+    assert table.header_constraints(0) == HeaderConstraints.of(flows[0])
+
+
+def test_flow_table_arrays():
+    """Fields are stored in compact typed arrays."""
+    table = FlowTable.from_dicts(_FLOWS)
+    assert table.array("dst_ip").dtype == numpy.uint32
+    assert table.array("dst_ip")[0] == 0x0A000001
+    assert table.array("dst_port").dtype == numpy.uint16
+    assert list(table["ip_protocol"]) == ["TCP", "TCP", "UDP", "ICMP"]
+    assert table.categories("ip_protocol") == ["TCP", "UDP", "ICMP"]
+    assert list(table.missing("dst_port")) == [False, False, False, True]
+    assert list(table["tcp_flags"]) == [2, 16, 0, 0]
+    assert list(table.missing("tcp_flags")) == [False, False, True, True]
+    with pytest.raises(ValueError):
+        table.array("bogus")
+
+
+def test_flow_table_memory():
+    """Flows take a fraction of the memory of Flow objects in a table."""
+    dicts = [_flow_dict(f"1.1.{i >> 8}.{i & 255}", f"10.0.{i >> 8}.{i & 255}", dst_port=i) for i in range(2000)]
+    tracemalloc.start()
+    try:
+        flows = [Flow.from_dict(d) for d in dicts]
+        # Only the objects: their strings are shared with the dicts
+        flow_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    table = FlowTable.from_flows(flows)
+    arrays = [table.array(field) for field in table.fields] + [table.missing(field) for field in table.fields]
+    table_bytes = sum(array.nbytes for array in arrays) + table.rows.nbytes
+    # 224 vs 54 bytes per flow with CPython 3.11
+    assert table_bytes * 3 < flow_bytes
+
+
+def test_flow_table_groupby_many_groups():
+    """Groups are numbered with 1-D uniques, also for many fields and groups."""
+    dicts = [_flow_dict(f"1.1.{i >> 8}.{i & 255}", "10.0.0.1", dst_port=i % 7) for i in range(1000)]
+    groups = FlowTable.from_dicts(dicts).groupby("dst_port", "src_ip", "ip_protocol")
+    assert len(groups) == 1000
+    keys = list(groups)
+    assert keys == sorted(keys, key=lambda key: (key[0], tuple(int(b) for b in key[1].split("."))))
+    assert [list(group.rows) for group in groups.values()][:2] == [[0], [7]]
+
+
+def test_flow_table_where():
+    """Flows are filtered by values, alternatives and prefixes."""
+    table = FlowTable.from_dicts(_FLOWS)
+    assert list(table.where(dst_ip="10.0.0.0/8").rows) == [0, 1, 3]
+    assert list(table.where(dst_ip="10.0.0.0/8", ip_protocol="TCP", dst_port=[23, 53]).rows) == [1]
+    assert list(table.where(dst_ip="192.168.0.1").rows) == [2]
+    # Missing values never match
+    assert len(table.where(dst_port=0)) == 0
+    assert len(table.where(ip_protocol="GRE")) == 0
+    assert list(table[table["tcp_flags"] & 2 != 0].rows) == [0]
+
+
+def test_flow_table_groupby():
+    table = FlowTable.from_dicts(_FLOWS)
+    groups = table.groupby("ip_protocol", "dst_port")
+    assert {key: list(group.rows) for key, group in groups.items()} == {
+        ("TCP", 22): [0],
+        ("TCP", 23): [1],
+        ("UDP", 53): [2],
+        ("ICMP", None): [3],
+    }
+    groups = table.groupby("ingress_node")
+    assert {key: len(group) for key, group in groups.items()} == {("n1",): 3, ("n2",): 1}
+
+
+def test_flow_table_to_frame():
+    df = FlowTable.from_dicts(_FLOWS).to_frame()
+    assert list(df["ip_protocol"]) == ["TCP", "TCP", "UDP", "ICMP"]
+    assert df["ip_protocol"].dtype == "category"
+    assert df["dst_port"].isna().tolist() == [False, False, False, True]
+    assert df["dst_port"][0] == 22
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_flow_table_from_answer(spill, tmpdir):
+    """Flows are read from the raw rows, skipping empty cells."""
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {
+                    "columnMetadata": [
+                        {"name": "Flow", "schema": "Flow"},
+                        {"name": "Node", "schema": "String"},
+                    ]
+                },
+                "rows": [
+                    {"Flow": _FLOWS[0], "Node": "n1"},
+                    {"Flow": None, "Node": "n2"},
+                    {"Flow": _FLOWS[2], "Node": "n3"},
+                ],
+            }
+        ]
+    }
+    kwargs = {"spill_threshold": 0, "spill_dir": str(tmpdir)} if spill else {}
+    table = FlowTable.from_answer(TableAnswer(answer, **kwargs))
+    assert list(table.rows) == [0, 2]
+    assert list(table) == [Flow.from_dict(_FLOWS[0]), Flow.from_dict(_FLOWS[2])]
+    with pytest.raises(ValueError):
+        FlowTable.from_answer(TableAnswer(answer), column="Node")
@@ -0,0 +1,79 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for integer-encoded IP and prefix columns."""
+
+import ipaddress
+
+import pandas
+import pytest
+
+from pybatfish.datamodel.answer.ipcolumns import IpArray, PrefixArray
+
+_PREFIXES = ["10.0.0.0/8", "10.1.0.0/16", "0.0.0.0/0", None, "10.1.2.3/24", "10.1.0.0/16", "bogus"]
+
+
+def test_parse():
+    prefixes = PrefixArray.from_strings(_PREFIXES)
+    assert prefixes.to_strings() == ["10.0.0.0/8", "10.1.0.0/16", "0.0.0.0/0", None, "10.1.2.0/24", "10.1.0.0/16", None]
+    ips = IpArray.from_strings(["1.2.3.4", None, "AUTO/NONE(-1l)", "255.255.255.255", "1"])
+    assert ips.to_strings() == ["1.2.3.4", None, None, "255.255.255.255", None]
+    assert list(ips.missing) == [False, True, True, False, True]
+
+
+def test_contains():
+    prefixes = PrefixArray.from_strings(_PREFIXES)
+    assert list(prefixes.contains("10.1.2.3")) == [True, True, True, False, True, True, False]
+    assert list(prefixes.contains("192.168.0.1")) == [False, False, True, False, False, False, False]
+    ips = IpArray.from_strings(["10.2.0.1", "10.2.0.1", "8.8.8.8", "1.1.1.1", "10.1.2.200", None, "1.1.1.1"])
+    assert list(prefixes.contains(ips)) == [True, False, True, False, True, False, False]
+    assert list(ips.in_prefix("10.0.0.0/8")) == [True, True, False, False, True, False, False]
+    with pytest.raises(ValueError):
+        prefixes.contains("10.1")
+
+
+def test_overlaps():
+    prefixes = PrefixArray.from_strings(_PREFIXES)
+    assert list(prefixes.overlaps("10.1.128.0/17")) == [True, True, True, False, False, True, False]
+    assert list(prefixes.overlaps(PrefixArray.from_strings(["11.0.0.0/8"] * 7))) == [
+        False,
+        False,
+        True,
+        False,
+        False,
+        False,
+        False,
+    ]
+
+
+def test_longest_match():
+    """Longest prefix match agrees with a brute force search using ipaddress."""
+    prefixes = PrefixArray.from_strings(_PREFIXES)
+    ips = ["10.1.2.3", "10.1.3.1", "10.2.0.0", "192.168.0.1", None, "10.1.2.255"]
+    assert list(prefixes.longest_match(ips)) == [4, 1, 0, 2, -1, 4]
+    assert list(PrefixArray.from_strings(["10.0.0.0/8"]).longest_match(["11.0.0.1"])) == [-1]
+
+    networks = [ipaddress.ip_network(p, strict=False) if p and p != "bogus" else None for p in _PREFIXES]
+    for ip, match in zip(ips, prefixes.longest_match(IpArray.from_strings(ips))):
+        candidates = [
+            (-n.prefixlen, i) for i, n in enumerate(networks) if n is not None and ip and ipaddress.ip_address(ip) in n
+        ]
+        assert match == (min(candidates)[1] if candidates else -1)
+
+
+def test_accessor():
+    """Answer frames have a bf accessor for IP and prefix columns."""
+    df = pandas.DataFrame({"Network": ["10.0.0.0/8", "10.1.0.0/16"], "Next_Hop_IP": ["1.1.1.1", "AUTO/NONE(-1l)"]})
+    assert list(df[df.bf.prefix("Network").contains("10.1.1.1")].index) == [0, 1]
+    assert list(df[df.bf.prefix("Network").contains("10.2.1.1")].index) == [0]
+    assert list(df.bf.ip("Next_Hop_IP").missing) == [False, True]
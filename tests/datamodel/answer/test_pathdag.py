@@ -0,0 +1,104 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for aggregation of traces into a path graph."""
+
+from pybatfish.datamodel.answer.pathdag import aggregate_traces
+from pybatfish.datamodel.answer.table import TableAnswer
+from pybatfish.datamodel.flow import (
+    EnterInputIfaceStepDetail,
+    ExitOutputIfaceStepDetail,
+    Hop,
+    Step,
+    Trace,
+)
+
+
+def _hop(node, in_iface, out_iface):
+    steps = []
+    if in_iface:
+        steps.append(Step(EnterInputIfaceStepDetail(in_iface, "default"), "RECEIVED"))
+    if out_iface:
+        steps.append(Step(ExitOutputIfaceStepDetail(out_iface, None), "TRANSMITTED"))
+    return Hop(node, steps)
+
+
+_ECMP = [
+    Trace("ACCEPTED", [_hop("n1", None, "e1"), _hop("s1", "e1", "e2"), _hop("n2", "e1", None)]),
+    Trace("ACCEPTED", [_hop("n1", None, "e2"), _hop("s2", "e1", "e2"), _hop("n2", "e1", None)]),
+    Trace("DENIED_OUT", [_hop("n1", None, "e2"), _hop("s2", "e1", None)]),
+]
+
+
+def test_aggregate_traces():
+    dag = aggregate_traces(_ECMP)
+    assert dag.num_traces == 3
+    assert len(dag.hops) == 6
+    n1_e2 = dag.hops.index(("n1", None, "e2"))
+    s2 = dag.hops.index(("s2", "e1", "e2"))
+    assert dag.hop_counts[n1_e2] == 2
+    assert dict(dag.successors(n1_e2)) == {s2: 1, dag.hops.index(("s2", "e1", None)): 1}
+    n2 = dag.hops.index(("n2", "e1", None))
+    assert dag.hop_counts[n2] == 2
+    assert dag.end_dispositions[n2] == {"ACCEPTED": 2}
+    assert sum(dag.start_counts.values()) == 3
+
+
+def test_aggregate_traces_incremental():
+    dag = aggregate_traces([])
+    for trace in _ECMP:
+        dag.add(trace)
+    assert str(dag) == str(aggregate_traces(_ECMP))
+
+
+def test_aggregate_traces_no_hops():
+    dag = aggregate_traces([[Trace("NO_ROUTE", [])], None])
+    assert dag.num_traces == 1
+    assert "No hops: NO_ROUTE (1)" in str(dag)
+
+
+def test_render():
+    dag = aggregate_traces(_ECMP)
+    text = str(dag)
+    assert text.splitlines()[0] == "3 traces"
+    assert "n1[->e2] (2, 2 start here)" in text
+    assert "  -> s2[e1->e2] (1)" in text
+    assert "  ends: ACCEPTED (2)" in text
+    assert "s2[e1-&gt;e2] (1)" in dag._repr_html_()
+
+
+def test_aggregate_answer_column():
+    hop = {
+        "node": {"name": "n1"},
+        "steps": [
+            {
+                "type": "EnterInputInterface",
+                "action": "RECEIVED",
+                "detail": {"inputInterface": {"hostname": "n1", "interface": "e1"}, "inputVrf": "default"},
+            }
+        ],
+    }
+    trace = {"disposition": "ACCEPTED", "hops": [hop]}
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {"columnMetadata": [{"name": "Traces", "schema": "List<Trace>"}]},
+                "rows": [{"Traces": [trace, trace]}, {"Traces": [trace]}],
+            }
+        ]
+    }
+    for table in [TableAnswer(answer), TableAnswer(answer, compact_traces=True)]:
+        dag = aggregate_traces(table.frame()["Traces"])
+        assert dag.num_traces == 3
+        assert dag.hops == [("n1", "e1", None)]
+        assert dag.end_dispositions[0] == {"ACCEPTED": 3}
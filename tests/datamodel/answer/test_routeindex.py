@@ -0,0 +1,80 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for the local route lookup index."""
+
+import pytest
+
+from pybatfish.datamodel.answer.routeindex import RouteIndex
+from pybatfish.datamodel.answer.table import TableAnswer
+
+
+def _route(node, vrf, network, next_hop_ip):
+    return {"Node": {"name": node}, "VRF": vrf, "Network": network, "Next_Hop_IP": next_hop_ip}
+
+
+_ANSWER = {
+    "answerElements": [
+        {
+            "metadata": {
+                "columnMetadata": [
+                    {"name": "Node", "schema": "Node"},
+                    {"name": "VRF", "schema": "String"},
+                    {"name": "Network", "schema": "Prefix"},
+                    {"name": "Next_Hop_IP", "schema": "Ip"},
+                ]
+            },
+            "rows": [
+                _route("n1", "default", "0.0.0.0/0", "1.1.1.1"),
+                _route("n1", "default", "10.0.0.0/8", "2.2.2.2"),
+                _route("n1", "default", "10.1.0.0/16", "3.3.3.3"),
+                _route("n2", "default", "10.1.0.0/16", "9.9.9.9"),
+                _route("n1", "default", "10.0.0.0/8", "4.4.4.4"),
+                _route("n1", "mgmt", "10.1.2.0/24", "5.5.5.5"),
+            ],
+        }
+    ]
+}
+
+
+def test_longest_match():
+    index = RouteIndex.from_answer(TableAnswer(_ANSWER))
+    assert sorted(index.keys()) == [("n1", "default"), ("n1", "mgmt"), ("n2", "default")]
+    assert index.longest_match("n1", "default", ["10.1.2.3", "10.2.0.1", "8.8.8.8"]) == [
+        "10.1.0.0/16",
+        "10.0.0.0/8",
+        "0.0.0.0/0",
+    ]
+    assert index.longest_match("n1", "mgmt", ["10.1.3.1", None]) == [None, None]
+    assert index.longest_match("n3", "default", ["10.1.2.3"]) == [None]
+
+
+def test_lookup():
+    """Lookups return all equal-cost routes of the matching network."""
+    index = RouteIndex.from_answer(TableAnswer(_ANSWER))
+    df = index.lookup("n1", "default", ["10.2.0.1", "10.1.0.1", "AUTO/NONE(-1l)"])
+    assert list(df.columns) == ["IP", "Node", "VRF", "Network", "Next_Hop_IP"]
+    assert df[["IP", "Next_Hop_IP"]].values.tolist() == [
+        ["10.2.0.1", "2.2.2.2"],
+        ["10.2.0.1", "4.4.4.4"],
+        ["10.1.0.1", "3.3.3.3"],
+    ]
+    df = index.lookup("n1", "mgmt", ["8.8.8.8"])
+    assert df.empty
+    assert list(df.columns) == ["IP", "Node", "VRF", "Network", "Next_Hop_IP"]
+    assert index.lookup("n3", "default", ["10.1.2.3"]).empty
+
+
+def test_missing_columns():
+    with pytest.raises(ValueError):
+        RouteIndex(TableAnswer(_ANSWER).frame(columns=["Node", "Network"]))
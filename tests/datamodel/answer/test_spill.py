@@ -0,0 +1,68 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for spilled (on-disk) answer rows."""
+
+import os
+
+import pytest
+
+from pybatfish.datamodel.answer.spill import SpilledRows
+
+_ROWS = [
+    {"Node": {"name": "n1"}, "Count": 1, "Tags": ["a", "b"]},
+    {"Node": {"name": "n2"}, "Count": None, "Tags": []},
+    {"Node": {"name": "n3"}, "Count": 3},
+]
+
+
+def test_spilled_rows_roundtrip(tmpdir):
+    rows = SpilledRows(["Node", "Count", "Tags"], _ROWS, str(tmpdir))
+    assert len(rows) == 3
+    assert rows[0] == {"Node": {"name": "n1"}, "Count": 1, "Tags": ["a", "b"]}
+    # missing cells are stored as null
+    assert rows[-1] == {"Node": {"name": "n3"}, "Count": 3, "Tags": None}
+    assert rows[1:] == [rows[1], rows[2]]
+    assert list(rows) == [rows[0], rows[1], rows[2]]
+
+
+def test_spilled_rows_access_by_column(tmpdir):
+    rows = SpilledRows(["Node", "Count"], _ROWS, str(tmpdir))
+    assert rows.cell(1, "Node") == {"name": "n2"}
+    assert list(rows.column("Count")) == [1, None, 3]
+    assert rows.row(2, columns=["Count"]) == {"Count": 3}
+    with pytest.raises(IndexError):
+        rows.cell(3, "Node")
+    with pytest.raises(KeyError):
+        rows.cell(0, "Bogus")
+
+
+def test_spilled_rows_empty(tmpdir):
+    rows = SpilledRows(["Node"], [], str(tmpdir))
+    assert len(rows) == 0
+    assert list(rows) == []
+
+
+def test_spilled_rows_close_deletes_files(tmpdir):
+    rows = SpilledRows(["Node"], _ROWS, str(tmpdir))
+    path = rows.path
+    assert os.path.isdir(path)
+    rows.close()
+    assert not os.path.exists(path)
+
+
+def test_spilled_rows_gc_deletes_files(tmpdir):
+    rows = SpilledRows(["Node"], _ROWS, str(tmpdir))
+    path = rows.path
+    del rows
+    assert not os.path.exists(path)
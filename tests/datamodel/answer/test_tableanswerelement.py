@@ -13,12 +13,16 @@
 #   limitations under the License.
 """Tests for Table answers."""
 
+import pickle
 from operator import attrgetter
+from unittest.mock import patch
 
+import pandas
 import pytest
 
 from pybatfish.datamodel import ListWrapper
 from pybatfish.datamodel.answer.table import TableAnswer, is_table_ans
+from pybatfish.datamodel.primitives import Interface
 
 
 def test_table_answer_no_answer_elements():
@@ -140,6 +144,260 @@ def test_table_answer_dtype_object():
     assert str(df["col2"][1]) == "None"
 
 
+def test_table_answer_spilled(tmpdir):
+    """Answers over the spill threshold keep their rows on disk."""
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {
+                    "columnMetadata": [
+                        {"name": "col1", "schema": "String"},
+                        {"name": "col2", "schema": "List<Integer>"},
+                    ]
+                },
+                "rows": [{"col1": "v1", "col2": [1]}, {"col1": "v2", "col2": ["2", 3]}],
+            }
+        ]
+    }
+    in_memory = TableAnswer(answer, spill_threshold=2)
+    assert not in_memory.spilled
+
+    table = TableAnswer(answer, spill_threshold=1, spill_dir=str(tmpdir))
+    assert table.spilled
+    assert len(table) == 2
+    assert table.rows[1] == {"col1": "v2", "col2": ["2", 3]}
+    assert table.frame().equals(in_memory.frame())
+    assert isinstance(table.frame().loc[1]["col2"], ListWrapper)
+    # rows are not duplicated in the raw answer dictionary
+    assert "rows" not in table["answerElements"][0]
+    assert "rows" in answer["answerElements"][0]
+    assert table.dict() == in_memory.dict() == answer
+    assert str(table) == repr(table) == str(in_memory)
+
+
+def test_table_answer_spilled_text(tmpdir):
+    """Only the displayed rows of spilled answers are decoded for text output."""
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {"columnMetadata": [{"name": "Name", "schema": "String"}]},
+                "rows": [{"Name": f"row{i}"} for i in range(10)],
+            }
+        ]
+    }
+    table = TableAnswer(answer, spill_threshold=0, spill_dir=str(tmpdir))
+    with pandas.option_context("display.max_rows", 4), patch.object(table.rows, "row", wraps=table.rows.row) as row:
+        text = str(table)
+    assert [c.args[0] for c in row.call_args_list] == [0, 1, 8, 9]
+    assert "row1" in text and "row8" in text and "row5" not in text
+    assert text.endswith("[10 rows x 1 columns]")
+
+
+_PROJECTION_ANSWER = {
+    "answerElements": [
+        {
+            "metadata": {
+                "columnMetadata": [
+                    {"name": "Node", "schema": "Node"},
+                    {"name": "Count", "schema": "Integer"},
+                    {"name": "Interface", "schema": "Interface"},
+                ]
+            },
+            "rows": [
+                {"Node": {"name": "n1"}, "Count": 1, "Interface": {"hostname": "n1", "interface": "e1"}},
+                {"Node": {"name": "n2"}, "Count": 2, "Interface": {"hostname": "n2", "interface": "e2"}},
+                {"Node": {"name": "n1"}, "Count": 3, "Interface": {"hostname": "n1", "interface": "e3"}},
+            ],
+        }
+    ]
+}
+
+
+def test_table_answer_columns():
+    """Only requested columns are decoded."""
+    table = TableAnswer(_PROJECTION_ANSWER, columns=["Count", "Node"])
+    assert list(table.frame().columns) == ["Count", "Node"]
+    assert list(table.frame()["Node"]) == ["n1", "n2", "n1"]
+    with patch("pybatfish.datamodel.answer.base.Interface.from_dict") as from_dict:
+        TableAnswer(_PROJECTION_ANSWER, columns=["Node"])
+    from_dict.assert_not_called()
+    with pytest.raises(ValueError):
+        TableAnswer(_PROJECTION_ANSWER, columns=["Bogus"])
+
+
+def test_table_answer_where():
+    """Rows can be filtered by column values or a predicate on raw rows."""
+    table = TableAnswer(_PROJECTION_ANSWER, where={"Node": "n1"})
+    assert len(table) == 2
+    assert list(table.frame()["Count"]) == [1, 3]
+
+    table = TableAnswer(_PROJECTION_ANSWER, where=lambda row: row["Count"] > 1, columns=["Count"])
+    assert list(table.frame()["Count"]) == [2, 3]
+
+    with pytest.raises(ValueError):
+        TableAnswer(_PROJECTION_ANSWER, where={"Bogus": 1})
+
+
+def test_table_answer_frame_columns_where(tmpdir):
+    """frame() can project and filter both in-memory and spilled answers."""
+    for table in [
+        TableAnswer(_PROJECTION_ANSWER),
+        TableAnswer(_PROJECTION_ANSWER, spill_threshold=0, spill_dir=str(tmpdir)),
+    ]:
+        df = table.frame(columns=["Count"], where={"Node": "n1"})
+        assert list(df.columns) == ["Count"]
+        assert list(df["Count"]) == [1, 3]
+        assert list(df.index) == [0, 1]
+        df = table.frame(where=lambda row: row["Count"] == 2)
+        assert list(df["Node"]) == ["n2"]
+        assert len(table.frame()) == 3
+
+
+def test_table_answer_frame_where_empty():
+    table = TableAnswer(_PROJECTION_ANSWER, where={"Node": "n3"})
+    df = table.frame(where={"Node": "n1"})
+    assert len(df) == 0
+    assert list(df.columns) == ["Node", "Count", "Interface"]
+
+
+def test_table_answer_where_dict():
+    """Filtered out rows are not kept in the answer dictionary."""
+    table = TableAnswer(_PROJECTION_ANSWER, where={"Node": "n2"})
+    assert [row["Count"] for row in table["answerElements"][0]["rows"]] == [2]
+    assert len(_PROJECTION_ANSWER["answerElements"][0]["rows"]) == 3
+
+
+def test_table_answer_frame_other_columns(tmpdir):
+    """frame() decodes columns left out of the answer frame once."""
+    table = TableAnswer(_PROJECTION_ANSWER, columns=["Node"])
+    df = table.frame(columns=["Count"], where={"Node": "n1"})
+    assert list(df["Count"]) == [1, 3]
+    assert list(table.frame().columns) == ["Node"]
+    with patch("pybatfish.datamodel.answer.table._rows_to_frame") as rows_to_frame:
+        assert list(table.frame(columns=["Node", "Count"])["Count"]) == [1, 2, 3]
+    rows_to_frame.assert_not_called()
+
+
+def test_table_answer_spilled_projection(tmpdir):
+    """Spilled answers only store the requested columns."""
+    table = TableAnswer(_PROJECTION_ANSWER, columns=["Node"], spill_threshold=0, spill_dir=str(tmpdir))
+    assert table.rows[0] == {"Node": {"name": "n1"}}
+    assert list(table.frame(where={"Node": "n1"})["Node"]) == ["n1", "n1"]
+    with pytest.raises(ValueError, match="stored columns are \\['Node'\\]"):
+        table.frame(columns=["Count"])
+    with pytest.raises(ValueError, match="stored columns"):
+        table.frame(where={"Count": 1})
+
+
+def test_table_answer_table_data_assignment(tmpdir):
+    """table_data can be assigned, for in-memory and spilled answers."""
+    for table in [
+        TableAnswer(_PROJECTION_ANSWER),
+        TableAnswer(_PROJECTION_ANSWER, spill_threshold=0, spill_dir=str(tmpdir)),
+    ]:
+        df = table.table_data.iloc[::-1].reset_index(drop=True)
+        table.table_data = df
+        assert table.table_data is df
+        assert table.frame() is df
+    table = TableAnswer(_PROJECTION_ANSWER)
+    assert table.table_data is table.table_data
+
+
+def test_table_answer_pickle(tmpdir):
+    """Answers can be pickled, spilled rows are spilled again when unpickled."""
+    for kwargs in [{}, {"spill_threshold": 0, "spill_dir": str(tmpdir), "columns": ["Node", "Count"]}]:
+        table = TableAnswer(_PROJECTION_ANSWER, **kwargs)
+        copy = pickle.loads(pickle.dumps(table))
+        assert copy.spilled == table.spilled
+        assert copy.frame().equals(table.frame())
+        assert copy.dict() == table.dict()
+        if table.spilled:
+            assert copy.rows.path != table.rows.path
+            table.rows.close()
+            assert list(copy.rows.column("Count")) == [1, 2, 3]
+
+
+def test_table_answer_flyweight(tmpdir):
+    """Equal values share one instance when flyweights are enabled."""
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {"columnMetadata": [{"name": "Interface", "schema": "Interface"}]},
+                "rows": [{"Interface": {"hostname": "n1", "interface": "e1"}}] * 2,
+            }
+        ]
+    }
+    for kwargs in [{}, {"spill_threshold": 0, "spill_dir": str(tmpdir)}]:
+        df = TableAnswer(answer, flyweight=True, **kwargs).frame()
+        assert df["Interface"][0] is df["Interface"][1]
+    df = TableAnswer(answer).frame()
+    assert df["Interface"][0] == df["Interface"][1]
+    assert df["Interface"][0] is not df["Interface"][1]
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_table_answer_truncated_html(spill, tmpdir):
+    """Only head and tail rows are rendered, and list cells are capped."""
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {
+                    "columnMetadata": [
+                        {"name": "Name", "schema": "String"},
+                        {"name": "Items", "schema": "List<Interface>"},
+                    ]
+                },
+                "rows": [
+                    {
+                        "Name": f"row{i}",
+                        "Items": [{"hostname": "h", "interface": f"e{j}"} for j in range(i)],
+                    }
+                    for i in range(10)
+                ],
+            }
+        ]
+    }
+    kwargs = {"spill_threshold": 0, "spill_dir": str(tmpdir)} if spill else {}
+    table = TableAnswer(answer, html_max_rows=4, html_max_cell_items=3, **kwargs)
+    html = table._repr_html_()
+    for i in [0, 1, 8, 9]:
+        assert f">row{i}<" in html
+    for i in range(2, 8):
+        assert f">row{i}<" not in html
+    assert "<th>...</th>" in html
+    assert "h[e2]" in html
+    assert "h[e3]" not in html
+    assert "... 6 more" in html
+    assert "10 rows" in html
+    # The view is rendered once, until the answer data changes
+    with patch.object(Interface, "_repr_html_", return_value="other"):
+        assert table._repr_html_() == html
+        table.html_max_rows = 6
+        assert "other" in table._repr_html_()
+        table.html_max_rows = 4
+        assert table._repr_html_() == html
+        table.table_data = table.frame()
+        assert "other" in table._repr_html_()
+    # Default rendering is unchanged
+    table = TableAnswer(answer, **kwargs)
+    assert table._repr_html_() == table.frame()._repr_html_()
+
+
+def test_table_answer_truncated_html_escapes_headers():
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {"columnMetadata": [{"name": "<b>Name</b>", "schema": "String"}]},
+                "rows": [{"<b>Name</b>": "<i>n1</i>"}],
+            }
+        ]
+    }
+    html = TableAnswer(answer, html_max_rows=4)._repr_html_()
+    assert "&lt;b&gt;Name&lt;/b&gt;" in html
+    assert "&lt;i&gt;n1&lt;/i&gt;" in html
+    assert "<b>" not in html and "<i>" not in html
+
+
 def test_is_table_answer():
     answer = {
         "answerElements": [
@@ -0,0 +1,122 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for trace indexes of table answers."""
+
+from unittest.mock import patch
+
+import pytest
+
+from pybatfish.datamodel import Interface
+from pybatfish.datamodel.answer.table import TableAnswer
+from pybatfish.datamodel.flow import Trace
+
+
+def _enter(node, iface):
+    return {
+        "type": "EnterInputInterface",
+        "action": "RECEIVED",
+        "detail": {"inputInterface": {"hostname": node, "interface": iface}, "inputVrf": "default"},
+    }
+
+
+def _filter(name, action):
+    return {
+        "type": "Filter",
+        "action": action,
+        "detail": {"filter": name, "type": "INGRESS_FILTER", "inputInterface": "e1"},
+    }
+
+
+_ACCEPTED = {
+    "disposition": "ACCEPTED",
+    "hops": [
+        {"node": {"name": "n1"}, "steps": [_enter("n1", "e1"), _filter("acl", "PERMITTED")]},
+        {"node": {"name": "n2"}, "steps": [_enter("n2", "e2")]},
+    ],
+}
+_DENIED = {
+    "disposition": "DENIED_IN",
+    "hops": [
+        {"node": {"name": "n1"}, "steps": [_enter("n1", "e1"), _filter("acl", "DENIED")]},
+    ],
+}
+_ANSWER = {
+    "answerElements": [
+        {
+            "metadata": {
+                "columnMetadata": [
+                    {"name": "Flow", "schema": "String"},
+                    {"name": "Traces", "schema": "List<Trace>"},
+                ]
+            },
+            "rows": [
+                {"Flow": "f1", "Traces": [_ACCEPTED, _DENIED]},
+                {"Flow": "f2", "Traces": [_ACCEPTED]},
+                {"Flow": "f3", "Traces": []},
+            ],
+        }
+    ]
+}
+
+
+@pytest.mark.parametrize("compact_traces", [False, True])
+def test_trace_index_where(compact_traces):
+    traces = TableAnswer(_ANSWER, compact_traces=compact_traces).traces
+    assert len(traces) == 3
+    assert len(traces.where()) == 3
+    assert len(traces.where(node="n1")) == 3
+    assert len(traces.where(node="n2")) == 2
+    assert len(traces.where(node="n3")) == 0
+    assert len(traces.where(interface="e2")) == 2
+    assert len(traces.where(interface=Interface("n1", "e2"))) == 0
+    assert len(traces.where(interface=Interface("n2", "e2"))) == 2
+    assert len(traces.where(filter="acl")) == 3
+    assert len(traces.where(action="DENIED")) == 1
+    denied = traces.where(node="n1", filter="acl", action="DENIED")
+    assert list(denied) == [Trace.from_dict(_DENIED)]
+    assert denied.rows() == [0]
+    assert list(denied.frame()["Flow"]) == ["f1"]
+    accepted = traces.where(disposition="ACCEPTED")
+    assert accepted.rows() == [0, 1]
+    assert len(accepted.where(action="DENIED")) == 0
+
+
+def test_trace_index_spilled(tmpdir):
+    """Queries on spilled answers only decode the rows and cells they return."""
+    table = TableAnswer(_ANSWER, spill_threshold=0, spill_dir=str(tmpdir), columns=["Flow", "Traces"])
+    denied = table.traces.where(action="DENIED")
+    with patch.object(table.rows, "row", wraps=table.rows.row) as row:
+        assert list(denied) == [Trace.from_dict(_DENIED)]
+        assert list(denied.frame()["Flow"]) == ["f1"]
+    assert [c.args for c in row.call_args_list] == [(0, ["Traces"]), (0, ["Flow", "Traces"])]
+
+
+def test_trace_index_spilled_projection(tmpdir):
+    """Trace columns not stored for a spilled answer are not indexed."""
+    table = TableAnswer(_ANSWER, spill_threshold=0, spill_dir=str(tmpdir), columns=["Flow"])
+    assert len(table.traces) == 0
+
+
+def test_trace_index_projected_answer():
+    """Trace columns left out of the answer frame are still indexed."""
+    traces = TableAnswer(_ANSWER, columns=["Flow"]).traces
+    assert traces.where(action="DENIED").rows() == [0]
+
+
+def test_trace_index_no_trace_columns():
+    answer = {"answerElements": [{"metadata": {"columnMetadata": [{"name": "col1", "schema": "String"}]}}]}
+    table = TableAnswer(answer)
+    assert len(table.traces) == 0
+    assert table.traces is table.traces
+    assert table.traces.where(node="n1").frame().empty
@@ -0,0 +1,135 @@
+#   Copyright 2018 The Batfish Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tests for compact trace storage."""
+
+import pickle
+
+import pytest
+
+from pybatfish.datamodel import ListWrapper
+from pybatfish.datamodel.answer.base import _parse_json_with_schema
+from pybatfish.datamodel.answer.table import TableAnswer
+from pybatfish.datamodel.answer.tracestore import TraceList, TraceStore, trace_store
+from pybatfish.datamodel.flow import Trace
+
+
+def _hop(node, iface):
+    return {
+        "node": {"name": node},
+        "steps": [
+            {
+                "type": "EnterInputInterface",
+                "action": "RECEIVED",
+                "detail": {"inputInterface": {"hostname": node, "interface": iface}, "inputVrf": "default"},
+            },
+            {"type": "NotAStepType", "action": "SKIPPED", "detail": {}},
+        ],
+    }
+
+
+_TRACE1 = {"disposition": "ACCEPTED", "hops": [_hop("n1", "e1"), _hop("n2", "e1")]}
+_TRACE2 = {"disposition": "DENIED_IN", "hops": [_hop("n1", "e1"), _hop("n3", "e1")]}
+
+
+def test_trace_store_roundtrip():
+    store = TraceStore()
+    ids = [store.add(_TRACE1), store.add(_TRACE2), store.add(_TRACE1)]
+    assert store.num_traces == 2
+    assert ids[0] == ids[2]
+    assert store.num_hops == 3
+    assert store.num_steps == 3
+    for trace_id, trace in zip(ids, [_TRACE1, _TRACE2, _TRACE1]):
+        assert store.trace(trace_id) == Trace.from_dict(trace)
+        assert store.disposition(trace_id) == trace["disposition"]
+    # Hops are shared between traces
+    assert store.trace(ids[0]).hops[0] is store.trace(ids[1]).hops[0]
+    assert list(store.hop_ids(ids[0])) == list(store.hop_ids(ids[2]))
+
+
+def test_trace_list():
+    store = TraceStore()
+    traces = store.traces([_TRACE1, _TRACE2])
+    expected = [Trace.from_dict(_TRACE1), Trace.from_dict(_TRACE2)]
+    assert isinstance(traces, ListWrapper)
+    assert isinstance(traces, list)
+    assert len(traces) == 2
+    assert traces[1] == expected[1]
+    assert traces[-1] == expected[1]
+    assert list(traces) == expected
+    assert traces == expected
+    assert traces[1:] == expected[1:]
+    assert isinstance(traces[1:], TraceList)
+    assert traces == store.traces([_TRACE1, _TRACE2])
+    assert hash(traces) == hash(TraceStore().traces([_TRACE1, _TRACE2]))
+    assert traces != store.traces([_TRACE2, _TRACE1])
+    # Lists from different stores compare by their traces
+    assert traces == TraceStore().traces([_TRACE1, _TRACE2])
+    assert traces + traces[:1] == expected + expected[:1]
+    assert type(traces + traces[:1]) is ListWrapper
+    copy = pickle.loads(pickle.dumps(traces))
+    assert isinstance(copy, TraceList)
+    assert copy == traces
+    assert copy[0].hops[0] is copy[1].hops[0]
+    assert "ACCEPTED" in traces._repr_html_()
+    with pytest.raises(IndexError):
+        traces[2]
+
+
+def test_parse_traces_with_store():
+    assert not isinstance(_parse_json_with_schema("List<Trace>", [_TRACE1]), TraceList)
+    with trace_store() as store:
+        traces = _parse_json_with_schema("List<Trace>", [_TRACE1, _TRACE2])
+        trace = _parse_json_with_schema("Trace", _TRACE1)
+    assert isinstance(traces, TraceList)
+    assert traces.store is store
+    assert trace == traces[0]
+    assert store.num_traces == 2
+
+
+def test_table_answer_compact_traces():
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {"columnMetadata": [{"name": "Traces", "schema": "List<Trace>"}]},
+                "rows": [{"Traces": [_TRACE1, _TRACE2]}, {"Traces": [_TRACE1]}],
+            }
+        ]
+    }
+    table = TableAnswer(answer, compact_traces=True)
+    assert table.trace_store is not None
+    assert table.trace_store.num_hops == 3
+    df = table.frame()
+    assert isinstance(df["Traces"][0], TraceList)
+    assert df["Traces"][0] == TableAnswer(answer).frame()["Traces"][0]
+    assert df["Traces"][0][0].hops[0] is df["Traces"][1][0].hops[0]
+
+
+def test_table_answer_compact_traces_redecode(tmpdir):
+    """Decoding the rows of an answer again reuses the traces in its store."""
+    answer = {
+        "answerElements": [
+            {
+                "metadata": {"columnMetadata": [{"name": "Traces", "schema": "List<Trace>"}]},
+                "rows": [{"Traces": [_TRACE1, _TRACE2]}, {"Traces": [_TRACE1]}],
+            }
+        ]
+    }
+    table = TableAnswer(answer, spill_threshold=1, spill_dir=str(tmpdir), compact_traces=True)
+    assert table.trace_store is not None
+    table.frame()
+    num_traces = table.trace_store.num_traces
+    str(table)
+    table.frame(columns=["Traces"])
+    len(table.traces)
+    assert table.trace_store.num_traces == num_traces == 2
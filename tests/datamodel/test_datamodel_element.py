@@ -11,11 +11,37 @@
 #   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
+import inspect
 import json
+import pickle
+import tracemalloc
 
-from pybatfish.datamodel import Edge, Interface
+import attr
+import pytest
+
+from pybatfish.datamodel import (
+    Edge,
+    EnterInputIfaceStepDetail,
+    Hop,
+    Interface,
+    NextHopInterface,
+    acl,
+    flow,
+    primitives,
+    referencelibrary,
+    route,
+)
+from pybatfish.datamodel.flow import Step
+from pybatfish.datamodel.primitives import DataModelElement
 from pybatfish.util import BfJsonEncoder
 
+_DATAMODEL_CLASSES = [
+    cls
+    for module in (acl, flow, primitives, referencelibrary, route)
+    for _, cls in inspect.getmembers(module, inspect.isclass)
+    if cls.__module__ == module.__name__ and issubclass(cls, DataModelElement)
+]
+
 
 def test_as_dict():
     assert Interface(hostname="host", interface="iface").dict() == {
@@ -41,3 +67,65 @@ def test_json_serialization():
     i = Interface(hostname="host", interface="iface")
     # Load into dict from json to ignore key ordering
     assert json.loads(BfJsonEncoder().encode(i)) == json.loads(json.dumps(i.dict()))
+
+
+@pytest.mark.parametrize("cls", _DATAMODEL_CLASSES, ids=lambda cls: cls.__name__)
+def test_slots(cls):
+    """Datamodel instances must not carry a per-instance __dict__."""
+    assert "__dict__" not in dir(cls)
+    if attr.has(cls):
+        assert all(a.name in cls.__slots__ for a in attr.fields(cls))
+
+
+def _bytes_per_instance(make, count=1000):
+    tracemalloc.start()
+    try:
+        instances = [make() for _ in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(instances) == count
+    return size / count
+
+
+@pytest.mark.parametrize(
+    "cls",
+    [cls for cls in _DATAMODEL_CLASSES if attr.has(cls) and not inspect.isabstract(cls)],
+    ids=lambda cls: cls.__name__,
+)
+def test_slots_memory(cls):
+    """Slotted instances are smaller than instances of the same class with a __dict__."""
+    names = [a.name for a in attr.fields(cls)]
+    with_dict = attr.make_class(cls.__name__, names, frozen=True, slots=False)
+
+    def slotted():
+        # Fields set directly, since validators reject placeholder values
+        instance = object.__new__(cls)
+        for name in names:
+            object.__setattr__(instance, name, None)
+        return instance
+
+    slotted_size = _bytes_per_instance(slotted)
+    dict_size = _bytes_per_instance(lambda: with_dict(*[None] * len(names)))
+    # About 95 bytes less per instance with CPython 3.11
+    assert slotted_size + 64 <= dict_size
+
+
+def test_pickle():
+    hop = Hop(
+        node="n1",
+        steps=[
+            Step(
+                detail=EnterInputIfaceStepDetail(inputInterface="e1", inputVrf="default"),
+                action="RECEIVED",
+            )
+        ],
+    )
+    for obj in [
+        Interface(hostname="host", interface="iface"),
+        NextHopInterface(interface="e1", ip="1.1.1.1"),
+        hop,
+    ]:
+        copy = pickle.loads(pickle.dumps(obj))
+        assert copy == obj
+        assert copy.dict() == obj.dict()
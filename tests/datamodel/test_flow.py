@@ -827,6 +827,19 @@ def test_LoopStep_from_dict():
     assert step.detail == LoopStepDetail()
 
 
+def test_Step_from_dict_unknown_type():
+    assert Step.from_dict({"type": "NotAType", "action": "ACCEPTED", "detail": {}}) is None
+    assert Step.from_dict({"action": "ACCEPTED"}) is None
+
+
+def test_SessionAction_from_dict_shared():
+    """Session actions without fields decode to one shared instance."""
+    actions = [SessionAction.from_dict({"type": "Accept"}) for _ in range(1000)]
+    assert actions[0] == Accept()
+    assert len({id(action) for action in actions}) == 1
+    assert SessionAction.from_dict({"type": "FibLookup"}) is SessionAction.from_dict({"type": "PostNatFibLookup"})
+
+
 def test_LoopStepDetail_str():
     assert str(LoopStepDetail()) == ""
 
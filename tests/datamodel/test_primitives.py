@@ -13,7 +13,9 @@
 #   limitations under the License.
 import pytest
 
-from pybatfish.datamodel import ListWrapper
+from pybatfish.datamodel import FileLines, Interface, ListWrapper
+from pybatfish.datamodel.flow import Hop
+from pybatfish.datamodel.primitives import _flyweight, flyweights
 
 
 def test_list_wrapper_is_hashable():
@@ -29,5 +31,42 @@ def test_list_wrapper_is_immutable():
         alist[1] = 5
 
 
+def test_flyweights():
+    iface = {"hostname": "h", "interface": "i"}
+    # Disabled by default
+    assert Interface.from_dict(iface) is not Interface.from_dict(iface)
+    with flyweights() as table:
+        first = Interface.from_dict(iface)
+        assert Interface.from_dict(iface) is first
+        assert Interface.from_dict({"hostname": "h", "interface": "j"}) is not first
+        assert len(table) == 2
+    assert Interface.from_dict(iface) is not first
+
+
+def test_flyweights_shared_table() -> None:
+    iface = {"hostname": "h", "interface": "i"}
+    table: dict = {}
+    with flyweights(table):
+        first = Interface.from_dict(iface)
+    with flyweights(table):
+        assert Interface.from_dict(iface) is first
+
+
+def test_flyweights_unhashable():
+    with flyweights() as table:
+        lines = FileLines("f", [1, 2])
+        assert _flyweight(lines) is lines
+        step = {
+            "type": "EnterInputInterface",
+            "action": "RECEIVED",
+            "detail": {"inputInterface": {"hostname": "n", "interface": "e1"}},
+        }
+        hop1 = Hop.from_dict({"node": {"name": "n"}, "steps": [step]})
+        hop2 = Hop.from_dict({"node": {"name": "n"}, "steps": [step]})
+        assert hop1.steps[0] is hop2.steps[0]
+    # The step detail and the step itself
+    assert len(table) == 2
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -11,9 +11,14 @@
 #   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
+import hashlib
+import io
 import json
 import os
+import threading
+import tracemalloc
 import zipfile
+from unittest.mock import patch
 
 import pytest
 
@@ -22,12 +27,15 @@ from pybatfish.exception import QuestionValidationException
 from pybatfish.util import (
     BfJsonEncoder,
     conditional_str,
+    content_hash,
     escape_html,
     escape_name,
+    file_manifest,
     get_html,
     validate_name,
     validate_question_name,
     zip_dir,
+    zip_dir_stream,
 )
 
 
@@ -151,6 +159,35 @@ def _assert_zip_contents(zip_file, file_sub_path, contents, tmpdir):
         assert f.read() == contents
 
 
+def test_content_hash(tmpdir):
+    """The hash depends on file paths and contents, not on the directory name or timestamps."""
+    for name in ["a", "b"]:
+        d = tmpdir.mkdir(name)
+        d.mkdir("configs").join("r1.cfg").write("hostname r1")
+        d.join("batfish").mkdir().join("layer1.json").write("{}")
+    a, b = str(tmpdir.join("a")), str(tmpdir.join("b"))
+    assert content_hash(a) == content_hash(b)
+    os.utime(os.path.join(b, "configs", "r1.cfg"), (0, 0))
+    assert content_hash(a) == content_hash(b)
+    tmpdir.join("b", "configs", "r1.cfg").write("hostname r2")
+    assert content_hash(a) != content_hash(b)
+    tmpdir.join("b", "configs", "r1.cfg").rename(tmpdir.join("b", "configs", "r2.cfg"))
+    tmpdir.join("b", "configs", "r2.cfg").write("hostname r1")
+    assert content_hash(a) != content_hash(b)
+    assert content_hash(os.path.join(a, "configs", "r1.cfg")) == content_hash(os.path.join(a, "configs", "r1.cfg"))
+
+
+def test_file_manifest(tmpdir):
+    """The manifest has the digest of every file, by relative path."""
+    d = tmpdir.mkdir("snapshot")
+    d.mkdir("configs").join("r1.cfg").write("hostname r1")
+    d.join("batfish").mkdir().join("layer1.json").write("{}")
+    manifest = file_manifest(str(d))
+    assert sorted(manifest) == ["batfish/layer1.json", "configs/r1.cfg"]
+    assert manifest["configs/r1.cfg"] == hashlib.sha256(b"hostname r1").hexdigest()
+    assert file_manifest(str(tmpdir.mkdir("empty"))) == {}
+
+
 def test_zip_dir(tmpdir):
     """Make sure zipping dir works."""
     dirname = "dirname"
@@ -166,6 +203,176 @@ def test_zip_dir(tmpdir):
     _assert_zip_contents(zip_file, os.path.join(dirname, filename), contents, tmpdir)
 
 
+def test_zip_dir_parallel(tmpdir):
+    """Compressing in parallel produces the same archive."""
+    in_dir_path = str(tmpdir.mkdir("dirname"))
+    sub_dir_path = str(tmpdir.join("dirname").mkdir("sub"))
+    for i in range(30):
+        _make_config(in_dir_path if i % 2 else sub_dir_path, f"file{i}", os.urandom(1000).hex() * (i % 3))
+    sequential = str(tmpdir.join("sequential.zip"))
+    parallel = str(tmpdir.join("parallel.zip"))
+    zip_dir(in_dir_path, sequential)
+    zip_dir(in_dir_path, parallel, workers=4)
+    with open(sequential, "rb") as f1, open(parallel, "rb") as f2:
+        assert f1.read() == f2.read()
+    streamed = b"".join(zip_dir_stream(in_dir_path, workers=4))
+    with zipfile.ZipFile(io.BytesIO(streamed)) as zf, zipfile.ZipFile(parallel) as expected:
+        assert zf.namelist() == expected.namelist()
+        assert all(zf.read(name) == expected.read(name) for name in expected.namelist())
+
+
+def test_zip_dir_parallel_large_files(tmpdir):
+    """Large files are streamed when compressing in parallel, also to unseekable outputs."""
+    in_dir_path = str(tmpdir.mkdir("dirname"))
+    for i in range(10):
+        _make_config(in_dir_path, f"file{i}", os.urandom(500).hex() * i)
+    sequential = str(tmpdir.join("sequential.zip"))
+    zip_dir(in_dir_path, sequential)
+    with patch("pybatfish.util._PARALLEL_MAX_FILE_SIZE", 2000):
+        streamed = b"".join(zip_dir_stream(in_dir_path, chunk_size=1000, workers=3))
+    with zipfile.ZipFile(io.BytesIO(streamed)) as zf, zipfile.ZipFile(sequential) as expected:
+        assert zf.testzip() is None
+        assert [(i.filename, i.date_time, i.external_attr) for i in zf.infolist()] == [
+            (i.filename, i.date_time, i.external_attr) for i in expected.infolist()
+        ]
+        assert all(zf.read(name) == expected.read(name) for name in expected.namelist())
+
+
+def test_zip_dir_parallel_memory(tmpdir):
+    """Parallel zipping holds a bounded number of small files in memory, and
+    streams large ones."""
+    in_dir_path = str(tmpdir.mkdir("dirname"))
+    for i in range(40):
+        _make_config(in_dir_path, f"file{i}", os.urandom(32 << 10).hex())
+    big_size = 16 << 20
+    _make_config(in_dir_path, "big", "hostname r1\n" * (big_size // 12))
+    zip_file = str(tmpdir.join("parallel.zip"))
+    tracemalloc.start()
+    try:
+        zip_dir(in_dir_path, zip_file, workers=4)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # About 2.5 MB with CPython 3.11: up to 9 small files and the zlib
+    # state of each worker, and buffers for streaming the large file
+    assert peak < big_size / 2
+    with zipfile.ZipFile(zip_file) as zf:
+        assert zf.testzip() is None
+
+
+def test_zip_dir_files(tmpdir):
+    """Only the selected files and their parent directories are zipped."""
+    d = tmpdir.mkdir("snapshot")
+    d.mkdir("configs").join("r1.cfg").write("hostname r1")
+    d.join("configs", "r2.cfg").write("hostname r2")
+    d.join("batfish").mkdir().join("layer1.json").write("{}")
+    zip_file = str(tmpdir.join("file.zip"))
+    for workers in [1, 2]:
+        zip_dir(str(d), zip_file, workers=workers, files=["configs/r2.cfg"])
+        with zipfile.ZipFile(zip_file) as zf:
+            assert [info.filename for info in zf.infolist() if not info.is_dir()] == ["snapshot/configs/r2.cfg"]
+            assert not any(name.startswith("snapshot/batfish") for name in zf.namelist())
+            assert zf.read("snapshot/configs/r2.cfg") == b"hostname r2"
+
+
+def _make_repo(tmpdir):
+    d = tmpdir.mkdir("snapshot")
+    d.mkdir("configs").join("r1.cfg").write("hostname r1")
+    d.join("configs", "r1.cfg.bak").write("hostname old")
+    d.mkdir("captures").join("a.pcap").write("pcap")
+    d.join("configs").mkdir("captures").join("b.txt").write("text")
+    d.mkdir(".git").join("HEAD").write("ref")
+    d.join("batfish").mkdir().join("layer1.json").write("{}")
+    return str(d)
+
+
+@pytest.mark.parametrize(
+    "include, exclude, expected",
+    [
+        (
+            None,
+            [".git", "*.bak"],
+            ["batfish/layer1.json", "captures/a.pcap", "configs/captures/b.txt", "configs/r1.cfg"],
+        ),
+        (None, "captures/", [".git/HEAD", "batfish/layer1.json", "configs/r1.cfg", "configs/r1.cfg.bak"]),
+        (
+            None,
+            "/captures",
+            [".git/HEAD", "batfish/layer1.json", "configs/captures/b.txt", "configs/r1.cfg", "configs/r1.cfg.bak"],
+        ),
+        (["*.cfg", "batfish/*"], None, ["batfish/layer1.json", "configs/r1.cfg"]),
+        ("configs/*", "configs/captures", ["configs/r1.cfg", "configs/r1.cfg.bak"]),
+    ],
+)
+def test_zip_dir_filters(tmpdir, include, exclude, expected):
+    """Filters apply the same to zipping, hashing and manifests."""
+    d = _make_repo(tmpdir)
+    zip_file = str(tmpdir.join("file.zip"))
+    zip_dir(d, zip_file, include=include, exclude=exclude)
+    with zipfile.ZipFile(zip_file) as zf:
+        files = sorted(info.filename for info in zf.infolist() if not info.is_dir())
+    assert files == [f"snapshot/{f}" for f in expected]
+    assert sorted(file_manifest(d, include, exclude)) == expected
+    streamed = b"".join(zip_dir_stream(d, include=include, exclude=exclude))
+    with zipfile.ZipFile(io.BytesIO(streamed)) as zf, zipfile.ZipFile(zip_file) as expected_zf:
+        assert zf.namelist() == expected_zf.namelist()
+    for f in expected:
+        tmpdir.join("copy", *os.path.dirname(f).split("/")).ensure(dir=True)
+        tmpdir.join("snapshot", *f.split("/")).copy(tmpdir.join("copy", *f.split("/")))
+    assert content_hash(d, include, exclude) == content_hash(str(tmpdir.join("copy")))
+
+
+def test_zip_dir_prunes_excluded(tmpdir):
+    """Excluded directories are not walked."""
+    d = _make_repo(tmpdir)
+    walked = []
+    real_walk = os.walk
+
+    def walk(top):
+        for root, dirs, files in real_walk(top):
+            walked.append(os.path.relpath(root, d))
+            yield root, dirs, files
+
+    with patch("pybatfish.util.os.walk", walk):
+        zip_dir(d, str(tmpdir.join("file.zip")), exclude=[".git", "captures/"])
+    assert sorted(walked) == [".", "batfish", "configs"]
+
+
+def test_zip_dir_stream(tmpdir):
+    """The streamed zip has the same entries as the zip file, in small chunks."""
+    in_dir_path = str(tmpdir.mkdir("dirname"))
+    for i in range(20):
+        _make_config(in_dir_path, f"file{i}", os.urandom(2000).hex())
+    zip_file = str(tmpdir.join("file.zip"))
+    zip_dir(in_dir_path, zip_file)
+
+    chunks = list(zip_dir_stream(in_dir_path, chunk_size=1000, max_pending=2))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 1000 for chunk in chunks[:-1])
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as streamed, zipfile.ZipFile(zip_file) as expected:
+        assert streamed.namelist() == expected.namelist()
+        for name in expected.namelist():
+            assert streamed.read(name) == expected.read(name)
+
+
+def test_zip_dir_stream_close(tmpdir):
+    """Closing the stream early stops the background compression."""
+    in_dir_path = str(tmpdir.mkdir("dirname"))
+    for i in range(20):
+        _make_config(in_dir_path, f"file{i}", os.urandom(2000).hex())
+    stream = zip_dir_stream(in_dir_path, chunk_size=100, max_pending=1)
+    next(stream)
+    stream.close()
+    assert not any(t.name == "pybatfish-zip" for t in threading.enumerate())
+
+
+def test_zip_dir_stream_error(tmpdir):
+    """Errors while compressing are raised to the consumer."""
+    with patch("pybatfish.util.zip_dir", side_effect=OSError("boom")):
+        with pytest.raises(OSError, match="boom"):
+            list(zip_dir_stream(str(tmpdir)))
+
+
 def test_zip_dir_bad_file_time(tmpdir):
     """
     Make sure zipping pre-1980 file works - even though zip format doesn't support files that old.
@@ -188,3 +395,32 @@ def test_zip_dir_bad_file_time(tmpdir):
 
     # Make sure the zip contains the file with the correct contents
     _assert_zip_contents(zip_file, os.path.join(dirname, filename), contents, tmpdir)
+
+    # The timestamp is clamped on the archive member, without copying the file
+    with zipfile.ZipFile(zip_file) as zf:
+        assert zf.getinfo(f"{dirname}/{filename}").date_time == (1980, 1, 1, 0, 0, 0)
+
+    parallel_zip_file = str(tmpdir.join("parallel.zip"))
+    zip_dir(in_dir_path, parallel_zip_file, workers=2)
+    with open(zip_file, "rb") as f1, open(parallel_zip_file, "rb") as f2:
+        assert f1.read() == f2.read()
+
+
+def test_zip_dir_bad_file_time_streamed(tmpdir):
+    """Pre-1980 files are streamed into the archive, not read whole into memory."""
+    in_dir_path = str(tmpdir.mkdir("dirname"))
+    big_size = 16 << 20
+    _make_config(in_dir_path, "big", "hostname r1\n" * (big_size // 12))
+    _1960_01_01 = -315590400.0
+    os.utime(os.path.join(in_dir_path, "big"), (_1960_01_01, _1960_01_01))
+    zip_file = str(tmpdir.join("file.zip"))
+    tracemalloc.start()
+    try:
+        zip_dir(in_dir_path, zip_file)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # About 0.3 MB with CPython 3.11, copying to a temp file read all 16 MB
+    assert peak < big_size / 2
+    with zipfile.ZipFile(zip_file) as zf:
+        assert zf.testzip() is None